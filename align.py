@@ -0,0 +1,220 @@
+import math
+import numpy as np
+from PIL import Image, ImageOps
+from concurrent.futures import ThreadPoolExecutor
+
+from utils import open_proxy, read_image_size
+
+# 对齐结果在帧目录中的字段名
+CATALOG_SECTION = "align"
+
+
+def _hann(shape):
+    """二维汉宁窗，减弱图像边缘对频谱的影响"""
+    return np.outer(np.hanning(shape[0]), np.hanning(shape[1]))
+
+
+def _subpixel(values, index):
+    """抛物线插值求峰值的亚像素位置"""
+    left = values[index - 1]
+    center = values[index]
+    right = values[(index + 1) % len(values)]
+    denom = left - 2 * center + right
+    if denom == 0:
+        return 0.0
+    return 0.5 * (left - right) / denom
+
+
+def phase_correlation(reference, image):
+    """FFT 相位相关，返回 image 内容相对 reference 的平移 (dx, dy) 和峰值强度"""
+    spectrum = np.fft.fft2(image) * np.conj(np.fft.fft2(reference))
+    spectrum /= np.abs(spectrum) + 1e-12
+    surface = np.fft.ifft2(spectrum).real
+
+    h, w = surface.shape
+    peak_y, peak_x = np.unravel_index(np.argmax(surface), surface.shape)
+    dy = peak_y + _subpixel(surface[:, peak_x], peak_y)
+    dx = peak_x + _subpixel(surface[peak_y, :], peak_x)
+    # 超过一半尺寸的位移对应负方向
+    if dy > h / 2:
+        dy -= h
+    if dx > w / 2:
+        dx -= w
+    return dx, dy, float(surface[peak_y, peak_x])
+
+
+def _log_polar_spectrum(image, angles=360):
+    """高通滤波后的幅度谱的对数极坐标表示（平移不变，旋转/缩放变为平移）"""
+    h, w = image.shape
+    magnitude = np.abs(np.fft.fftshift(np.fft.fft2(image * _hann(image.shape))))
+    # 抑制低频，避免直流分量主导相关结果
+    fy = np.cos(np.pi * np.linspace(-0.5, 0.5, h))
+    fx = np.cos(np.pi * np.linspace(-0.5, 0.5, w))
+    x = np.outer(fy, fx)
+    magnitude *= (1.0 - x) * (2.0 - x)
+
+    cy, cx = h / 2.0, w / 2.0
+    max_radius = min(cx, cy)
+    radii = max(16, int(max_radius))
+    log_base = math.log(max_radius) / (radii - 1)
+    theta = np.linspace(0, np.pi, angles, endpoint=False)
+    rho = np.exp(np.arange(radii) * log_base)
+    ys = cy + rho[np.newaxis, :] * np.sin(theta)[:, np.newaxis]
+    xs = cx + rho[np.newaxis, :] * np.cos(theta)[:, np.newaxis]
+
+    # 双线性采样
+    x0 = np.clip(np.floor(xs).astype(int), 0, w - 2)
+    y0 = np.clip(np.floor(ys).astype(int), 0, h - 2)
+    ax = np.clip(xs - x0, 0, 1)
+    ay = np.clip(ys - y0, 0, 1)
+    sampled = (magnitude[y0, x0] * (1 - ax) * (1 - ay) + magnitude[y0, x0 + 1] * ax * (1 - ay) +
+               magnitude[y0 + 1, x0] * (1 - ax) * ay + magnitude[y0 + 1, x0 + 1] * ax * ay)
+    return sampled, log_base
+
+
+def _warp(image, angle, scale):
+    """按源坐标 = 中心 + scale * R(angle) * (p - 中心) 重采样代理图"""
+    h, w = image.shape
+    matrix = _affine_coefficients(angle, scale, 0.0, 0.0, (w, h), 0, 0)
+    warped = Image.fromarray(image.astype(np.float32), 'F').transform(
+        (w, h), Image.AFFINE, matrix, Image.BILINEAR)
+    return np.asarray(warped, dtype=np.float64)
+
+
+def _affine_coefficients(angle, scale, dx, dy, size, left, top):
+    """输出区域 (left, top) 起的像素到源图坐标的仿射系数（PIL AFFINE 格式）"""
+    cx, cy = size[0] / 2.0, size[1] / 2.0
+    cos = scale * math.cos(angle)
+    sin = scale * math.sin(angle)
+    return (cos, -sin, cx + cos * (left - cx) - sin * (top - cy) + dx,
+            sin, cos, cy + sin * (left - cx) + cos * (top - cy) + dy)
+
+
+def estimate_transform(reference, image, rotation=False):
+    """估计 image 相对 reference 的变换 (dx, dy, angle, scale)（代理图像素单位）
+
+    输出像素 p 取自源图 中心 + scale * R(angle) * (p - 中心) + (dx, dy)。
+    """
+    angle, scale = 0.0, 1.0
+    if rotation:
+        ref_polar, log_base = _log_polar_spectrum(reference)
+        img_polar, _ = _log_polar_spectrum(image)
+        shift_r, shift_theta, _ = phase_correlation(ref_polar, img_polar)
+        angle = shift_theta * np.pi / ref_polar.shape[0]
+        scale = math.exp(-shift_r * log_base)
+        image = _warp(image, angle, scale)
+
+    window = _hann(reference.shape)
+    dx, dy, _ = phase_correlation(reference * window, image * window)
+    if rotation:
+        # 平移是在旋转缩放后的坐标系中测得的，换算回源图坐标
+        cos = scale * math.cos(angle)
+        sin = scale * math.sin(angle)
+        dx, dy = cos * dx - sin * dy, sin * dx + cos * dy
+    return dx, dy, angle, scale
+
+
+def _load_proxy(path, proxy_size, size=None):
+    proxy = open_proxy(path, proxy_size)
+    if size:
+        # 统一帧尺寸时代理图同样缩放并居中裁剪，与合成时的帧一致
+        scale = min(1.0, proxy_size / max(size))
+        fit = (max(1, round(size[0] * scale)), max(1, round(size[1] * scale)))
+        if proxy.size != fit:
+            proxy = ImageOps.fit(proxy, fit, Image.BILINEAR)
+    return np.asarray(proxy, dtype=np.float64)
+
+
+def align_frames(paths, images, indices, rotation=False, proxy_size=512, catalog=None,
+                 max_workers=None, log_callback=None, size=None):
+    """估计 indices 中各帧相对中间帧的变换，返回包装后的图片列表
+
+    变换在缩小的灰度代理图上用相位相关估计，结果缓存在帧目录中；
+    图片本身不会被重采样，只在合成时对各帧贡献的区域按需变换。
+    size 为统一的帧尺寸（帧在解码时缩放到该尺寸时传入）。
+    """
+    if not indices:
+        return images
+    reference_index = indices[len(indices) // 2]
+    reference_path = paths[reference_index]
+    full_w = size[0] if size else read_image_size(reference_path)[0]
+
+    # 缓存结果依赖参考帧、代理尺寸和是否估计旋转
+    params = {
+        "reference": catalog.frame_id(reference_path) if catalog else None,
+        "proxy": proxy_size,
+        "rotation": rotation,
+        "size": list(size) if size else None
+    }
+
+    transforms = {}
+    missing = []
+    for i in indices:
+        cached = catalog.get(paths[i], CATALOG_SECTION) if catalog else None
+        if cached and all(cached.get(key) == value for key, value in params.items()):
+            transforms[i] = tuple(cached["transform"])
+        else:
+            missing.append(i)
+
+    if missing:
+        if log_callback:
+            log_callback(f"估计 {len(missing)} 张图片的对齐变换...")
+        reference = _load_proxy(reference_path, proxy_size, size)
+        factor = full_w / reference.shape[1]
+
+        def estimate(i):
+            if i == reference_index:
+                return 0.0, 0.0, 0.0, 1.0
+            dx, dy, angle, scale = estimate_transform(reference, _load_proxy(paths[i], proxy_size, size), rotation)
+            return dx * factor, dy * factor, angle, scale
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for i, transform in zip(missing, executor.map(estimate, missing)):
+                transforms[i] = transform
+                if catalog:
+                    catalog.put(paths[i], CATALOG_SECTION, dict(params, transform=list(transform)))
+        if catalog:
+            catalog.save()
+
+    aligned = list(images)
+    for i in indices:
+        aligned[i] = AlignedImage(images[i], transforms[i])
+    return aligned
+
+
+class AlignedImage:
+    """带对齐变换的帧：只在裁剪时对裁剪区域做变换，不重采样整幅图片"""
+
+    def __init__(self, image, transform):
+        self.image = image
+        self.transform = transform
+        self._converted = None
+
+    @property
+    def size(self):
+        return self.image.size
+
+    @property
+    def mode(self):
+        return self.image.mode
+
+    def crop(self, box):
+        left, top, right, bottom = box
+        dx, dy, angle, scale = self.transform
+        if abs(angle) < 1e-4 and abs(scale - 1.0) < 1e-4:
+            # 纯平移：取整后直接裁剪，不需要插值
+            dx, dy = round(dx), round(dy)
+            return self.image.crop((left + dx, top + dy, right + dx, bottom + dy))
+
+        image = self.image
+        if image.mode not in ('RGB', 'L'):
+            if self._converted is None:
+                self._converted = image.convert('RGB')
+            image = self._converted
+        coefficients = _affine_coefficients(angle, scale, dx, dy, image.size, left, top)
+        return image.transform((right - left, bottom - top), Image.AFFINE, coefficients, Image.BILINEAR)
+
+    def release(self):
+        self._converted = None
+        if hasattr(self.image, 'release'):
+            self.image.release()
@@ -0,0 +1,76 @@
+import io
+import numpy as np
+from PIL import Image
+
+from geometry import get_geometry
+from compositor import composite_into
+from encoding import get_save_params
+
+# 切片参数
+SPEC_KEYS = {'slice_type', 'position', 'linear', 'slice_map', 'angle'}
+
+
+def as_frame(frame):
+    """将输入帧转换为合成使用的帧：PIL 图片保持不变，uint8 数组尽量不复制"""
+    if isinstance(frame, Image.Image):
+        return frame
+    array = np.asarray(frame)
+    if array.dtype != np.uint8:
+        raise ValueError(f"不支持的数组类型: {array.dtype}（需要 uint8）")
+    if array.ndim == 2:
+        # 灰度帧需要展开为三通道
+        return np.repeat(array[:, :, None], 3, axis=2)
+    if array.ndim == 3 and array.shape[2] in (3, 4):
+        # RGBA 只取前三个通道（视图）
+        return array[:, :, :3]
+    raise ValueError(f"不支持的数组形状: {array.shape}")
+
+
+def frame_size(frame):
+    """帧尺寸 (宽, 高)"""
+    if isinstance(frame, np.ndarray):
+        return frame.shape[1], frame.shape[0]
+    return frame.size
+
+
+def encode_array(array, extension, encoder_options=None):
+    """将 (h, w, 3) 数组编码为字节，格式和编码参数与文件输出一致"""
+    fmt, params = get_save_params(extension, encoder_options)
+    buffer = io.BytesIO()
+    Image.fromarray(array).save(buffer, fmt, **params)
+    return buffer.getvalue()
+
+
+def compose(frames, spec, extension=None, encoder_options=None):
+    """由内存中的帧合成时间切片，不读写文件，也不输出任何信息
+
+    frames 为 NumPy 数组（(h, w) 或 (h, w, 3/4) 的 uint8）或 PIL 图片的序列，尺寸必须一致。
+    数组帧按输出区域切片读取，不复制整帧；PIL 图片只裁剪用到的区域。
+    spec 为切片类型字符串，或包含 slice_type、position、linear、slice_map、angle 的字典
+    （custom_map 的 slice_map 可以是映射图路径、PIL 图片或 uint8/uint16 数组）。
+    返回 (h, w, 3) 的 uint8 数组；extension 指定时（jpg/png/webp/tif）返回编码后的字节。
+    """
+    if isinstance(spec, str):
+        spec = {"slice_type": spec}
+    unknown = set(spec) - SPEC_KEYS
+    if unknown:
+        raise ValueError(f"未知参数: {', '.join(sorted(unknown))}")
+    if "slice_type" not in spec:
+        raise ValueError("缺少 slice_type")
+
+    frames = [as_frame(frame) for frame in frames]
+    if not frames:
+        raise ValueError("没有输入帧")
+    size = frame_size(frames[0])
+    if any(frame_size(frame) != size for frame in frames):
+        raise ValueError("所有图片必须具有相同的尺寸")
+
+    geometry = get_geometry(spec["slice_type"], size, len(frames),
+                            spec.get("position", "center"), spec.get("linear", False),
+                            spec.get("slice_map"), spec.get("angle", 0.0))
+    canvas = np.zeros((size[1], size[0], 3), dtype=np.uint8)
+    composite_into(canvas, frames, geometry, geometry.label_map(), quiet=True)
+
+    if extension is None:
+        return canvas
+    return encode_array(canvas, extension, encoder_options)
@@ -0,0 +1,362 @@
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import traceback
+from pathlib import Path
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from utils import (list_image_paths, decode_image, read_image_size, get_available_memory, load_frames, share_frames,
+                   DEFAULT_MAX_OPEN)
+from planner import (select_slots, resolve_size, capture_times, select_time_uniform, dedupe_slots, FramePlan,
+                     choose_shared_strategy)
+from encoding import normalize_extension
+from geometry import get_geometry
+from cli import run_timeslice
+from align import align_frames
+from deflicker import deflicker_frames
+from dedup import find_duplicates
+from seams import optimize_seams, SEAM_SLICE_TYPES
+from catalog import open_catalog
+
+# 切片参数（每个任务可以有多组）
+SLICE_KEYS = {'slice_type', 'position', 'linear', 'slice_map', 'angle'}
+
+# 在任务内统一处理、不传给 run_timeslice 的参数
+PREPROCESS_KEYS = {'slices', 'align', 'align_rotation', 'deflicker', 'deflicker_window', 'resize', 'dedup',
+                   'dedup_threshold', 'time_uniform', 'seams', 'slots'}
+
+# 设置后各切片交由 run_timeslice 按 CLI 的流程自行加载（不在任务内共用解码的帧）的参数
+DIRECT_KEYS = ('reducer', 'resume', 'cache')
+
+# 任务级参数（可在 defaults 中统一设置）
+JOB_KEYS = {
+    'input_dir', 'output_dir', 'reverse', 'sort_by', 'output_basename', 'include_timestamp',
+    'include_slice_type', 'extension', 'encoder_options', 'extra_extensions', 'align', 'align_rotation',
+    'deflicker', 'deflicker_window', 'resize', 'output_sizes', 'dedup', 'dedup_threshold', 'time_uniform',
+    'seams', 'reveal', 'reveal_size', 'reveal_fps', 'reveal_seconds', 'tiled_tiff', 'tile_size', 'pyramid_levels',
+    'bigtiff', 'encode_workers', 'slots', 'reducer', 'resume', 'checkpoint_interval', 'cache', 'cache_hash', 'slices'
+}
+
+
+def load_manifest(path):
+    """读取 JSON 或 YAML 任务清单"""
+    path = Path(path)
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.suffix.lower() in ('.yaml', '.yml'):
+            try:
+                import yaml
+            except ImportError:
+                raise ImportError("请安装PyYAML库以读取YAML清单: pip install pyyaml")
+            manifest = yaml.safe_load(f)
+        else:
+            manifest = json.load(f)
+
+    if isinstance(manifest, list):
+        manifest = {"jobs": manifest}
+    if not isinstance(manifest, dict) or not isinstance(manifest.get("jobs"), list):
+        raise ValueError("清单必须包含 jobs 列表")
+    return manifest
+
+
+def spec_label(spec):
+    """切片参数中区别于默认值的部分，用于区分同一类型的多个切片的文件名"""
+    parts = []
+    if spec.get('position', 'center') != 'center':
+        parts.append(str(spec['position']))
+    if spec.get('linear'):
+        parts.append('linear')
+    if spec.get('angle'):
+        parts.append(f"{spec['angle']:g}deg")
+    if spec.get('slice_map'):
+        parts.append(Path(spec['slice_map']).stem)
+    return '-'.join(parts)
+
+
+def expand_jobs(manifest, base_dir="."):
+    """合并默认参数并展开为任务列表，每个任务对应一个输入目录和若干切片"""
+    defaults = manifest.get("defaults", {})
+    jobs = []
+    for index, entry in enumerate(manifest["jobs"]):
+        job = dict(defaults)
+        job.update(entry)
+        unknown = set(job) - JOB_KEYS - SLICE_KEYS
+        if unknown:
+            raise ValueError(f"任务 {index + 1} 包含未知参数: {', '.join(sorted(unknown))}")
+        if 'input_dir' not in job:
+            raise ValueError(f"任务 {index + 1} 缺少 input_dir")
+
+        # 单个切片可以直接写在任务中
+        slices = job.pop('slices', None)
+        single = {key: job.pop(key) for key in SLICE_KEYS if key in job}
+        if slices is None:
+            slices = [single]
+        if not slices or any('slice_type' not in spec for spec in slices):
+            raise ValueError(f"任务 {index + 1} 缺少 slice_type")
+
+        # 相对路径相对于清单所在目录
+        job['input_dir'] = str(Path(base_dir) / job['input_dir'])
+        for spec in slices:
+            if spec.get('slice_map'):
+                spec['slice_map'] = str(Path(base_dir) / spec['slice_map'])
+        job['output_dir'] = str(Path(base_dir) / job.get('output_dir', 'output'))
+        # 默认以输入目录名命名，多个切片时在文件名中加入切片类型避免重名
+        job.setdefault('output_basename', Path(job['input_dir']).name)
+        job.setdefault('include_slice_type', len(slices) > 1)
+        # 同一类型的多个切片在文件名中加入区分参数（无法区分时加入序号），避免输出互相覆盖
+        counts = Counter(spec['slice_type'] for spec in slices)
+        labels = [spec_label(spec) for spec in slices]
+        label_counts = Counter(zip((spec['slice_type'] for spec in slices), labels))
+        for number, (spec, label) in enumerate(zip(slices, labels), 1):
+            if counts[spec['slice_type']] > 1 and 'output_basename' not in spec:
+                if not label or label_counts[(spec['slice_type'], label)] > 1:
+                    label = f"{label}-{number}" if label else str(number)
+                spec['output_basename'] = f"{job['output_basename']}-{label}"
+        job['slices'] = slices
+        jobs.append(job)
+    return jobs
+
+
+def plan_job_memory(plan, job, memory_limit):
+    """按规划的可见帧（目标尺寸）选择任务的执行策略并估算峰值内存（与 CLI 使用同一内存模型）
+
+    可见帧全部解码后能放入上限时解码一次供各切片共用，否则帧按需解码，按 memmap/tiled 等策略合成。
+    """
+    # 分块 TIFF 模式总是输出 TIFF
+    tiff_output = job.get('tiled_tiff') or normalize_extension(job.get('extension', 'jpg')) in ('tif', 'tiff')
+    return choose_shared_strategy(plan, memory_limit, tiff_output, job.get('tiled_tiff', False),
+                                  job.get('tile_size', 512))
+
+
+class MemoryBudget:
+    """内存准入控制：已准入任务的估算内存之和不超过上限
+
+    单个任务超过上限时，等待其他任务全部结束后单独运行。
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.used = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, amount):
+        with self._cond:
+            while self.used and self.used + amount > self.limit:
+                self._cond.wait()
+            self.used += amount
+
+    def release(self, amount):
+        with self._cond:
+            self.used -= amount
+            self._cond.notify_all()
+
+
+def job_result_base(job):
+    return {
+        "input_dir": job['input_dir'],
+        "output": None,
+        "status": "failed",
+        "error": None,
+        "seconds": 0.0
+    }
+
+
+def run_slice(job, spec, pool, log, params, **kwargs):
+    """在共享线程池中生成一个切片，返回该切片的结果（失败时记录错误）"""
+    result = dict(job_result_base(job), slice_type=spec['slice_type'])
+    start = time.perf_counter()
+    try:
+        messages = []
+        output = pool.submit(run_timeslice, log_callback=messages.append, **kwargs, **params).result()
+        result.update(status="ok", output=output, messages=messages)
+        log(f"{job['input_dir']} [{spec['slice_type']}]: {output}")
+    except Exception as e:
+        result["error"] = f"{e}\n{traceback.format_exc()}"
+        log(f"{job['input_dir']} [{spec['slice_type']}] 失败: {e}")
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def run_job_direct(job, pool, budget, log):
+    """执行区域归约、检查点或结果缓存的任务：各切片由 run_timeslice 自行规划和按需解码，
+    执行策略按整个内存上限选择，因此该任务单独运行"""
+    start = time.perf_counter()
+    budget.acquire(budget.limit)
+    try:
+        results = []
+        for spec in job['slices']:
+            params = {key: value for key, value in job.items() if key != 'slices'}
+            params.update(spec)
+            results.append(run_slice(job, spec, pool, log, params, memory_limit=budget.limit))
+    finally:
+        budget.release(budget.limit)
+    for result in results:
+        result["job_seconds"] = time.perf_counter() - start
+    return results
+
+
+def run_job(job, pool, budget, log):
+    """执行一个任务：共享线程池解码帧，逐个生成切片；单个切片失败不影响其他切片"""
+    if any(job.get(key) for key in DIRECT_KEYS):
+        return run_job_direct(job, pool, budget, log)
+    results = []
+    base = job_result_base(job)
+
+    start = time.perf_counter()
+    try:
+        paths = list_image_paths(job['input_dir'], job.get('sort_by', 'name'), job.get('reverse', False))
+        if job.get('dedup') or job.get('time_uniform'):
+            catalog = open_catalog(job['input_dir'])
+            if job.get('dedup'):
+                paths, duplicates = find_duplicates(paths, job.get('dedup_threshold', 3), catalog)
+                if duplicates:
+                    log(f"{job['input_dir']}: 跳过近似重复的图片 {len(duplicates)}/{len(paths) + len(duplicates)}: "
+                        f"{', '.join(path.name for path, _, _ in duplicates)}")
+            if job.get('time_uniform'):
+                selected = select_time_uniform(capture_times(paths, catalog), job['time_uniform'])
+                if job.get('reverse'):
+                    selected.reverse()
+                paths = [paths[i] for i in selected]
+        paths = [paths[i] for i in select_slots(len(paths), job.get('slots'))]
+
+        # 规划各切片的几何（只读取文件头），只解码至少在一个切片中拥有输出像素的帧
+        resize = job.get('resize')
+        size = resolve_size(paths, resize) if resize else read_image_size(paths[0])
+        target_size = size if resize else None
+        geometries = {}
+        for spec in job['slices']:
+            try:
+                geometries[id(spec)] = get_geometry(spec['slice_type'], size, len(paths),
+                                                    spec.get('position', 'center'), spec.get('linear', False),
+                                                    spec.get('slice_map'), spec.get('angle', 0.0))
+            except ValueError:
+                # 未知切片类型在下面逐个切片报告
+                pass
+        if job.get('seams'):
+            # 内容感知接缝只移动帧之间的分界线，不改变需要解码的帧
+            for spec in job['slices']:
+                if id(spec) in geometries and spec['slice_type'] in SEAM_SLICE_TYPES:
+                    geometry = geometries[id(spec)]
+                    geometries[id(spec)] = optimize_seams(geometry, paths, geometry.visible_frames(),
+                                                          size=target_size)
+        visible = sorted({i for geometry in geometries.values() for i in geometry.visible_frames()})
+        memory = None
+        if geometries:
+            memory = plan_job_memory(FramePlan(paths, next(iter(geometries.values())), visible, len(paths)),
+                                     job, budget.limit)
+        estimate = memory.estimate if memory else 0
+        # 同一帧占据多个位置时（按拍摄时间选帧）只解码、对齐和去闪烁一次
+        unique_paths, unique_visible, slots = dedupe_slots(paths, visible)
+    except Exception as e:
+        return [dict(base, slice_type=spec['slice_type'], error=str(e)) for spec in job['slices']]
+
+    if estimate > budget.limit:
+        log(f"{job['input_dir']}: 估算内存 {estimate / 2 ** 20:.0f} MB 超过上限，将单独运行")
+    budget.acquire(estimate)
+    try:
+        shared = memory is None or memory.strategy == "shared"
+        if shared:
+            frames = [None] * len(unique_paths)
+            for j, image in zip(unique_visible, pool.map(lambda j: decode_image(unique_paths[j], target_size),
+                                                         unique_visible)):
+                frames[j] = image
+            log(f"{job['input_dir']}: 已解码 {len(unique_visible)}/{len(unique_paths)} 张图片")
+        else:
+            # 可见帧无法同时保留在内存中：帧按需解码，各切片按所选策略合成
+            frames = load_frames(unique_paths, unique_visible, DEFAULT_MAX_OPEN, target_size)
+            log(f"{job['input_dir']}: 执行策略 {memory.strategy}（估算峰值内存 {estimate / 2 ** 20:.0f} MB），"
+                f"{len(unique_visible)}/{len(unique_paths)} 张图片按需解码")
+        catalog = open_catalog(job['input_dir'])
+        if job.get('align') or job.get('align_rotation'):
+            frames = align_frames(unique_paths, frames, unique_visible, job.get('align_rotation', False),
+                                  catalog=catalog, size=target_size)
+        if job.get('deflicker'):
+            frames = deflicker_frames(unique_paths, frames, unique_visible, job.get('deflicker_window', 15),
+                                      catalog=catalog)
+
+        for spec in job['slices']:
+            params = {key: value for key, value in job.items() if key not in PREPROCESS_KEYS}
+            params.update(spec)
+            geometry = geometries.get(id(spec))
+            if geometry is None:
+                # 未知切片类型：由 run_timeslice 报告错误
+                results.append(run_slice(job, spec, pool, log, params))
+                continue
+            # 每个切片使用自己的帧列表（按需解码的帧合成后释放，共用的帧按该切片的位置计数）
+            images = share_frames(frames, slots, geometry.visible_frames())
+            results.append(run_slice(job, spec, pool, log, params, images=images, geometry=geometry,
+                                     strategy=None if shared else memory.strategy))
+    except Exception as e:
+        # 解码失败时该任务的所有切片都记为失败
+        done = {r['slice_type'] for r in results}
+        results += [dict(base, slice_type=spec['slice_type'], error=str(e))
+                    for spec in job['slices'] if spec['slice_type'] not in done]
+        log(f"{job['input_dir']} 失败: {e}")
+    finally:
+        budget.release(estimate)
+
+    for result in results:
+        result["job_seconds"] = time.perf_counter() - start
+    return results
+
+
+def run_batch(jobs, workers=None, memory_limit=None, log=print):
+    """在共享的解码/合成线程池上执行所有任务，返回汇总报告"""
+    workers = workers or os.cpu_count() or 1
+    if memory_limit is None:
+        available = get_available_memory()
+        memory_limit = int(available * 0.5) if available else 4 * 1024 ** 3
+    budget = MemoryBudget(memory_limit)
+    log(f"{len(jobs)} 个任务，{workers} 个工作线程，内存上限 {memory_limit / 2 ** 20:.0f} MB")
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool, \
+            ThreadPoolExecutor(max_workers=workers) as job_pool:
+        # 任务调度线程只负责准入和等待，实际解码与合成都在共享线程池中执行
+        futures = [job_pool.submit(run_job, job, pool, budget, log) for job in jobs]
+        results = [result for future in futures for result in future.result()]
+
+    succeeded = sum(1 for r in results if r['status'] == 'ok')
+    return {
+        "total": len(results),
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "seconds": time.perf_counter() - start,
+        "memory_limit": memory_limit,
+        "results": results
+    }
+
+
+def main(argv=None):
+    """批量处理入口：python cli.py batch manifest.json"""
+    parser = argparse.ArgumentParser(prog="cli.py batch", description="按清单批量生成时间切片")
+    parser.add_argument("manifest", help="JSON/YAML 任务清单")
+    parser.add_argument("--workers", type=int, default=None, help="共享工作线程数（默认 CPU 核数）")
+    parser.add_argument("--memory-limit", type=int, default=None,
+                        help="同时运行任务的估算内存上限（MB，默认可用内存的一半）")
+    parser.add_argument("--report", default=None, help="汇总报告 JSON 路径（默认与清单同名）")
+    args = parser.parse_args(argv)
+
+    manifest_path = Path(args.manifest)
+    jobs = expand_jobs(load_manifest(manifest_path), manifest_path.parent)
+    memory_limit = args.memory_limit * 1024 * 1024 if args.memory_limit else None
+    report = run_batch(jobs, args.workers, memory_limit)
+
+    report_path = Path(args.report) if args.report else manifest_path.with_suffix('.report.json')
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print(f"\n完成 {report['succeeded']}/{report['total']}，失败 {report['failed']}，"
+          f"耗时 {report['seconds']:.1f}s")
+    for result in report['results']:
+        if result['status'] != 'ok':
+            print(f"  失败: {result['input_dir']} [{result['slice_type']}] {result['error'].splitlines()[0]}")
+    print(f"报告已保存至: {report_path}")
+    return 1 if report['failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
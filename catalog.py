@@ -0,0 +1,96 @@
+import os
+import json
+import threading
+from pathlib import Path
+
+# 帧目录文件名（保存在输入目录中）
+CATALOG_NAME = ".timeslice-catalog.json"
+CATALOG_VERSION = 1
+
+
+class FrameCatalog:
+    """帧目录：按帧的相对路径缓存逐帧的分析结果（对齐变换等）
+
+    每条记录保存文件大小和修改时间，文件变化后该帧的所有结果失效。
+    输入目录不可写时只在内存中缓存。
+    """
+
+    def __init__(self, directory, name=CATALOG_NAME):
+        self.path = Path(directory) / name
+        self._frames = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get("version") == CATALOG_VERSION:
+                self._frames = data.get("frames", {})
+        except (OSError, ValueError, AttributeError):
+            pass
+
+    @staticmethod
+    def _stamp(path):
+        # 帧来源中的帧（压缩包成员等）提供与 Path 相同的 stat()
+        stat = path.stat() if hasattr(path, 'stat') else os.stat(path)
+        return stat.st_size, stat.st_mtime_ns
+
+    def _name(self, path):
+        # 压缩包成员按成员路径（不同子目录中的同名成员互不冲突），多页 TIFF 的页和视频帧按帧名称，
+        # 文件按相对帧目录所在目录的路径
+        key = getattr(path, 'key', None)
+        if isinstance(key, str):
+            return key.replace('\\', '/')
+        if key is not None:
+            return path.name
+        try:
+            return Path(os.path.relpath(path, self.path.parent)).as_posix()
+        except ValueError:
+            # Windows 上位于其他驱动器
+            return Path(path).as_posix()
+
+    def frame_id(self, path):
+        """帧的唯一标识（相对路径 + 修改时间），用于记录依赖的其他帧"""
+        return f"{self._name(path)}:{self._stamp(path)[1]}"
+
+    def get(self, path, section):
+        """读取帧的某项分析结果，不存在或文件已变化时返回 None"""
+        size, mtime = self._stamp(path)
+        with self._lock:
+            entry = self._frames.get(self._name(path))
+            if entry is None or entry.get("size") != size or entry.get("mtime_ns") != mtime:
+                return None
+            return entry.get(section)
+
+    def put(self, path, section, value):
+        """保存帧的某项分析结果"""
+        size, mtime = self._stamp(path)
+        name = self._name(path)
+        with self._lock:
+            entry = self._frames.get(name)
+            if entry is None or entry.get("size") != size or entry.get("mtime_ns") != mtime:
+                entry = self._frames[name] = {"size": size, "mtime_ns": mtime}
+            entry[section] = value
+            self._dirty = True
+
+    def save(self):
+        """写入磁盘（先写临时文件再替换），目录不可写时忽略"""
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {"version": CATALOG_VERSION, "frames": self._frames}
+            temp_path = self.path.with_name(self.path.name + ".tmp")
+            try:
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False)
+                os.replace(temp_path, self.path)
+                self._dirty = False
+            except OSError:
+                pass
+
+
+def open_catalog(location):
+    """打开输入对应的帧目录：输入为目录时保存在其中，为文件（压缩包、多页 TIFF、视频）时保存在同一目录下"""
+    location = Path(location)
+    if location.is_dir():
+        return FrameCatalog(location)
+    return FrameCatalog(location.parent, f".{location.name}{CATALOG_NAME}")
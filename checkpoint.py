@@ -0,0 +1,98 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+from pathlib import Path
+
+# 检查点格式版本
+CHECKPOINT_VERSION = 1
+
+# 进度记录文件名
+PROGRESS_NAME = "progress.json"
+
+
+def job_fingerprint(paths, params):
+    """合成任务的指纹：参与合成的帧（路径、大小、修改时间）和影响结果的参数"""
+    frames = []
+    for path in paths:
+        stat = path.stat() if hasattr(path, 'stat') else os.stat(path)
+        frames.append([str(path), stat.st_size, stat.st_mtime_ns])
+    data = json.dumps({"frames": frames, "params": params}, sort_keys=True, default=str)
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+
+def checkpoint_dir(output_dir, name):
+    """检查点目录（输出目录下的隐藏目录）"""
+    return Path(output_dir) / f".{name}.timeslice-checkpoint"
+
+
+class Checkpoint:
+    """合成检查点：磁盘映射的画布文件（canvas.raw）+ 记录已完成帧数的 JSON 进度文件
+
+    逐帧合成时每隔 interval 秒把画布刷新到磁盘并更新进度；进程中断后以相同的
+    输入和参数重新运行时从已完成的帧之后继续。指纹不一致（输入或参数已变化）时从头开始。
+    """
+
+    def __init__(self, directory, fingerprint, interval=30.0):
+        self.directory = Path(directory)
+        self.fingerprint = fingerprint
+        self.interval = interval
+        self.completed = 0
+        self._last_save = time.monotonic()
+
+    @property
+    def progress_path(self):
+        return self.directory / PROGRESS_NAME
+
+    def load(self, size):
+        """读取已有的进度，返回已完成的帧数；不存在、指纹或尺寸不一致时返回 0 并清空目录"""
+        self.completed = 0
+        try:
+            with open(self.progress_path, 'r', encoding='utf-8') as f:
+                progress = json.load(f)
+            canvas_bytes = os.path.getsize(self.directory / "canvas.raw")
+            if (progress.get("version") == CHECKPOINT_VERSION and progress.get("fingerprint") == self.fingerprint
+                    and tuple(progress.get("size", ())) == tuple(size) and canvas_bytes == size[0] * size[1] * 3):
+                self.completed = int(progress.get("completed", 0))
+                return self.completed
+        except (OSError, ValueError, TypeError):
+            pass
+        self.remove()
+        return 0
+
+    def start(self, size):
+        """创建检查点目录并写入初始进度"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.size = tuple(size)
+        if not self.completed:
+            self._write(0)
+
+    def update(self, canvas, completed):
+        """完成一帧后调用：距上次保存超过 interval 秒时保存"""
+        if time.monotonic() - self._last_save >= self.interval:
+            self.save(canvas, completed)
+
+    def save(self, canvas, completed):
+        """把画布刷新到磁盘后再记录进度（进度不会超前于画布）"""
+        canvas.flush()
+        self._write(completed)
+        self.completed = completed
+        self._last_save = time.monotonic()
+
+    def _write(self, completed):
+        progress = {
+            "version": CHECKPOINT_VERSION,
+            "fingerprint": self.fingerprint,
+            "size": list(self.size),
+            "completed": completed,
+            "time": time.time()
+        }
+        temp_path = self.progress_path.with_suffix('.tmp')
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(progress, f)
+        os.replace(temp_path, self.progress_path)
+
+    def remove(self):
+        """删除检查点目录（合成和保存完成后调用）"""
+        shutil.rmtree(self.directory, ignore_errors=True)
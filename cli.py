@@ -1,32 +1,23 @@
 import argparse
 import sys
 import os
+import tempfile
 import traceback
 from pathlib import Path
 from datetime import datetime
 
-from utils import load_images
-from slices import (
-    create_vertical_slice,
-    create_horizontal_slice,
-    create_circular_sector_slice,
-    create_elliptical_sector_slice,
-    create_elliptical_band_slice,
-    create_rectangular_band_slice,
-    create_circular_band_slice,
-    create_vertical_s_slice,
-    create_horizontal_s_slice
-)
-from i18n import Translator
+import i18n
+
+# 图像处理相关模块（PIL、numpy、tqdm 等）在 run_timeslice 中按需导入，
+# 使 --help 和 GUI 启动时不必加载它们
 
 # Windows可执行文件判断
 is_frozen = getattr(sys, 'frozen', False)
 
 
 def get_translator(lang):
-    """获取翻译器"""
-    translator = Translator(lang)
-    return translator
+    """获取翻译器（按语言缓存）"""
+    return i18n.get_translator(lang)
 
 
 def generate_output_filename(base_name, include_timestamp, include_slice_type, slice_type, extension):
@@ -48,7 +39,9 @@ def generate_output_filename(base_name, include_timestamp, include_slice_type, s
             "rectangular_band": "矩形环带",
             "circular_band": "圆形环带",
             "vertical_s": "垂直S型",
-            "horizontal_s": "水平S型"
+            "horizontal_s": "水平S型",
+            "custom_map": "自定义",
+            "linear_angle": "角度"
         }
         type_name = type_map.get(slice_type, slice_type)
         parts.append(type_name)
@@ -65,10 +58,60 @@ def generate_output_filename(base_name, include_timestamp, include_slice_type, s
 
 def run_timeslice(input_dir, output_dir, slice_type, position="center", linear=False, reverse=False,
                   sort_by='name', output_basename='timeslice', include_timestamp=False,
-                  include_slice_type=False, extension='jpg', progress_callback=None):
-    """生成时间切片（仅Windows）"""
+                  include_slice_type=False, extension='jpg', progress_callback=None,
+                  encoder_options=None, extra_extensions=None, encode_workers=None, log_callback=None,
+                  tiled_tiff=False, tile_size=512, pyramid_levels=0, bigtiff=None,
+                  images=None, geometry=None, slots=None, align=False, align_rotation=False,
+                  deflicker=False, deflicker_window=15, memory_limit=None, resize=None, output_sizes=None,
+                  slice_map=None, angle=0.0, dedup=False, dedup_threshold=3, time_uniform=None, seams=False,
+                  resume=False, checkpoint_interval=30.0, cache=False, cache_hash=False,
+                  reveal=None, reveal_size=640, reveal_fps=12, reveal_seconds=5.0, reducer=None, strategy=None):
+    """生成时间切片（仅Windows）
+
+    images 为已加载的图片列表时跳过加载；传入 geometry（与切片参数一致的几何描述）
+    时按其缓存的帧索引图合成，用于常驻服务在多个任务之间复用。此时 strategy 为调用方
+    按内存上限选择的执行策略（帧按需解码时为 streaming/memmap/tiled），默认整幅在内存中合成。
+    由本函数加载图片时先根据切片几何规划，只解码在输出中拥有像素的帧；
+    slots 指定时从所有图片中均匀选取该数量的帧；align 为 True 时估计各帧的
+    平移（align_rotation 时还包括旋转和缩放），deflicker 为 True 时按平滑后的
+    亮度为各帧计算增益，分析结果都缓存在输入目录的帧目录中。
+    memory_limit 为内存上限（字节，默认可用内存的 75%），据此估算峰值内存并选择
+    执行策略：逐帧解码、磁盘映射画布或分块写入 TIFF（分块 TIFF 模式下帧可保留在内存中）。
+    resize 指定时（first/smallest/宽x高）尺寸不同的帧在解码时缩放并居中裁剪到统一尺寸。
+    output_sizes 为最长边尺寸列表（如 [2048, 512]）时由内存中的结果逐级缩小生成小尺寸输出，
+    与全尺寸输出并发编码；分块 TIFF 模式下在写入分块时同步收集缩小的画布。
+    slice_map 为 custom_map 切片的灰度映射图路径（8/16 位，像素值按帧数等分映射到各帧），
+    angle 为 linear_angle 切片的条带推进方向（度，0 为从左到右，90 为从上到下）。
+    dedup 为 True 时在解码前按感知哈希跳过与前一张保留的帧近似重复（汉明距离不超过
+    dedup_threshold）的帧，跳过的帧通过 log_callback 逐个报告。
+    time_uniform 为时刻数时按 EXIF 拍摄时间（只读取文件头）在首尾之间取等间隔时刻，
+    每个时刻选取时间最近的帧，只解码被选中的帧。
+    seams 为 True 时（垂直/水平条带和 S 型曲线）在代理图上寻找相邻帧差异最小的接缝代替固定的分界线。
+    resume 为 True 时逐帧合成到输出目录下检查点目录中的磁盘映射画布，每隔 checkpoint_interval 秒
+    保存已完成的帧数；中断后以相同的输入和参数重新运行时跳过已合成的帧，输入或参数变化时从头开始。
+    cache 为 True 时按输入帧标识（路径、大小、修改时间，cache_hash 时为内容哈希）和影响输出的参数
+    计算任务指纹，缓存中已有该指纹的结果时直接硬链接（或复制）到输出路径，不解码任何图片。
+    reveal 为 webp 或 png 时另外生成合成过程的揭示动画（animated WebP 或 PNG 序列）：最长边
+    reveal_size 的工作画布按帧顺序只更新各帧拥有的区域，帧率 reveal_fps，时长 reveal_seconds 秒。
+    reducer 为 mean/median/lighten 时所有帧按顺序分成 slots 个连续的组（未指定 slots 时每组一帧），
+    每个区域显示组内各帧的平均值、中值或最大值；只在该区域的范围内逐帧累加，内存与每组帧数无关。
+    """
+    from utils import list_image_paths, load_frames, share_frames, DEFAULT_MAX_OPEN
+    from encoding import (encode_outputs, format_encode_stats, normalize_extension, parse_output_sizes,
+                          make_variants, variant_path)
+    from geometry import get_geometry
+    from compositor import composite_to_tiff, composite_image, composite_memmap, array_to_tiff, ReducedCanvas
+    from reveal import render_reveal, reveal_path
+    from planner import plan_frames, choose_strategy, default_memory_limit, dedupe_slots
+
     translator = get_translator('en')
 
+    output_sizes = parse_output_sizes(output_sizes) if output_sizes else []
+
+    # 分块 TIFF 模式只能输出 TIFF
+    if tiled_tiff and normalize_extension(extension) not in ('tif', 'tiff'):
+        extension = 'tif'
+
     # 确保输入目录存在
     if not os.path.exists(input_dir):
         raise Exception(f"{translator.tr('输入目录不存在:')} {input_dir}")
@@ -94,30 +137,274 @@ def run_timeslice(input_dir, output_dir, slice_type, position="center", linear=F
 
     output_path = Path(output_dir) / output_filename
 
-    # 加载图片
-    try:
-        images = load_images(input_dir, sort_by, reverse)
-    except Exception as e:
-        raise Exception(f"{translator.tr('加载图片失败:')} {str(e)}")
+    # 结果缓存：输入和参数都未变化时直接使用缓存的输出（PNG 序列的动画目录不缓存）
+    result_cache = None
+    paths = None
+    if cache and images is None and reveal != "png":
+        from result_cache import ResultCache, job_fingerprint, input_identities
+        try:
+            paths = list_image_paths(input_dir, sort_by, reverse)
+        except Exception as e:
+            raise Exception(f"{translator.tr('加载图片失败:')} {str(e)}")
+        fingerprint = job_fingerprint(paths, {
+            "slice_type": slice_type, "position": position, "linear": linear, "sort_by": sort_by,
+            "reverse": reverse, "extension": normalize_extension(extension),
+            "extra_extensions": [normalize_extension(extra) for extra in extra_extensions or []],
+            "encoder_options": encoder_options, "tiled_tiff": tiled_tiff, "tile_size": tile_size,
+            "pyramid_levels": pyramid_levels, "bigtiff": bigtiff, "slots": slots, "align": align,
+            "align_rotation": align_rotation, "deflicker": deflicker, "deflicker_window": deflicker_window,
+            "resize": resize, "output_sizes": output_sizes, "angle": angle, "dedup": dedup,
+            "dedup_threshold": dedup_threshold, "time_uniform": time_uniform, "seams": seams,
+            "slice_map": input_identities([slice_map], cache_hash) if slice_map else None,
+            "reveal": [reveal, reveal_size, reveal_fps, reveal_seconds] if reveal else None,
+            "reducer": reducer
+        }, cache_hash)
+        result_cache = ResultCache()
+        if result_cache.fetch(fingerprint, output_path) is not None:
+            if log_callback:
+                log_callback(f"{translator.tr('使用缓存的结果:')} {fingerprint[:16]}")
+            return str(output_path)
+
+    # 加载图片（只解码在输出中可见的帧，未加载的位置为 None）
+    strategy = strategy if images is not None and strategy else "in-memory"
+    checkpoint = None
+    # 由本函数加载的帧在其区域合成后立即释放；调用方按需解码的帧（指定了 strategy）同样释放，
+    # 此时调用方每次传入帧列表的副本
+    release = images is None or strategy != "in-memory"
+    if images is None:
+        try:
+            if paths is None:
+                paths = list_image_paths(input_dir, sort_by, reverse)
+            catalog = None
+            if align or deflicker or dedup or time_uniform:
+                from catalog import open_catalog
+                catalog = open_catalog(input_dir)
+            if dedup:
+                # 近似重复的帧在规划和解码之前跳过
+                from dedup import find_duplicates
+                paths, duplicates = find_duplicates(paths, dedup_threshold, catalog, log_callback=log_callback)
+                if duplicates and log_callback:
+                    log_callback(f"{translator.tr('跳过近似重复的图片:')} {len(duplicates)}/"
+                                 f"{len(paths) + len(duplicates)}")
+                    for path, similar, distance in duplicates:
+                        log_callback(f"  {path.name} ≈ {similar.name} ({translator.tr('距离')} {distance})")
+            if time_uniform:
+                # 按拍摄时间均匀选帧（按时间排序，逆序时反转）
+                from planner import capture_times, select_time_uniform
+                selected = select_time_uniform(capture_times(paths, catalog), time_uniform)
+                if reverse:
+                    selected.reverse()
+                if log_callback:
+                    log_callback(f"{translator.tr('按拍摄时间均匀选取:')} {len(set(selected))}/{len(paths)} "
+                                 f"({time_uniform} {translator.tr('个时刻')})")
+                paths = [paths[i] for i in selected]
+            if reducer:
+                # 所有帧按区域数分成连续的组，几何按区域数规划，每组以第一帧代表
+                from reducers import group_frames
+                groups = group_frames(len(paths), slots or len(paths))
+                plan = plan_frames([paths[group[0]] for group in groups], slice_type, position, linear,
+                                   None, tile_size if tiled_tiff else None, resize, slice_map, angle)
+                frame_paths = paths
+                frame_indices = [i for k in plan.visible for i in groups[k]]
+                if log_callback:
+                    log_callback(f"{translator.tr('区域归约:')} {reducer}, {len(paths)} {translator.tr('张图片')} -> "
+                                 f"{len(groups)} {translator.tr('个区域')}")
+            else:
+                plan = plan_frames(paths, slice_type, position, linear,
+                                   slots, tile_size if tiled_tiff else None, resize, slice_map, angle)
+                frame_paths, frame_indices = plan.paths, plan.visible
+            if plan.skipped and log_callback:
+                log_callback(f"{translator.tr('跳过未出现在输出中的图片:')} {plan.skipped}/{plan.total}")
+            if seams:
+                from seams import optimize_seams, SEAM_SLICE_TYPES
+                if slice_type not in SEAM_SLICE_TYPES:
+                    raise ValueError(translator.tr("接缝优化只支持垂直/水平条带和 S 型曲线"))
+                plan.geometry = optimize_seams(plan.geometry, plan.paths, plan.visible,
+                                               size=plan.geometry.size if resize else None,
+                                               log_callback=log_callback)
+
+            # 按估算的峰值内存选择执行策略
+            if memory_limit is None:
+                memory_limit = default_memory_limit()
+            memory = choose_strategy(plan, memory_limit, normalize_extension(extension) in ('tif', 'tiff'),
+                                     tiled_tiff, tile_size)
+            strategy = memory.strategy
+            if resume:
+                # 检查点保存磁盘映射的画布，逐帧合成后再编码（TIFF 输出由画布逐块写入）
+                strategy = "tiled" if tiled_tiff or strategy == "tiled" else "memmap"
+            if log_callback:
+                limit = f"{memory.limit / 2 ** 20:.0f} MB" if memory.limit else "-"
+                log_callback(f"{translator.tr('执行策略:')} {strategy} ({translator.tr('估算峰值内存')} "
+                             f"{memory.estimate / 2 ** 20:.0f} MB / {translator.tr('内存上限')} {limit})")
+                if not memory.fits:
+                    log_callback(translator.tr("所有执行策略的估算内存都超过上限，使用占用最小的策略"))
+            if resume:
+                from checkpoint import Checkpoint, checkpoint_dir, job_fingerprint
+                fingerprint = job_fingerprint(frame_paths, {
+                    "slice_type": slice_type, "position": position, "linear": linear, "slots": slots,
+                    "resize": resize, "slice_map": slice_map, "angle": angle, "seams": seams, "align": align,
+                    "align_rotation": align_rotation, "deflicker": deflicker,
+                    "deflicker_window": deflicker_window, "reducer": reducer, "size": plan.geometry.size
+                })
+                checkpoint = Checkpoint(checkpoint_dir(output_dir, f"{output_basename}-{slice_type}"),
+                                        fingerprint, checkpoint_interval)
+                existed = checkpoint.directory.exists()
+                done = checkpoint.load(plan.geometry.size)
+                if log_callback:
+                    if done:
+                        log_callback(f"{translator.tr('从检查点继续:')} {done}/{plan.geometry.num_images}")
+                    elif existed:
+                        log_callback(translator.tr("检查点与当前输入或参数不一致，从头开始"))
+            if strategy == "tiled":
+                tiled_tiff = True
+
+            # 帧对象只保存路径，合成到该帧时才解码；分块合成时帧会被多个分块用到，不限制打开数量
+            # 同一帧占据多个位置时（按拍摄时间选帧）只加载、对齐和去闪烁一次，再放回各位置
+            target_size = plan.geometry.size if resize else None
+            unique_paths, unique_indices, frame_slots = dedupe_slots(frame_paths, frame_indices)
+            images = load_frames(unique_paths, unique_indices, None if strategy == "in-memory" else DEFAULT_MAX_OPEN,
+                                 target_size)
+            geometry = plan.geometry
+            # 对齐前先检查尺寸（未统一尺寸时不同尺寸的帧无法对齐和合成）
+            if not resize and any(images[i].size != geometry.size for i in unique_indices):
+                raise ValueError(f"{translator.tr('所有图片必须具有相同的尺寸')} "
+                                 f"{translator.tr('（可使用 --resize 统一尺寸）')}")
+            if align:
+                from align import align_frames
+                images = align_frames(unique_paths, images, unique_indices, align_rotation,
+                                      catalog=catalog, log_callback=log_callback, size=target_size)
+            if deflicker:
+                from deflicker import deflicker_frames
+                images = deflicker_frames(unique_paths, images, unique_indices, deflicker_window,
+                                          catalog=catalog, log_callback=log_callback)
+            images = share_frames(images, frame_slots, frame_indices)
+            if reducer:
+                # 每个区域的帧在合成到该区域时才逐帧读取并归约
+                from reducers import reduce_groups
+                images = reduce_groups(images, groups, plan.visible, geometry, reducer)
+        except Exception as e:
+            raise Exception(f"{translator.tr('加载图片失败:')} {str(e)}")
 
     if not images:
         raise Exception(translator.tr("输入目录中没有找到图片"))
+    if strategy == "tiled":
+        tiled_tiff = True
 
     # 检查尺寸
-    base_size = images[0].size
+    base_size = geometry.size if geometry is not None else images[0].size
     for img in images:
-        if img.size != base_size:
+        if img is not None and img.size != base_size:
             raise Exception(translator.tr("所有图片必须具有相同的尺寸"))
 
     # 进度回调
     if progress_callback:
         progress_callback(0)
 
+    # 输出格式（主格式 + 额外格式，额外格式与主文件同名仅扩展名不同）
+    formats = [(output_path, extension)]
+    for extra in extra_extensions or []:
+        extra = normalize_extension(extra)
+        if extra and extra != normalize_extension(extension):
+            formats.append((output_path.with_suffix('.' + extra), extra))
+
+    def variant_targets(variants, formats):
+        # 每个缩小版本按各输出格式编码
+        return [(variant_path(path, max_side), ext, variant) for max_side, variant in variants for path, ext in formats]
+
+    def write_reveal(image, full_size=None):
+        # 揭示动画由缩小到目标尺寸的结果生成，不重新读取各帧
+        small = make_variants(image, [reveal_size], full_size)
+        return render_reveal(small[0][1] if small else image, geometry, output_path, reveal, reveal_fps,
+                             reveal_seconds)
+
+    # 分块合成并流式写入 TIFF，整幅结果不会同时存在于内存中
+    if tiled_tiff:
+        if extra_extensions and log_callback:
+            if output_sizes:
+                log_callback(translator.tr("分块 TIFF 模式下其他格式只用于缩小的输出"))
+            else:
+                log_callback(translator.tr("分块 TIFF 模式不支持同时输出其他格式"))
+        compression = 'none' if (encoder_options or {}).get('tiff_compression') == 'none' else 'deflate'
+        writer_options = dict(compression=compression, bigtiff=bigtiff, pyramid_levels=pyramid_levels)
+        try:
+            if geometry is None:
+                geometry = get_geometry(slice_type, base_size, len(images), position, linear, slice_map, angle)
+            # 缩小的输出和揭示动画由写入分块时同步收集的缩小画布生成
+            reduced_sides = output_sizes + ([reveal_size] if reveal else [])
+            reduced = ReducedCanvas(geometry.size, max(reduced_sides), tile_size) if reduced_sides else None
+            if strategy == "tiled":
+                # 逐帧合成到磁盘映射的画布，再逐块写入
+                if checkpoint is not None:
+                    canvas = composite_memmap(images, geometry, checkpoint.directory, progress_callback,
+                                              checkpoint=checkpoint, release=release)
+                    stats = array_to_tiff(canvas, output_path, tile_size, reduced, **writer_options)
+                    del canvas
+                else:
+                    with tempfile.TemporaryDirectory(prefix=".timeslice-", dir=output_dir) as temp_dir:
+                        canvas = composite_memmap(images, geometry, temp_dir, progress_callback, release=release)
+                        stats = array_to_tiff(canvas, output_path, tile_size, reduced, **writer_options)
+                        del canvas
+            else:
+                stats = composite_to_tiff(images, geometry, output_path, tile_size, release, reduced,
+                                          **writer_options)
+            encode_stats = [stats]
+            outputs = [output_path]
+            if output_sizes:
+                variants = make_variants(reduced.image(), output_sizes, geometry.size)
+                targets = variant_targets(variants, formats)
+                encode_stats += encode_outputs(None, targets, encoder_options, encode_workers)
+                outputs += [target[0] for target in targets]
+            if reveal:
+                encode_stats.append(write_reveal(reduced.image(), geometry.size))
+                outputs.append(reveal_path(output_path, reveal))
+        except Exception as e:
+            raise Exception(f"{translator.tr('保存图片失败:')} {str(e)}")
+        if checkpoint is not None:
+            checkpoint.remove()
+        if result_cache is not None:
+            result_cache.store(fingerprint, output_path, outputs,
+                               {"input_dir": str(input_dir), "slice_type": slice_type})
+        if log_callback:
+            for stats in encode_stats:
+                log_callback(f"{translator.tr('编码完成:')} {format_encode_stats(stats)}")
+        return str(output_path)
+
     # 在 run_timeslice 函数中修改切片生成部分
     # 生成切片
     result = None
     try:
-        if slice_type == "vertical":
+        if geometry is None and slice_type in ("custom_map", "linear_angle"):
+            # 自定义映射图和任意角度条带只有几何实现
+            geometry = get_geometry(slice_type, base_size, len(images), position, linear, slice_map, angle)
+        if geometry is None:
+            # 未使用几何合成时才导入逐帧切片函数
+            from slices import (
+                create_vertical_slice,
+                create_horizontal_slice,
+                create_circular_sector_slice,
+                create_elliptical_sector_slice,
+                create_elliptical_band_slice,
+                create_rectangular_band_slice,
+                create_circular_band_slice,
+                create_vertical_s_slice,
+                create_horizontal_s_slice
+            )
+
+        if geometry is not None and strategy == "memmap" and checkpoint is not None:
+            from PIL import Image
+            canvas = composite_memmap(images, geometry, checkpoint.directory, progress_callback,
+                                      checkpoint=checkpoint, release=release)
+            result = Image.fromarray(canvas)
+            del canvas
+        elif geometry is not None and strategy == "memmap":
+            from PIL import Image
+            with tempfile.TemporaryDirectory(prefix=".timeslice-", dir=output_dir) as temp_dir:
+                canvas = composite_memmap(images, geometry, temp_dir, progress_callback, release=release)
+                result = Image.fromarray(canvas)
+                del canvas
+        elif geometry is not None:
+            result = composite_image(images, geometry, progress_callback, release)
+        elif slice_type == "vertical":
             result = create_vertical_slice(images, position, linear)
         elif slice_type == "horizontal":
             result = create_horizontal_slice(images, position, linear)
@@ -148,26 +435,47 @@ def run_timeslice(input_dir, output_dir, slice_type, position="center", linear=F
         error_details = traceback.format_exc()
         raise Exception(f"{translator.tr('生成切片失败:')}\n{str(e)}\n{error_details}")  # 修改这里
 
-    # 保存图片
+    # 保存图片：全尺寸和缩小的输出在同一个线程池中并发编码
+    targets = list(formats)
+    if output_sizes:
+        targets += variant_targets(make_variants(result, output_sizes), formats)
+
     try:
-        # 根据扩展名选择保存参数
-        if extension.lower() in ['jpg', 'jpeg']:
-            result.save(output_path, "JPEG", quality=100, subsampling=0)
-        elif extension.lower() == 'png':
-            result.save(output_path, "PNG", optimize=True)
-        elif extension.lower() == 'webp':
-            result.save(output_path, "WEBP", quality=95)
-        else:
-            # 默认使用JPEG
-            result.save(output_path, "JPEG", quality=100, subsampling=0)
+        encode_stats = encode_outputs(result, targets, encoder_options, encode_workers)
+        if reveal:
+            if geometry is None:
+                geometry = get_geometry(slice_type, base_size, len(images), position, linear, slice_map, angle)
+            encode_stats.append(write_reveal(result))
+            targets.append((reveal_path(output_path, reveal), reveal))
     except Exception as e:
         raise Exception(f"{translator.tr('保存图片失败:')} {str(e)}")
+    # 输出保存完成后才删除检查点
+    if checkpoint is not None:
+        checkpoint.remove()
+    if result_cache is not None:
+        result_cache.store(fingerprint, output_path, [target[0] for target in targets],
+                           {"input_dir": str(input_dir), "slice_type": slice_type})
+
+    if log_callback:
+        for stats in encode_stats:
+            log_callback(f"{translator.tr('编码完成:')} {format_encode_stats(stats)}")
 
     return str(output_path)
 
 
 def main():
     """CLI主函数（仅Windows）"""
+    # 子命令：常驻渲染服务、批量处理
+    if len(sys.argv) > 1 and sys.argv[1] == "serve":
+        from service import main as serve_main
+        return serve_main(sys.argv[2:])
+    if len(sys.argv) > 1 and sys.argv[1] == "batch":
+        from batch import main as batch_main
+        sys.exit(batch_main(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "cache":
+        from result_cache import main as cache_main
+        sys.exit(cache_main(sys.argv[2:]))
+
     default_translator = get_translator('en')
 
     # 参数解析
@@ -179,7 +487,7 @@ def main():
     parser.add_argument(
         "-i", "--input",
         default="input",
-        help=default_translator.tr("输入文件夹路径（默认为\"input\"）")
+        help=default_translator.tr("输入文件夹、zip/tar 压缩包、多页 TIFF 或视频文件路径（默认为\"input\"）")
     )
     parser.add_argument(
         "-o", "--output",
@@ -192,7 +500,7 @@ def main():
         choices=["vertical", "horizontal", "circular_sector",
                  "elliptical_sector", "elliptical_band",
                  "rectangular_band", "circular_band",
-                 "vertical_s", "horizontal_s"],
+                 "vertical_s", "horizontal_s", "custom_map", "linear_angle"],
         help=default_translator.tr("切片类型（必需）")
     )
     parser.add_argument(
@@ -200,6 +508,17 @@ def main():
         default="center",
         help=default_translator.tr("条带位置：left/center/right/top/bottom 或 0.0-1.0")
     )
+    parser.add_argument(
+        "--slice-map",
+        default=None,
+        help=default_translator.tr("custom_map 切片的映射图（8/16 位灰度图，像素值按帧数等分映射到各帧）")
+    )
+    parser.add_argument(
+        "--angle",
+        type=float,
+        default=0.0,
+        help=default_translator.tr("linear_angle 切片的条带推进方向（度，0 为从左到右，90 为从上到下）")
+    )
     parser.add_argument(
         "-l", "--linear",
         action="store_true",
@@ -234,9 +553,225 @@ def main():
     parser.add_argument(
         "--extension",
         default="jpg",
-        choices=["jpg", "jpeg", "png", "webp"],
+        choices=["jpg", "jpeg", "png", "webp", "tif", "tiff"],
         help=default_translator.tr("输出文件扩展名")
     )
+    parser.add_argument(
+        "--extra-formats",
+        default="",
+        help=default_translator.tr("同时输出的其他格式，逗号分隔（如 png,webp）")
+    )
+    parser.add_argument(
+        "--encode-threads",
+        type=int,
+        default=None,
+        help=default_translator.tr("并发编码线程数（默认每种格式一个线程）")
+    )
+    parser.add_argument(
+        "--output-sizes",
+        default=None,
+        help=default_translator.tr("同时输出的缩小版本的最长边，逗号分隔（如 2048,512），由内存中的结果缩小生成")
+    )
+    parser.add_argument(
+        "--reveal",
+        choices=["webp", "png"],
+        default=None,
+        help=default_translator.tr("同时输出合成过程的揭示动画（animated WebP 或 PNG 序列）")
+    )
+    parser.add_argument(
+        "--reveal-size",
+        type=int,
+        default=640,
+        help=default_translator.tr("揭示动画的最长边（像素）")
+    )
+    parser.add_argument(
+        "--reveal-fps",
+        type=float,
+        default=12,
+        help=default_translator.tr("揭示动画的帧率")
+    )
+    parser.add_argument(
+        "--reveal-seconds",
+        type=float,
+        default=5.0,
+        help=default_translator.tr("揭示动画的时长（秒，动画帧数不超过参与合成的图片数）")
+    )
+    parser.add_argument(
+        "--quality",
+        type=int,
+        default=None,
+        help=default_translator.tr("JPEG/WebP 质量 1-100（默认 JPEG 100，WebP 95）")
+    )
+    parser.add_argument(
+        "--subsampling",
+        default="444",
+        choices=["444", "422", "420"],
+        help=default_translator.tr("JPEG 色度抽样")
+    )
+    parser.add_argument(
+        "--progressive",
+        action="store_true",
+        help=default_translator.tr("输出渐进式 JPEG")
+    )
+    parser.add_argument(
+        "--png-compress-level",
+        type=int,
+        default=6,
+        choices=range(10),
+        metavar="0-9",
+        help=default_translator.tr("PNG 压缩级别 0-9")
+    )
+    parser.add_argument(
+        "--png-strategy",
+        default="default",
+        choices=["default", "filtered", "huffman", "rle", "fixed"],
+        help=default_translator.tr("PNG 压缩策略")
+    )
+    parser.add_argument(
+        "--png-optimize",
+        action="store_true",
+        help=default_translator.tr("PNG 优化压缩（体积更小但非常慢）")
+    )
+    parser.add_argument(
+        "--tiff-compression",
+        default="lzw",
+        choices=["none", "lzw", "deflate"],
+        help=default_translator.tr("TIFF 压缩方式")
+    )
+    parser.add_argument(
+        "--tiled-tiff",
+        action="store_true",
+        help=default_translator.tr("分块合成并流式写入分块 TIFF（适合超大输出，LZW 按 Deflate 处理）")
+    )
+    parser.add_argument(
+        "--tile-size",
+        type=int,
+        default=512,
+        help=default_translator.tr("分块尺寸（像素，16 的倍数）")
+    )
+    parser.add_argument(
+        "--pyramid-levels",
+        type=int,
+        default=0,
+        help=default_translator.tr("分块 TIFF 中额外生成的金字塔层数")
+    )
+    parser.add_argument(
+        "--bigtiff",
+        action="store_true",
+        default=None,
+        help=default_translator.tr("强制使用 BigTIFF（默认按输出大小自动选择）")
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help=default_translator.tr("监听输入目录，新图片到达时增量合成并更新预览")
+    )
+    parser.add_argument(
+        "--frame-count",
+        type=int,
+        default=None,
+        help=default_translator.tr("监听模式下预计的最终帧数")
+    )
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=1.0,
+        help=default_translator.tr("监听模式的轮询间隔（秒）")
+    )
+    parser.add_argument(
+        "--preview-size",
+        type=int,
+        default=2048,
+        help=default_translator.tr("监听模式预览图的最长边（像素，0 为原尺寸）")
+    )
+    parser.add_argument(
+        "--slots",
+        type=int,
+        default=None,
+        help=default_translator.tr("从所有图片中均匀选取的帧数（默认使用全部图片）")
+    )
+    parser.add_argument(
+        "--reducer",
+        choices=["mean", "median", "lighten"],
+        default=None,
+        help=default_translator.tr("区域归约：所有图片按顺序分成 --slots 个连续的组，每个区域显示组内图片的平均值、中值或最大值")
+    )
+    parser.add_argument(
+        "--time-uniform",
+        type=int,
+        default=None,
+        metavar="SLOTS",
+        help=default_translator.tr("按拍摄时间均匀选帧：在首尾拍摄时间之间取 SLOTS 个等间隔时刻，每个时刻使用时间最近的图片")
+    )
+    parser.add_argument(
+        "--align",
+        action="store_true",
+        help=default_translator.tr("对齐各帧（修正手持或三脚架漂移造成的平移）")
+    )
+    parser.add_argument(
+        "--align-rotation",
+        action="store_true",
+        help=default_translator.tr("对齐时同时估计旋转和缩放")
+    )
+    parser.add_argument(
+        "--deflicker",
+        action="store_true",
+        help=default_translator.tr("去闪烁：平滑各帧之间的亮度变化")
+    )
+    parser.add_argument(
+        "--deflicker-window",
+        type=int,
+        default=15,
+        help=default_translator.tr("去闪烁的平滑窗口（帧数）")
+    )
+    parser.add_argument(
+        "--seams",
+        action="store_true",
+        help=default_translator.tr("内容感知接缝：在代理图上寻找相邻帧差异最小的分界线（垂直/水平条带和 S 型曲线）")
+    )
+    parser.add_argument(
+        "--dedup",
+        action="store_true",
+        help=default_translator.tr("跳过近似重复的图片（按内嵌缩略图或小代理图的感知哈希，在解码前判断）")
+    )
+    parser.add_argument(
+        "--dedup-threshold",
+        type=int,
+        default=3,
+        help=default_translator.tr("近似重复的汉明距离阈值（64 位哈希中不同的位数）")
+    )
+    parser.add_argument(
+        "--resize",
+        default=None,
+        help=default_translator.tr("统一帧尺寸：first（第一张）、smallest（最小的一张）或 宽x高，尺寸不同的帧解码时缩放并居中裁剪")
+    )
+    parser.add_argument(
+        "--memory-limit",
+        type=int,
+        default=None,
+        help=default_translator.tr("内存上限（MB，默认可用内存的 75%%），据此自动选择执行策略")
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help=default_translator.tr("定期保存合成进度的检查点，中断后以相同参数重新运行时从检查点继续")
+    )
+    parser.add_argument(
+        "--checkpoint-interval",
+        type=float,
+        default=30.0,
+        help=default_translator.tr("检查点保存间隔（秒）")
+    )
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        help=default_translator.tr("结果缓存：输入和参数都未变化时直接使用缓存的输出，不解码图片")
+    )
+    parser.add_argument(
+        "--cache-hash",
+        action="store_true",
+        help=default_translator.tr("结果缓存按文件内容哈希（而不是大小和修改时间）识别输入")
+    )
     parser.add_argument(
         "-lang", "--language",
         default="en",
@@ -254,21 +789,96 @@ def main():
                 sys.stdout.write(f"\r{translator.tr('已处理')} {current} {translator.tr('张图片')}")
                 sys.stdout.flush()
 
-        # 生成切片
-        output_path = run_timeslice(
-            input_dir=args.input,
-            output_dir=args.output,
-            slice_type=args.type,
-            position=args.position,
-            linear=args.linear,
-            reverse=args.reverse,
-            sort_by=args.sort_by,
-            output_basename=args.output_name,
-            include_timestamp=args.include_timestamp,
-            include_slice_type=args.include_slice_type,
-            extension=args.extension,
-            progress_callback=progress_callback
-        )
+        encoder_options = {
+            'quality': args.quality,
+            'subsampling': args.subsampling,
+            'progressive': args.progressive,
+            'png_compress_level': args.png_compress_level,
+            'png_strategy': args.png_strategy,
+            'png_optimize': args.png_optimize,
+            'tiff_compression': args.tiff_compression
+        }
+
+        if args.watch:
+            # 监听模式：逐帧增量合成
+            from watch import watch_timeslice
+            from encoding import format_encode_stats
+            if not args.frame_count:
+                parser.error(translator.tr("监听模式需要指定 --frame-count"))
+            Path(args.output).mkdir(parents=True, exist_ok=True)
+            output_path = Path(args.output) / generate_output_filename(
+                base_name=args.output_name,
+                include_timestamp=args.include_timestamp,
+                include_slice_type=args.include_slice_type,
+                slice_type=args.type,
+                extension=args.extension
+            )
+            stats = watch_timeslice(
+                input_dir=args.input,
+                output_path=output_path,
+                slice_type=args.type,
+                frame_count=args.frame_count,
+                position=args.position,
+                linear=args.linear,
+                reverse=args.reverse,
+                sort_by=args.sort_by,
+                extension=args.extension,
+                encoder_options=encoder_options,
+                poll_interval=args.poll_interval,
+                preview_max_size=args.preview_size,
+                resize=args.resize,
+                slice_map=args.slice_map,
+                angle=args.angle
+            )
+            print(f"{translator.tr('编码完成:')} {format_encode_stats(stats)}")
+            output_path = stats['path']
+        else:
+            # 生成切片
+            output_path = run_timeslice(
+                input_dir=args.input,
+                output_dir=args.output,
+                slice_type=args.type,
+                position=args.position,
+                linear=args.linear,
+                reverse=args.reverse,
+                sort_by=args.sort_by,
+                output_basename=args.output_name,
+                include_timestamp=args.include_timestamp,
+                include_slice_type=args.include_slice_type,
+                extension=args.extension,
+                progress_callback=progress_callback,
+                encoder_options=encoder_options,
+                extra_extensions=[ext.strip() for ext in args.extra_formats.split(',') if ext.strip()],
+                encode_workers=args.encode_threads,
+                log_callback=lambda message: print(f"\n{message}"),
+                tiled_tiff=args.tiled_tiff,
+                tile_size=args.tile_size,
+                pyramid_levels=args.pyramid_levels,
+                bigtiff=args.bigtiff,
+                slots=args.slots,
+                reducer=args.reducer,
+                align=args.align or args.align_rotation,
+                align_rotation=args.align_rotation,
+                deflicker=args.deflicker,
+                deflicker_window=args.deflicker_window,
+                memory_limit=args.memory_limit * 1024 * 1024 if args.memory_limit else None,
+                resize=args.resize,
+                output_sizes=args.output_sizes,
+                reveal=args.reveal,
+                reveal_size=args.reveal_size,
+                reveal_fps=args.reveal_fps,
+                reveal_seconds=args.reveal_seconds,
+                slice_map=args.slice_map,
+                angle=args.angle,
+                dedup=args.dedup,
+                dedup_threshold=args.dedup_threshold,
+                time_uniform=args.time_uniform,
+                seams=args.seams,
+                resume=args.resume,
+                checkpoint_interval=args.checkpoint_interval,
+                cache=args.cache or args.cache_hash,
+                cache_hash=args.cache_hash
+            )
 
         # 输出结果
         print(f"\n{translator.tr('处理完成!')}")
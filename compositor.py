@@ -0,0 +1,230 @@
+import os
+import sys
+import time
+import numpy as np
+from PIL import Image
+
+from tiff_writer import TiledTiffWriter
+
+# 检查是否为打包环境
+is_frozen = getattr(sys, 'frozen', False)
+
+# 在打包环境中禁用 tqdm
+if not is_frozen:
+    from tqdm import tqdm
+else:
+    # 在打包环境中，创建一个简单的替代函数
+    def tqdm(iterable=None, desc=None, **kwargs):
+        if desc and not kwargs.get('disable'):
+            print(f"{desc}...")
+        return iterable
+
+
+def iter_tile_boxes(size, tile_size):
+    """按行优先顺序生成分块区域 (left, top, right, bottom)"""
+    img_w, img_h = size
+    for top in range(0, img_h, tile_size):
+        for left in range(0, img_w, tile_size):
+            yield left, top, min(left + tile_size, img_w), min(top + tile_size, img_h)
+
+
+def array_region(array, box):
+    """从 (h, w, 3) 数组中取出区域 box（超出范围的部分为黑色），区域在数组内时返回视图"""
+    left, top, right, bottom = box
+    img_h, img_w = array.shape[:2]
+    if left >= 0 and top >= 0 and right <= img_w and bottom <= img_h:
+        return array[top:bottom, left:right]
+    region = np.zeros((bottom - top, right - left, 3), dtype=np.uint8)
+    src_l, src_t = max(left, 0), max(top, 0)
+    src_r, src_b = min(right, img_w), min(bottom, img_h)
+    if src_l < src_r and src_t < src_b:
+        region[src_t - top:src_b - top, src_l - left:src_r - left] = array[src_t:src_b, src_l:src_r]
+    return region
+
+
+def frame_region(image, geometry, i, box):
+    """读取帧 i 中与输出区域 box 对应的源像素，返回 (h, w, 3) 的 uint8 数组
+
+    帧可以是 PIL 图片（或提供 crop 的帧对象），也可以是 (h, w, 3) 的 uint8 数组。
+    """
+    left, top, right, bottom = box
+    dx, dy = geometry.frame_offset(i)
+    if isinstance(image, np.ndarray):
+        return array_region(image, (left + dx, top + dy, right + dx, bottom + dy))
+    src = image.crop((left + dx, top + dy, right + dx, bottom + dy))
+    if src.mode != 'RGB':
+        src = src.convert('RGB')
+    return np.asarray(src)
+
+
+def release_frame(images, i):
+    """释放第 i 帧：帧对象（或其包装）交还解码器池，并从列表中移除"""
+    image = images[i]
+    if image is not None and hasattr(image, 'release'):
+        image.release()
+    images[i] = None
+
+
+def composite_tile(images, geometry, box, labels=None):
+    """合成输出中的一个区域，返回 (h, w, 3) 的 uint8 数组
+
+    仅读取该区域内出现的帧，每帧只裁剪对应的源区域。
+    labels 为该区域预先计算好的帧索引图（可选）。
+    """
+    left, top, right, bottom = box
+    if labels is None:
+        labels = geometry.label_tile(box)
+    tile = np.zeros((bottom - top, right - left, 3), dtype=np.uint8)
+    for i in np.unique(labels):
+        if i < 0:
+            continue
+        mask = labels == i
+        tile[mask] = frame_region(images[i], geometry, i, box)[mask]
+    return tile
+
+
+def composite_into(canvas, images, geometry, labels, progress_callback=None, release=False, quiet=False,
+                   start=0, checkpoint_callback=None):
+    """按帧索引图 labels 将各帧合成到 canvas（两者都可以是磁盘映射数组）
+
+    release 为 True 时每帧的区域合成后立即释放该帧解码的像素；quiet 为 True 时不显示进度条。
+    start 为从检查点继续时已合成的帧数，checkpoint_callback(已完成帧数) 在每帧合成后调用。
+    """
+    for i in tqdm(range(start, geometry.num_images), desc="合成图片", disable=quiet):
+        box = geometry.frame_bbox(i)
+        if box is not None:
+            left, top, right, bottom = box
+            mask = labels[top:bottom, left:right] == i
+            if mask.any():
+                canvas[top:bottom, left:right][mask] = frame_region(images[i], geometry, i, box)[mask]
+        if release:
+            release_frame(images, i)
+        if progress_callback:
+            progress_callback(i + 1)
+        if checkpoint_callback:
+            checkpoint_callback(i + 1)
+    return canvas
+
+
+def composite_image(images, geometry, progress_callback=None, release=False):
+    """按帧索引图一次性合成整幅输出（帧索引图由 geometry 缓存）"""
+    img_w, img_h = geometry.size
+    result = np.zeros((img_h, img_w, 3), dtype=np.uint8)
+    composite_into(result, images, geometry, geometry.label_map(), progress_callback, release)
+    return Image.fromarray(result)
+
+
+def composite_memmap(images, geometry, temp_dir, progress_callback=None, rows=256, checkpoint=None, release=True):
+    """在输出目录的临时文件上合成整幅输出，返回磁盘映射的画布数组
+
+    帧索引图未缓存时逐条计算并同样写入磁盘；release 为 True 时各帧合成后立即释放
+    （帧列表由调用方在多次合成之间共用时传入 False）。
+    checkpoint 指定时画布位于检查点目录：定期保存进度，并跳过检查点中已合成的帧。
+    """
+    img_w, img_h = geometry.size
+    start = 0
+    if checkpoint is not None:
+        start = checkpoint.completed
+        checkpoint.start(geometry.size)
+    # 从检查点继续时打开已有的画布
+    canvas = np.memmap(os.path.join(temp_dir, "canvas.raw"), dtype=np.uint8, mode='r+' if start else 'w+',
+                       shape=(img_h, img_w, 3))
+    if geometry.nbytes():
+        labels = geometry.label_map()
+    else:
+        labels = np.memmap(os.path.join(temp_dir, "labels.raw"), dtype=np.int32, mode='w+', shape=(img_h, img_w))
+        for top in range(0, img_h, rows):
+            bottom = min(top + rows, img_h)
+            labels[top:bottom] = geometry.label_tile((0, top, img_w, bottom))
+    if checkpoint is None:
+        return composite_into(canvas, images, geometry, labels, progress_callback, release=release)
+    composite_into(canvas, images, geometry, labels, progress_callback, release=release, start=start,
+                   checkpoint_callback=lambda done: checkpoint.update(canvas, done))
+    checkpoint.save(canvas, geometry.num_images)
+    return canvas
+
+
+def composite_tiled(images, geometry, tile_size, tile_callback, release=False):
+    """逐块合成整幅输出，每完成一块调用 tile_callback(box, tile)
+
+    release 为 True 时在帧最后出现的分块合成后释放该帧。
+    """
+    boxes = list(iter_tile_boxes(geometry.size, tile_size))
+    last_tiles = {}
+    if release:
+        # 按行优先顺序，帧区域右下角所在的分块是最后用到该帧的分块
+        tiles_x = (geometry.size[0] + tile_size - 1) // tile_size
+        for i in range(geometry.num_images):
+            box = geometry.frame_bbox(i)
+            if box is not None and images[i] is not None:
+                index = (box[3] - 1) // tile_size * tiles_x + (box[2] - 1) // tile_size
+                last_tiles.setdefault(index, []).append(i)
+
+    for index, box in enumerate(tqdm(boxes, desc="分块合成")):
+        tile_callback(box, composite_tile(images, geometry, box))
+        for i in last_tiles.get(index, ()):
+            release_frame(images, i)
+
+
+class ReducedCanvas:
+    """分块写入时同步收集的缩小画布（整数倍盒式缩小），用于生成缩小的输出而无需重新读取结果
+
+    缩小倍数不超过 max_side 对应的缩小比例，并且能整除分块尺寸，使各分块缩小后恰好拼接。
+    """
+
+    def __init__(self, size, max_side, tile_size=512):
+        img_w, img_h = size
+        factor = max(1, max(img_w, img_h) // max_side)
+        while tile_size % factor:
+            factor -= 1
+        self.factor = factor
+        self.array = np.zeros(((img_h + factor - 1) // factor, (img_w + factor - 1) // factor, 3), dtype=np.uint8)
+
+    def add(self, box, tile):
+        """缩小一个分块并放入画布（box 的左上角须为分块尺寸的整数倍）"""
+        reduced = np.asarray(Image.fromarray(np.ascontiguousarray(tile)).reduce(self.factor))
+        top, left = box[1] // self.factor, box[0] // self.factor
+        self.array[top:top + reduced.shape[0], left:left + reduced.shape[1]] = reduced
+
+    def image(self):
+        return Image.fromarray(self.array)
+
+
+def _tiff_stats(output_path, writer, start):
+    return {
+        "path": str(output_path),
+        "format": "TIFF" + (" (BigTIFF)" if writer.bigtiff else ""),
+        "seconds": time.perf_counter() - start,
+        "bytes": os.path.getsize(output_path)
+    }
+
+
+def composite_to_tiff(images, geometry, output_path, tile_size=512, release=False, reduced=None,
+                      **writer_options):
+    """分块合成并直接写入分块 TIFF，返回与 encoding.save_image 相同格式的统计信息
+
+    reduced 为 ReducedCanvas 时每个分块同时缩小放入其中。
+    """
+    start = time.perf_counter()
+    with TiledTiffWriter(output_path, geometry.size, tile_size, **writer_options) as writer:
+        def write(box, tile):
+            writer.write_tile(box[0], box[1], tile)
+            if reduced is not None:
+                reduced.add(box, tile)
+
+        composite_tiled(images, geometry, tile_size, write, release)
+    return _tiff_stats(output_path, writer, start)
+
+
+def array_to_tiff(array, output_path, tile_size=512, reduced=None, **writer_options):
+    """将已合成的数组（如磁盘映射的画布）逐块写入分块 TIFF，返回统计信息"""
+    start = time.perf_counter()
+    img_h, img_w = array.shape[:2]
+    with TiledTiffWriter(output_path, (img_w, img_h), tile_size, **writer_options) as writer:
+        for box in tqdm(list(iter_tile_boxes((img_w, img_h), tile_size)), desc="写入分块"):
+            left, top, right, bottom = box
+            tile = array[top:bottom, left:right]
+            writer.write_tile(left, top, tile)
+            if reduced is not None:
+                reduced.add(box, tile)
+    return _tiff_stats(output_path, writer, start)
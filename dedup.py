@@ -0,0 +1,64 @@
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+
+from thumbnails import extract_thumbnail
+
+# 感知哈希在帧目录中的字段名
+CATALOG_SECTION = "dhash"
+
+# 哈希边长（hash_size × hash_size 位）
+HASH_SIZE = 8
+
+
+def frame_hash(path, hash_size=HASH_SIZE):
+    """差值哈希（dHash）：缩小到 (hash_size + 1) × hash_size 的灰度图，逐行比较相邻像素
+
+    只读取内嵌缩略图或按比例解码的小代理图，不解码原图。
+    """
+    image = extract_thumbnail(path, 64).convert('L').resize((hash_size + 1, hash_size), Image.BOX)
+    pixels = np.asarray(image, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).ravel()
+    return int(''.join('1' if bit else '0' for bit in bits), 2)
+
+
+def hamming_distance(a, b):
+    """两个哈希之间不同的位数"""
+    return bin(a ^ b).count('1')
+
+
+def find_duplicates(paths, threshold=3, catalog=None, max_workers=None, log_callback=None):
+    """找出与前一张保留的帧近似重复的帧，返回 (保留的路径, 跳过的 [(路径, 相似的帧, 距离)])
+
+    哈希并行计算并缓存在帧目录中；与前一张保留的帧的汉明距离不超过 threshold 时跳过该帧，
+    缓慢变化的序列不会因为逐帧比较而被整段跳过。
+    """
+    hashes = [None] * len(paths)
+    missing = []
+    for i, path in enumerate(paths):
+        cached = catalog.get(path, CATALOG_SECTION) if catalog else None
+        if cached and cached.get("size") == HASH_SIZE:
+            hashes[i] = int(cached["hash"], 16)
+        else:
+            missing.append(i)
+
+    if missing:
+        if log_callback:
+            log_callback(f"计算 {len(missing)} 张图片的感知哈希...")
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for i, value in zip(missing, executor.map(lambda i: frame_hash(paths[i]), missing)):
+                hashes[i] = value
+                if catalog:
+                    catalog.put(paths[i], CATALOG_SECTION, {"size": HASH_SIZE, "hash": f"{value:x}"})
+        if catalog:
+            catalog.save()
+
+    kept, skipped = [], []
+    for path, value in zip(paths, hashes):
+        if kept:
+            distance = hamming_distance(value, kept[-1][1])
+            if distance <= threshold:
+                skipped.append((path, kept[-1][0], distance))
+                continue
+        kept.append((path, value))
+    return [path for path, _ in kept], skipped
@@ -0,0 +1,107 @@
+import math
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+from utils import open_proxy
+
+# 亮度统计在帧目录中的字段名
+CATALOG_SECTION = "luminance"
+
+# 近似 sRGB 的伽马值，增益在线性亮度上计算
+GAMMA = 2.2
+
+
+def frame_luminance(path, proxy_size=128):
+    """从缩小的代理图计算帧的平均线性亮度"""
+    proxy = np.asarray(open_proxy(path, proxy_size), dtype=np.float64) / 255.0
+    return float(np.mean(proxy ** GAMMA))
+
+
+def smooth_log_luminance(values, window):
+    """对数亮度的居中滑动平均（序列两端窗口自动缩小）"""
+    logs = np.log(np.maximum(np.asarray(values, dtype=np.float64), 1e-6))
+    half = max(0, window // 2)
+    cumsum = np.concatenate([[0.0], np.cumsum(logs)])
+    smoothed = np.empty_like(logs)
+    for i in range(len(logs)):
+        start = max(0, i - half)
+        end = min(len(logs), i + half + 1)
+        smoothed[i] = (cumsum[end] - cumsum[start]) / (end - start)
+    return logs, smoothed
+
+
+def gain_lut(gain):
+    """线性亮度增益对应的 8 位查找表（RGB 三通道）"""
+    values = np.arange(256) / 255.0
+    mapped = np.clip((values ** GAMMA) * gain, 0, 1) ** (1 / GAMMA)
+    lut = np.round(mapped * 255).astype(np.uint8).tolist()
+    return lut * 3
+
+
+def deflicker_frames(paths, images, indices, window=15, proxy_size=128, catalog=None,
+                     max_workers=None, log_callback=None):
+    """去闪烁：统计所有帧的亮度并做时间平滑，为 indices 中的帧包装增益
+
+    亮度统计只读取缩小的代理图（JPEG 按比例解码，RAW 使用内嵌缩略图），
+    结果缓存在帧目录中。增益只在合成时应用到各帧参与合成的区域。
+    """
+    if not indices:
+        return images
+
+    luminance = [None] * len(paths)
+    missing = []
+    for i, path in enumerate(paths):
+        cached = catalog.get(path, CATALOG_SECTION) if catalog else None
+        if cached and cached.get("proxy") == proxy_size:
+            luminance[i] = cached["mean"]
+        else:
+            missing.append(i)
+
+    if missing:
+        if log_callback:
+            log_callback(f"统计 {len(missing)} 张图片的亮度...")
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for i, value in zip(missing, executor.map(lambda i: frame_luminance(paths[i], proxy_size), missing)):
+                luminance[i] = value
+                if catalog:
+                    catalog.put(paths[i], CATALOG_SECTION, {"proxy": proxy_size, "mean": value})
+        if catalog:
+            catalog.save()
+
+    logs, smoothed = smooth_log_luminance(luminance, window)
+    gains = np.exp(smoothed - logs)
+    if log_callback:
+        log_callback(f"去闪烁增益范围: {min(gains[i] for i in indices):.3f} - {max(gains[i] for i in indices):.3f}")
+
+    adjusted = list(images)
+    for i in indices:
+        if abs(math.log(gains[i])) > 1e-3:
+            adjusted[i] = DeflickeredImage(images[i], gains[i])
+    return adjusted
+
+
+class DeflickeredImage:
+    """带亮度增益的帧：只在裁剪时对裁剪区域应用查找表"""
+
+    def __init__(self, image, gain):
+        self.image = image
+        self.gain = gain
+        self._lut = gain_lut(gain)
+
+    @property
+    def size(self):
+        return self.image.size
+
+    @property
+    def mode(self):
+        return 'RGB'
+
+    def crop(self, box):
+        region = self.image.crop(box)
+        if region.mode != 'RGB':
+            region = region.convert('RGB')
+        return region.point(self._lut)
+
+    def release(self):
+        if hasattr(self.image, 'release'):
+            self.image.release()
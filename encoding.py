@@ -0,0 +1,176 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+
+# 扩展名 -> PIL 格式
+FORMAT_MAP = {
+    "jpg": "JPEG",
+    "jpeg": "JPEG",
+    "png": "PNG",
+    "webp": "WEBP",
+    "tif": "TIFF",
+    "tiff": "TIFF"
+}
+
+# JPEG 色度抽样：4:4:4 / 4:2:2 / 4:2:0
+SUBSAMPLING_MAP = {
+    "444": 0,
+    "422": 1,
+    "420": 2
+}
+
+# PNG zlib 压缩策略
+PNG_STRATEGY_MAP = {
+    "default": 0,
+    "filtered": 1,
+    "huffman": 2,
+    "rle": 3,
+    "fixed": 4
+}
+
+# TIFF 压缩方式
+TIFF_COMPRESSION_MAP = {
+    "none": "raw",
+    "lzw": "tiff_lzw",
+    "deflate": "tiff_adobe_deflate"
+}
+
+DEFAULT_ENCODER_OPTIONS = {
+    "quality": None,          # None：JPEG 使用 100，WebP 使用 95
+    "subsampling": "444",
+    "progressive": False,
+    "png_compress_level": 6,
+    "png_strategy": "default",
+    "png_optimize": False,    # optimize 会多次尝试压缩，大图非常慢
+    "webp_method": 4,
+    "tiff_compression": "lzw"
+}
+
+
+def normalize_extension(extension):
+    """去掉前导点并转小写"""
+    return extension.lower().lstrip('.')
+
+
+def get_save_params(extension, options=None):
+    """根据扩展名和编码参数生成 PIL 的保存格式和参数"""
+    opts = dict(DEFAULT_ENCODER_OPTIONS)
+    if options:
+        opts.update({k: v for k, v in options.items() if v is not None})
+
+    # 未知格式默认使用JPEG
+    fmt = FORMAT_MAP.get(normalize_extension(extension), "JPEG")
+
+    if fmt == "JPEG":
+        params = {
+            "quality": opts["quality"] if opts["quality"] is not None else 100,
+            "subsampling": SUBSAMPLING_MAP.get(str(opts["subsampling"]), 0),
+            "progressive": bool(opts["progressive"])
+        }
+    elif fmt == "PNG":
+        params = {
+            "compress_level": int(opts["png_compress_level"]),
+            "compress_type": PNG_STRATEGY_MAP.get(opts["png_strategy"], 0),
+            "optimize": bool(opts["png_optimize"])
+        }
+    elif fmt == "WEBP":
+        params = {
+            "quality": opts["quality"] if opts["quality"] is not None else 95,
+            "method": int(opts["webp_method"])
+        }
+    else:
+        params = {
+            "compression": TIFF_COMPRESSION_MAP.get(opts["tiff_compression"], "tiff_lzw")
+        }
+
+    return fmt, params
+
+
+def save_image(image, output_path, extension, options=None):
+    """按编码参数保存图片，返回编码耗时和文件大小"""
+    fmt, params = get_save_params(extension, options)
+    # JPEG/WebP 不支持透明通道
+    if fmt in ("JPEG", "WEBP") and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+
+    start = time.perf_counter()
+    image.save(output_path, fmt, **params)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "path": str(output_path),
+        "format": fmt,
+        "seconds": elapsed,
+        "bytes": os.path.getsize(output_path)
+    }
+
+
+def parse_output_sizes(value):
+    """解析缩小输出的最长边尺寸（如 "2048,512" 或 [2048, 512]），从大到小排列"""
+    items = value.split(',') if isinstance(value, str) else value
+    try:
+        sizes = {int(str(item).strip()) for item in items if str(item).strip()}
+    except ValueError:
+        raise ValueError(f"无效的输出尺寸: {value}")
+    if not sizes or min(sizes) <= 0:
+        raise ValueError(f"无效的输出尺寸: {value}")
+    return sorted(sizes, reverse=True)
+
+
+def variant_path(path, max_side):
+    """缩小输出的文件路径：在主文件名后加上最长边尺寸（timeslice_2048.jpg）"""
+    return path.with_name(f"{path.stem}_{max_side}{path.suffix}")
+
+
+def make_variants(image, sizes, full_size=None):
+    """按最长边生成缩小的版本，返回 [(最长边, 图片)]
+
+    从大到小逐级缩小，每级由上一级生成：先用 reduce() 做整数倍的盒式缩小，
+    再用 BOX 滤波缩放到精确尺寸。image 可以是已缩小的画布，此时 full_size
+    为原始尺寸，输出尺寸按原始尺寸计算。不小于原图的尺寸会被跳过。
+    """
+    full_w, full_h = full_size or image.size
+    variants = []
+    source = image
+    for max_side in sorted(set(sizes), reverse=True):
+        scale = max_side / max(full_w, full_h)
+        if scale >= 1:
+            continue
+        target = (max(1, round(full_w * scale)), max(1, round(full_h * scale)))
+        factor = min(source.size[0] // target[0], source.size[1] // target[1])
+        reduced = source.reduce(factor) if factor > 1 else source
+        if reduced.size != target:
+            reduced = reduced.resize(target, Image.BOX)
+        variants.append((max_side, reduced))
+        source = reduced
+    return variants
+
+
+def encode_outputs(image, targets, options=None, max_workers=None):
+    """将同一张图片编码为多个格式
+
+    targets 为 (输出路径, 扩展名) 列表，也可以是 (输出路径, 扩展名, 图片)，
+    此时编码指定的图片（如缩小的版本）；多个目标时在线程中并发编码
+    （PIL 编码时会释放 GIL）。返回与 targets 顺序一致的统计信息列表。
+    """
+    sources = [target[2] if len(target) > 2 else image for target in targets]
+    for source in sources:
+        source.load()
+    if len(targets) <= 1 or max_workers == 1:
+        return [save_image(source, target[0], target[1], options) for source, target in zip(sources, targets)]
+
+    def encode(index):
+        path, ext = targets[index][:2]
+        source = sources[index]
+        # save() 会在图片对象上写入 encoderinfo，每个线程使用共享像素数据的独立对象
+        return save_image(source._new(source.im), path, ext, options)
+
+    with ThreadPoolExecutor(max_workers=max_workers or len(targets)) as executor:
+        return list(executor.map(encode, range(len(targets))))
+
+
+def format_encode_stats(stats):
+    """格式化编码统计信息"""
+    size_mb = stats["bytes"] / (1024 * 1024)
+    return f"{stats['format']}: {stats['seconds']:.2f}s, {size_mb:.2f} MB -> {stats['path']}"
@@ -0,0 +1,527 @@
+import os
+import math
+import numpy as np
+from collections import OrderedDict
+from PIL import Image, ImageDraw
+
+# 自定义映射图的帧索引图缓存（按路径、修改时间、输出尺寸和帧数）
+_map_cache = OrderedDict()
+MAP_CACHE_SIZE = 8
+
+
+class SliceGeometry:
+    """切片几何：描述每个输出像素取自哪一帧
+
+    label_tile 返回指定区域的帧索引图（-1 表示背景，保持黑色），
+    与 slices/ 中逐帧覆盖粘贴的结果逐像素一致，可用于分块合成。
+    """
+
+    def __init__(self, size, num_images):
+        self.size = size
+        self.num_images = num_images
+        self._label_map = None
+
+    def frame_offset(self, i):
+        """帧 i 的源图偏移：输出像素 (x, y) 取自源图 (x + dx, y + dy)"""
+        return 0, 0
+
+    def frame_bbox(self, i):
+        """帧 i 可能覆盖的输出区域 (left, top, right, bottom)，不覆盖时返回 None"""
+        raise NotImplementedError
+
+    def label_tile(self, box):
+        """计算 box 区域内每个像素的帧索引（int32 数组）"""
+        raise NotImplementedError
+
+    def label_map(self):
+        """计算整幅输出的帧索引图（计算后缓存在对象上）"""
+        if self._label_map is None:
+            self._label_map = self.label_tile((0, 0) + tuple(self.size))
+        return self._label_map
+
+    def visible_frames(self, tile_size=None):
+        """拥有至少一个输出像素的帧索引（升序）
+
+        tile_size 指定且帧索引图尚未缓存时逐块统计，避免生成整幅帧索引图。
+        """
+        if tile_size is None or self._label_map is not None:
+            labels = np.unique(self.label_map())
+        else:
+            img_w, img_h = self.size
+            found = set()
+            for top in range(0, img_h, tile_size):
+                for left in range(0, img_w, tile_size):
+                    box = (left, top, min(left + tile_size, img_w), min(top + tile_size, img_h))
+                    found.update(np.unique(self.label_tile(box)).tolist())
+            labels = sorted(found)
+        return [int(i) for i in labels if i >= 0]
+
+    def nbytes(self):
+        """已缓存数据占用的内存"""
+        return self._label_map.nbytes if self._label_map is not None else 0
+
+
+def _clip_box(box, size):
+    """将区域裁剪到画布内，区域为空时返回 None"""
+    left = max(0, int(math.floor(box[0])))
+    top = max(0, int(math.floor(box[1])))
+    right = min(size[0], int(math.ceil(box[2])) + 1)
+    bottom = min(size[1], int(math.ceil(box[3])) + 1)
+    if left >= right or top >= bottom:
+        return None
+    return left, top, right, bottom
+
+
+def _intersects(a, b):
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+def _parse_position(position, span, strip, near, far):
+    """将位置参数转换为条带起点（与 vertical/horizontal 切片一致）"""
+    if position == near:
+        return 0
+    if position == far:
+        return span - strip
+    if position == "center":
+        return (span - strip) // 2
+    try:
+        return int((span - strip) * float(position))
+    except ValueError:
+        return (span - strip) // 2
+
+
+class StripGeometry(SliceGeometry):
+    """垂直/水平条带：每帧取一个条带，按顺序平铺"""
+
+    def __init__(self, size, num_images, position="center", linear=False, vertical=True):
+        super().__init__(size, num_images)
+        self.vertical = vertical
+        span = size[0] if vertical else size[1]
+        self.strip = max(1, span // num_images)
+        near, far = ("left", "right") if vertical else ("top", "bottom")
+        self.crops = []
+        for i in range(num_images):
+            if linear:
+                crop = int(i * (span - self.strip) / (num_images - 1)) if num_images > 1 else 0
+            else:
+                crop = _parse_position(position, span, self.strip, near, far)
+            self.crops.append(crop)
+
+    def frame_offset(self, i):
+        shift = self.crops[i] - i * self.strip
+        return (shift, 0) if self.vertical else (0, shift)
+
+    def frame_bbox(self, i):
+        start = i * self.strip
+        if self.vertical:
+            box = (start, 0, start + self.strip, self.size[1])
+        else:
+            box = (0, start, self.size[0], start + self.strip)
+        if start >= (self.size[0] if self.vertical else self.size[1]):
+            return None
+        return box[0], box[1], min(box[2], self.size[0]), min(box[3], self.size[1])
+
+    def visible_frames(self, tile_size=None):
+        # 条带互不重叠，超出画布的帧没有输出区域
+        return [i for i in range(self.num_images) if self.frame_bbox(i) is not None]
+
+    def label_tile(self, box):
+        left, top, right, bottom = box
+        if self.vertical:
+            coords = np.arange(left, right) // self.strip
+        else:
+            coords = np.arange(top, bottom) // self.strip
+        coords = np.where(coords < self.num_images, coords, -1).astype(np.int32)
+        if self.vertical:
+            return np.broadcast_to(coords[np.newaxis, :], (bottom - top, right - left)).copy()
+        return np.broadcast_to(coords[:, np.newaxis], (bottom - top, right - left)).copy()
+
+
+class AngleGeometry(SliceGeometry):
+    """任意角度的条带：按像素在方向向量上的投影等分给各帧
+
+    angle 为条带推进方向（度）：0 与垂直切片相同（从左到右），90 与水平切片相同（从上到下）。
+    position/linear 与垂直/水平切片一致，决定每帧从源图中取条带的位置。
+    """
+
+    def __init__(self, size, num_images, position="center", linear=False, angle=0.0):
+        super().__init__(size, num_images)
+        theta = math.radians(angle)
+        self.direction = (math.cos(theta), math.sin(theta))
+        corners = [self._project(x, y) for x, y in ((0, 0), (size[0], 0), (size[0], size[1]), (0, size[1]))]
+        self.start = min(corners)
+        self.span = max(corners) - self.start
+        self.strip = self.span / num_images
+
+        if position in ("left", "top"):
+            position = 0.0
+        elif position in ("right", "bottom"):
+            position = 1.0
+        elif position == "center":
+            position = 0.5
+        try:
+            position = float(position)
+        except ValueError:
+            position = 0.5
+        self.offsets = []
+        cos, sin = self.direction
+        for i in range(num_images):
+            if linear:
+                crop = i * (self.span - self.strip) / (num_images - 1) if num_images > 1 else 0
+            else:
+                crop = (self.span - self.strip) * position
+            # 沿方向向量平移到源图中取条带的位置，并沿条带方向对齐两段条带的中点，
+            # 使输出条带尽量落在源图内
+            shift = crop - i * self.strip
+            along = self._band_middle(self.start + crop) - self._band_middle(self.start + i * self.strip)
+            self.offsets.append((int(round(shift * cos - along * sin)), int(round(shift * sin + along * cos))))
+
+    def _project(self, x, y):
+        return x * self.direction[0] + y * self.direction[1]
+
+    def _band_points(self, low, high):
+        """投影在 [low, high] 之间的条带与画布相交的多边形顶点"""
+        img_w, img_h = self.size
+        corners = [(0, 0), (img_w, 0), (img_w, img_h), (0, img_h)]
+        points = [(x, y) for x, y in corners if low <= self._project(x, y) <= high]
+        for (x1, y1), (x2, y2) in zip(corners, corners[1:] + corners[:1]):
+            p1, p2 = self._project(x1, y1), self._project(x2, y2)
+            for level in (low, high):
+                if p1 != p2 and min(p1, p2) <= level <= max(p1, p2):
+                    t = (level - p1) / (p2 - p1)
+                    points.append((x1 + (x2 - x1) * t, y1 + (y2 - y1) * t))
+        return points
+
+    def _band_middle(self, low):
+        """从 low 开始的条带在条带方向（垂直于方向向量）上的中点"""
+        values = [y * self.direction[0] - x * self.direction[1]
+                  for x, y in self._band_points(low, low + self.strip)]
+        return (min(values) + max(values)) / 2 if values else 0.0
+
+    def frame_offset(self, i):
+        return self.offsets[i]
+
+    def frame_bbox(self, i):
+        # 条带（两条平行线之间）与画布相交的多边形的外接矩形
+        low = self.start + i * self.strip
+        points = self._band_points(low, low + self.strip)
+        if not points:
+            return None
+        xs, ys = zip(*points)
+        return _clip_box((min(xs), min(ys), max(xs), max(ys)), self.size)
+
+    def label_tile(self, box):
+        left, top, right, bottom = box
+        # 以像素中心的投影量化为帧索引，一次向量化计算
+        xs = (np.arange(left, right) + 0.5) * self.direction[0]
+        ys = (np.arange(top, bottom) + 0.5) * self.direction[1]
+        labels = np.floor((ys[:, np.newaxis] + xs[np.newaxis, :] - self.start) / self.strip)
+        return np.clip(labels, 0, self.num_images - 1).astype(np.int32)
+
+
+class MaskGeometry(SliceGeometry):
+    """基于蒙版绘制的切片：按绘制顺序将各帧形状写入帧索引图"""
+
+    def draw_order(self):
+        """绘制顺序，后绘制的帧覆盖先绘制的帧"""
+        return range(self.num_images)
+
+    def draw_frame(self, draw, i, dx, dy):
+        """在平移 (dx, dy) 后的画布上以帧索引 i 填充帧 i 的形状"""
+        raise NotImplementedError
+
+    def label_tile(self, box):
+        left, top, right, bottom = box
+        labels = Image.new('I', (right - left, bottom - top), -1)
+        draw = ImageDraw.Draw(labels)
+        for i in self.draw_order():
+            frame_box = self.frame_bbox(i)
+            if frame_box is not None and _intersects(frame_box, box):
+                self.draw_frame(draw, i, -left, -top)
+        return np.asarray(labels, dtype=np.int32)
+
+
+def _shift_points(points, dx, dy):
+    """平移绘制坐标
+
+    PIL 绘制时会将坐标截断为整数，先在画布坐标系中截断再平移，
+    保证分块绘制与整幅绘制的光栅化结果一致。
+    """
+    return [(int(x) + dx, int(y) + dy) for x, y in points]
+
+
+def _shift_box(box, dx, dy):
+    """平移形状外接框"""
+    (left, top), (right, bottom) = _shift_points([box[:2], box[2:]], dx, dy)
+    return [left, top, right, bottom]
+
+
+def _sector_bbox(cx, cy, rx, ry, start_angle, end_angle):
+    """扇形（含圆心）的外接矩形"""
+    angles = [start_angle, end_angle]
+    angles += [a for a in range(0, 721, 90) if start_angle < a < end_angle]
+    xs = [cx] + [cx + rx * math.cos(math.radians(a)) for a in angles]
+    ys = [cy] + [cy + ry * math.sin(math.radians(a)) for a in angles]
+    return min(xs) - 1, min(ys) - 1, max(xs) + 1, max(ys) + 1
+
+
+class SectorGeometry(MaskGeometry):
+    """圆形/椭圆形扇形切片"""
+
+    def __init__(self, size, num_images, linear=False, circular=True):
+        super().__init__(size, num_images)
+        img_w, img_h = size
+        self.center = (img_w // 2, img_h // 2)
+        if circular:
+            radius = min(self.center)
+            self.axes = (radius, radius)
+        else:
+            self.axes = (img_w // 2, img_h // 2)
+        self.linear = linear
+        self.angle_step = 360 / num_images
+
+    def _frame_axes(self, i):
+        if not self.linear:
+            return self.axes
+        scale = i / (self.num_images - 1) if self.num_images > 1 else 1.0
+        return self.axes[0] * scale, self.axes[1] * scale
+
+    def frame_bbox(self, i):
+        rx, ry = self._frame_axes(i)
+        box = _sector_bbox(self.center[0], self.center[1], rx, ry,
+                           i * self.angle_step, (i + 1) * self.angle_step)
+        return _clip_box(box, self.size)
+
+    def draw_frame(self, draw, i, dx, dy):
+        rx, ry = self._frame_axes(i)
+        cx, cy = self.center
+        draw.pieslice(_shift_box([cx - rx, cy - ry, cx + rx, cy + ry], dx, dy),
+                      i * self.angle_step, (i + 1) * self.angle_step, fill=i)
+
+
+class BandGeometry(MaskGeometry):
+    """同心环带切片（椭圆/矩形/圆形）
+
+    第 i 帧的环带为第 i 个形状减去第 i-1 个形状；形状逐渐增大，
+    因此从外向内依次绘制完整形状即可得到相同的结果。
+    """
+
+    def __init__(self, size, num_images, shape):
+        super().__init__(size, num_images)
+        img_w, img_h = size
+        self.center = (img_w // 2, img_h // 2)
+        self.shape = shape
+        if shape == "circular":
+            self.max_size = min(img_w, img_h) // 2
+        else:
+            self.max_size = max(img_w, img_h)
+        self.min_size = self.max_size // 20
+        self.step = (self.max_size - self.min_size) / math.sqrt(num_images)
+
+    def draw_order(self):
+        return range(self.num_images - 1, -1, -1)
+
+    def _shape_box(self, i):
+        cx, cy = self.center
+        size = min(self.min_size + math.sqrt(i) * self.step, self.max_size)
+        if self.shape == "circular":
+            return [cx - size, cy - size, cx + size, cy + size]
+        width = size * (self.size[0] / self.max_size)
+        height = size * (self.size[1] / self.max_size)
+        return [cx - width // 2, cy - height // 2, cx + width // 2, cy + height // 2]
+
+    def frame_bbox(self, i):
+        return _clip_box(self._shape_box(i), self.size)
+
+    def draw_frame(self, draw, i, dx, dy):
+        shape_box = _shift_box(self._shape_box(i), dx, dy)
+        if self.shape == "rectangular":
+            draw.rectangle(shape_box, fill=i)
+        else:
+            draw.ellipse(shape_box, fill=i)
+
+
+class SCurveGeometry(MaskGeometry):
+    """垂直/水平S型曲线切片"""
+
+    def __init__(self, size, num_images, vertical=True):
+        super().__init__(size, num_images)
+        self.vertical = vertical
+        img_w, img_h = size
+        self.strip = (img_w if vertical else img_h) / num_images
+        self._paths = {}
+
+    def _path_points(self, i):
+        """帧 i 的S形路径（与 S 型切片的贝塞尔采样完全一致）"""
+        if i in self._paths:
+            return self._paths[i]
+        img_w, img_h = self.size
+        s = self.strip
+        if self.vertical:
+            x0 = i * s
+            start_point = (x0 + s / 2, 0)
+            control1 = (x0, img_h / 3)
+            control2 = (x0 + s, 2 * img_h / 3)
+            end_point = (x0 + s / 2, img_h)
+        else:
+            y0 = i * s
+            start_point = (0, y0 + s / 2)
+            control1 = (img_w / 3, y0)
+            control2 = (2 * img_w / 3, y0 + s)
+            end_point = (img_w, y0 + s / 2)
+
+        points = []
+        for t in np.linspace(0, 1, 200):
+            x = (1 - t) ** 3 * start_point[0] + 3 * (1 - t) ** 2 * t * control1[0] + 3 * (1 - t) * t ** 2 * control2[
+                0] + t ** 3 * end_point[0]
+            y = (1 - t) ** 3 * start_point[1] + 3 * (1 - t) ** 2 * t * control1[1] + 3 * (1 - t) * t ** 2 * control2[
+                1] + t ** 3 * end_point[1]
+            points.append((x, y))
+
+        if self.vertical:
+            path = [(x + s / 2, y) for x, y in points] + [(x - s / 2, y) for x, y in reversed(points)]
+        else:
+            path = [(x, y - s / 2) for x, y in points] + [(x, y + s / 2) for x, y in reversed(points)]
+        path.append(path[0])
+        self._paths[i] = path
+        return path
+
+    def frame_bbox(self, i):
+        img_w, img_h = self.size
+        start = i * self.strip
+        low = 0 if i == 0 else start - self.strip
+        high = (img_w if self.vertical else img_h) if i == self.num_images - 1 else start + 2 * self.strip
+        if self.vertical:
+            return _clip_box((low, 0, high, img_h), self.size)
+        return _clip_box((0, low, img_w, high), self.size)
+
+    def draw_frame(self, draw, i, dx, dy):
+        img_w, img_h = self.size
+        draw.polygon(_shift_points(self._path_points(i), dx, dy), fill=i)
+        start = i * self.strip
+        end = (i + 1) * self.strip
+        # 第一张和最后一张图片填充边缘
+        if i == 0:
+            low, high = 0, start
+        elif i == self.num_images - 1:
+            low, high = end, (img_w if self.vertical else img_h)
+        else:
+            return
+        if self.vertical:
+            edge = [(low, 0), (high, 0), (high, img_h), (low, img_h)]
+        else:
+            edge = [(0, low), (img_w, low), (img_w, high), (0, high)]
+        draw.polygon(_shift_points(edge, dx, dy), fill=i)
+
+
+def _map_values(image, size):
+    """将灰度映射图缩放到输出尺寸，返回 (像素值数组, 灰度级数)：8 位为 256 级，16 位为 65536 级"""
+    if image.mode.startswith('I'):
+        image, levels = image.convert('I'), 65536
+    else:
+        image, levels = (image if image.mode == 'L' else image.convert('L')), 256
+    if image.size != tuple(size):
+        image = image.resize(tuple(size), Image.NEAREST)
+    return np.clip(np.asarray(image), 0, levels - 1), levels
+
+
+def _label_bboxes(labels, num_images):
+    """各帧在帧索引图中的外接矩形 (left, top, right, bottom) 数组，按行内连续区段统计"""
+    img_h, img_w = labels.shape
+    starts = np.ones((img_h, img_w), dtype=bool)
+    starts[:, 1:] = labels[:, 1:] != labels[:, :-1]
+    ys, xs = np.nonzero(starts)
+    run_labels = labels[ys, xs]
+    # 区段在下一个区段开始处结束，行末区段结束于行尾
+    ends = np.full_like(xs, img_w)
+    same_row = ys[1:] == ys[:-1]
+    ends[:-1][same_row] = xs[1:][same_row]
+
+    boxes = np.empty((4, num_images), dtype=np.int64)
+    boxes[:2] = np.iinfo(np.int64).max
+    boxes[2:] = 0
+    np.minimum.at(boxes[0], run_labels, xs)
+    np.minimum.at(boxes[1], run_labels, ys)
+    np.maximum.at(boxes[2], run_labels, ends)
+    np.maximum.at(boxes[3], run_labels, ys + 1)
+    return boxes.T
+
+
+def map_labels(slice_map, size, num_images):
+    """由灰度映射图计算帧索引图和各帧外接矩形：灰度值按帧数等分，映射到对应的帧
+
+    slice_map 可以是文件路径、PIL 图片或 uint8/uint16 数组；文件路径的结果会被缓存，
+    同一映射图再次使用时不需要重新读取和计算。返回的帧索引图为只读数组。
+    """
+    key = None
+    if isinstance(slice_map, (str, os.PathLike)):
+        stat = os.stat(slice_map)
+        key = (os.path.abspath(slice_map), stat.st_mtime_ns, stat.st_size, tuple(size), num_images)
+        if key in _map_cache:
+            _map_cache.move_to_end(key)
+            return _map_cache[key]
+        with Image.open(slice_map) as image:
+            values, levels = _map_values(image, size)
+    elif isinstance(slice_map, Image.Image):
+        values, levels = _map_values(slice_map, size)
+    else:
+        values, levels = _map_values(Image.fromarray(np.asarray(slice_map)), size)
+
+    labels = (values.astype(np.int64) * num_images // levels).astype(np.int32)
+    labels.flags.writeable = False
+    result = (labels, _label_bboxes(labels, num_images))
+    if key is not None:
+        _map_cache[key] = result
+        while len(_map_cache) > MAP_CACHE_SIZE:
+            _map_cache.popitem(last=False)
+    return result
+
+
+class MapGeometry(SliceGeometry):
+    """自定义映射图：8/16 位灰度图的像素值按帧数等分，每个输出像素取自对应的帧"""
+
+    def __init__(self, size, num_images, slice_map):
+        super().__init__(size, num_images)
+        self._label_map, self._bboxes = map_labels(slice_map, size, num_images)
+
+    def frame_bbox(self, i):
+        left, top, right, bottom = (int(v) for v in self._bboxes[i])
+        if right <= left:
+            return None
+        return left, top, right, bottom
+
+    def visible_frames(self, tile_size=None):
+        return [i for i in range(self.num_images) if self.frame_bbox(i) is not None]
+
+    def label_tile(self, box):
+        left, top, right, bottom = box
+        return self._label_map[top:bottom, left:right]
+
+
+def get_geometry(slice_type, size, num_images, position="center", linear=False, slice_map=None, angle=0.0):
+    """根据切片类型创建几何描述（custom_map 需要 slice_map 指定映射图，linear_angle 使用 angle）"""
+    if slice_type == "vertical":
+        return StripGeometry(size, num_images, position, linear, vertical=True)
+    if slice_type == "horizontal":
+        return StripGeometry(size, num_images, position, linear, vertical=False)
+    if slice_type == "circular_sector":
+        return SectorGeometry(size, num_images, linear, circular=True)
+    if slice_type == "elliptical_sector":
+        return SectorGeometry(size, num_images, linear, circular=False)
+    if slice_type == "elliptical_band":
+        return BandGeometry(size, num_images, "elliptical")
+    if slice_type == "rectangular_band":
+        return BandGeometry(size, num_images, "rectangular")
+    if slice_type == "circular_band":
+        return BandGeometry(size, num_images, "circular")
+    if slice_type == "vertical_s":
+        return SCurveGeometry(size, num_images, vertical=True)
+    if slice_type == "horizontal_s":
+        return SCurveGeometry(size, num_images, vertical=False)
+    if slice_type == "linear_angle":
+        return AngleGeometry(size, num_images, position, linear, angle)
+    if slice_type == "custom_map":
+        if slice_map is None:
+            raise ValueError("custom_map 切片需要指定映射图")
+        return MapGeometry(size, num_images, slice_map)
+    raise ValueError(f"未知切片类型: {slice_type}")
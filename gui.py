@@ -1,11 +1,15 @@
 import os
 import sys
 import logging
+import threading
+from collections import OrderedDict
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QLabel,
                              QPushButton, QComboBox, QLineEdit, QCheckBox, QFileDialog, QProgressBar,
-                             QGroupBox, QMessageBox, QTextEdit, QMenuBar, QMenu, QAction)
-from PyQt5.QtCore import Qt, QThread, pyqtSignal, QEvent, QSettings, QTimer
-from PyQt5.QtGui import QPalette, QColor, QFont
+                             QGroupBox, QMessageBox, QTextEdit, QMenuBar, QMenu, QAction, QSpinBox,
+                             QListView)
+from PyQt5.QtCore import (Qt, QThread, pyqtSignal, QEvent, QSettings, QTimer, QAbstractListModel,
+                          QModelIndex, QSize)
+from PyQt5.QtGui import QPalette, QColor, QFont, QImage, QPixmap
 
 # 配置调试日志（可选）
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -19,7 +23,7 @@ else:
 sys.path.insert(0, application_path)
 
 from cli import run_timeslice
-from i18n import Translator  # 导入翻译器
+from i18n import Translator, get_translator  # 导入翻译器
 
 
 class LogEvent(QEvent):
@@ -44,11 +48,12 @@ class TimesliceWorker(QThread):
 
     def run(self):
         try:
-            from utils import load_images
-            images = load_images(self.params['input_dir'],
-                                 self.params['sort_by'],
-                                 self.params['reverse'])
-            total_images = len(images)
+            # 只统计图片数量，解码由 run_timeslice 按需完成
+            from utils import list_image_paths
+            image_paths = list_image_paths(self.params['input_dir'],
+                                           self.params['sort_by'],
+                                           self.params['reverse'])
+            total_images = len(image_paths)
 
             if total_images == 0:
                 raise Exception(self.tr("输入目录中没有找到图片"))
@@ -70,7 +75,12 @@ class TimesliceWorker(QThread):
                 include_timestamp=self.params['include_timestamp'],
                 include_slice_type=self.params['include_slice_type'],
                 extension=self.params['extension'],
-                progress_callback=progress_callback
+                progress_callback=progress_callback,
+                encoder_options=self.params['encoder_options'],
+                extra_extensions=self.params['extra_extensions'],
+                align=self.params['align'],
+                deflicker=self.params['deflicker'],
+                log_callback=self.log_signal.emit
             )
 
             self.progress_signal.emit(total_images)
@@ -79,9 +89,143 @@ class TimesliceWorker(QThread):
             self.error_signal.emit(str(e))
 
     def tr(self, text):
-        """翻译方法（线程内）"""
-        translator = Translator()
-        return translator.tr(text)
+        """翻译方法（线程内，使用缓存的翻译器）"""
+        return get_translator().tr(text)
+
+
+class ThumbnailLoader(QThread):
+    """后台列出图片和读取缩略图：列表请求优先（只处理最新的一次），缩略图后请求的先处理，
+    优先加载当前可见的图片"""
+    loaded_signal = pyqtSignal(int, int, QImage)  # 列表版本, 行号, 缩略图
+    listed_signal = pyqtSignal(int, object, str)  # 列表请求序号, 图片路径, 错误信息
+
+    def __init__(self, cache):
+        super().__init__()
+        self.cache = cache
+        self.paths = []
+        self.generation = 0
+        self._requests = []
+        self._pending = set()
+        self._listing = None
+        self.listing_id = 0
+        self._stopping = False
+        self._cond = threading.Condition()
+
+    def request_listing(self, input_dir, sort_by, reverse):
+        """请求列出输入目录中的图片，结果通过 listed_signal 返回（之前未处理的列表请求被替换）"""
+        with self._cond:
+            self.listing_id += 1
+            self._listing = (self.listing_id, input_dir, sort_by, reverse)
+            self._cond.notify()
+
+    def set_paths(self, paths):
+        """切换图片列表，丢弃旧列表中尚未处理的请求"""
+        with self._cond:
+            self.paths = list(paths)
+            self.generation += 1
+            self._requests.clear()
+            self._pending.clear()
+
+    def request(self, row):
+        with self._cond:
+            if row not in self._pending:
+                self._pending.add(row)
+                self._requests.append(row)
+                self._cond.notify()
+
+    def stop(self):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        self.wait()
+
+    def run(self):
+        while True:
+            with self._cond:
+                while not self._requests and self._listing is None and not self._stopping:
+                    self._cond.wait()
+                if self._stopping:
+                    return
+                listing, self._listing = self._listing, None
+                if listing is None:
+                    row = self._requests.pop()
+                    path = self.paths[row]
+                    generation = self.generation
+
+            if listing is not None:
+                self._list(*listing)
+                continue
+            try:
+                image = self.cache.get(path)
+                data = image.tobytes()
+                qimage = QImage(data, image.size[0], image.size[1], image.size[0] * 3,
+                                QImage.Format_RGB888).copy()
+            except Exception as e:
+                logging.debug(f"无法读取缩略图 {path}: {e}")
+                qimage = QImage()
+            self.loaded_signal.emit(generation, row, qimage)
+
+    def _list(self, listing_id, input_dir, sort_by, reverse):
+        # 网络目录或大目录的列出和排序可能较慢，不在界面线程中进行
+        from utils import list_image_paths
+        paths, error = [], ""
+        if input_dir and os.path.exists(input_dir):
+            try:
+                paths = list_image_paths(input_dir, sort_by, reverse)
+            except Exception as e:
+                error = str(e)
+        self.listed_signal.emit(listing_id, paths, error)
+
+
+class ThumbnailModel(QAbstractListModel):
+    """缩略图列表模型：只为视图实际绘制的行请求缩略图，已加载的缩略图按 LRU 保留"""
+
+    def __init__(self, loader, icon_size, max_pixmaps=2000):
+        super().__init__()
+        self.loader = loader
+        self.icon_size = icon_size
+        self.max_pixmaps = max_pixmaps
+        self.paths = []
+        self._pixmaps = OrderedDict()
+        self._placeholder = QPixmap(icon_size)
+        self._placeholder.fill(QColor(128, 128, 128))
+        loader.loaded_signal.connect(self.on_loaded)
+
+    def set_paths(self, paths):
+        self.beginResetModel()
+        self.paths = list(paths)
+        self._pixmaps.clear()
+        self.loader.set_paths(self.paths)
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.paths)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = index.row()
+        if role == Qt.DisplayRole:
+            return str(row + 1)
+        if role == Qt.ToolTipRole:
+            return f"{row + 1}: {self.paths[row].name}"
+        if role == Qt.DecorationRole:
+            if row in self._pixmaps:
+                self._pixmaps.move_to_end(row)
+                return self._pixmaps[row] or self._placeholder
+            self.loader.request(row)
+            return self._placeholder
+        return None
+
+    def on_loaded(self, generation, row, qimage):
+        if generation != self.loader.generation or row >= len(self.paths):
+            return
+        # 读取失败的图片记为 None，不再重复请求
+        self._pixmaps[row] = QPixmap.fromImage(qimage) if not qimage.isNull() else None
+        while len(self._pixmaps) > self.max_pixmaps:
+            self._pixmaps.popitem(last=False)
+        index = self.index(row)
+        self.dataChanged.emit(index, index, [Qt.DecorationRole])
 
 
 class TimesliceGUI(QMainWindow):
@@ -101,11 +245,22 @@ class TimesliceGUI(QMainWindow):
         # 初始化主题 - 默认使用浅色
         self.current_theme = self.settings.value("theme", "light")
 
+        # 输入图片缩略图（后台线程读取，切换语言重建界面时保留）
+        from thumbnails import ThumbnailCache
+        self.thumbnail_loader = ThumbnailLoader(ThumbnailCache(max_size=160))
+        self.thumbnail_model = ThumbnailModel(self.thumbnail_loader, QSize(120, 80))
+        self.thumbnail_loader.listed_signal.connect(self.on_thumbnails_listed)
+        self.thumbnail_loader.start()
+        self.thumbnail_timer = QTimer()
+        self.thumbnail_timer.setSingleShot(True)
+        self.thumbnail_timer.setInterval(300)
+        self.thumbnail_timer.timeout.connect(self.refresh_thumbnails)
+
         self.init_ui()
         self.load_theme()
 
         self.setWindowTitle(self.tr("时间切片照片生成器"))
-        self.setGeometry(100, 100, 800, 650)  # 增加高度以容纳新的UI元素
+        self.setGeometry(100, 100, 800, 760)  # 增加高度以容纳新的UI元素
 
         self.current_output_path = ""
         self.total_images = 0
@@ -448,6 +603,24 @@ class TimesliceGUI(QMainWindow):
         input_dir_layout.addWidget(self.input_dir_btn)
         input_layout.addLayout(input_dir_layout)
 
+        # 输入图片缩略图条（按当前排序规则排列，只加载可见的缩略图）
+        self.thumbnail_label = QLabel("")
+        input_layout.addWidget(self.thumbnail_label)
+        self.thumbnail_view = QListView()
+        self.thumbnail_view.setViewMode(QListView.IconMode)
+        self.thumbnail_view.setFlow(QListView.LeftToRight)
+        self.thumbnail_view.setWrapping(False)
+        self.thumbnail_view.setMovement(QListView.Static)
+        self.thumbnail_view.setUniformItemSizes(True)
+        self.thumbnail_view.setLayoutMode(QListView.Batched)
+        self.thumbnail_view.setBatchSize(200)
+        self.thumbnail_view.setHorizontalScrollMode(QListView.ScrollPerPixel)
+        self.thumbnail_view.setIconSize(self.thumbnail_model.icon_size)
+        self.thumbnail_view.setGridSize(QSize(130, 110))
+        self.thumbnail_view.setFixedHeight(130)
+        self.thumbnail_view.setModel(self.thumbnail_model)
+        input_layout.addWidget(self.thumbnail_view)
+
         output_dir_layout = QHBoxLayout()
         self.output_dir_label = QLabel(self.tr("输出目录:"))
         self.output_dir_edit = QLineEdit()
@@ -516,12 +689,18 @@ class TimesliceGUI(QMainWindow):
         self.linear_check = QCheckBox(self.tr("线性模式"))  # 初始文本，会根据切片类型更新
         self.reverse_check = QCheckBox(self.tr("逆序排序"))
         self.auto_open_check = QCheckBox(self.tr("完成后自动打开图片"))
+        self.align_check = QCheckBox(self.tr("对齐帧"))
+        self.align_check.setToolTip(self.tr("修正手持或三脚架漂移造成的平移"))
+        self.deflicker_check = QCheckBox(self.tr("去闪烁"))
+        self.deflicker_check.setToolTip(self.tr("平滑各帧之间的亮度变化"))
 
         # 连接线性模式复选框的状态改变信号
         self.linear_check.stateChanged.connect(self.update_linear_mode_state)
 
         options_layout.addWidget(self.linear_check)
         options_layout.addWidget(self.reverse_check)
+        options_layout.addWidget(self.align_check)
+        options_layout.addWidget(self.deflicker_check)
         options_layout.addWidget(self.auto_open_check)
         slice_layout.addLayout(options_layout)
 
@@ -546,7 +725,7 @@ class TimesliceGUI(QMainWindow):
         extension_layout = QHBoxLayout()
         self.extension_label = QLabel(self.tr("文件格式:"))
         self.extension_combo = QComboBox()
-        self.extension_combo.addItems(["JPG", "PNG", "WebP"])
+        self.extension_combo.addItems(["JPG", "PNG", "WebP", "TIFF"])
         extension_layout.addWidget(self.extension_label)
         extension_layout.addWidget(self.extension_combo)
         naming_layout.addLayout(extension_layout)
@@ -572,6 +751,62 @@ class TimesliceGUI(QMainWindow):
         self.output_naming_group.setLayout(naming_layout)
         main_layout.addWidget(self.output_naming_group)
 
+        # 编码设置
+        self.encoding_group = QGroupBox(self.tr("编码设置"))
+        encoding_layout = QVBoxLayout()
+
+        jpeg_layout = QHBoxLayout()
+        self.quality_label = QLabel(self.tr("质量:"))
+        self.quality_spin = QSpinBox()
+        self.quality_spin.setRange(0, 100)
+        self.quality_spin.setSpecialValueText(self.tr("默认"))  # 0 表示使用格式默认质量
+        self.quality_spin.setValue(0)
+        self.quality_spin.setToolTip(self.tr("JPEG/WebP 质量 1-100（默认 JPEG 100，WebP 95）"))
+        self.subsampling_label = QLabel(self.tr("色度抽样:"))
+        self.subsampling_combo = QComboBox()
+        self.subsampling_combo.addItems(["4:4:4", "4:2:2", "4:2:0"])
+        self.progressive_check = QCheckBox(self.tr("渐进式 JPEG"))
+        jpeg_layout.addWidget(self.quality_label)
+        jpeg_layout.addWidget(self.quality_spin)
+        jpeg_layout.addWidget(self.subsampling_label)
+        jpeg_layout.addWidget(self.subsampling_combo)
+        jpeg_layout.addWidget(self.progressive_check)
+        encoding_layout.addLayout(jpeg_layout)
+
+        lossless_layout = QHBoxLayout()
+        self.png_level_label = QLabel(self.tr("PNG 压缩级别:"))
+        self.png_level_spin = QSpinBox()
+        self.png_level_spin.setRange(0, 9)
+        self.png_level_spin.setValue(6)
+        self.png_strategy_label = QLabel(self.tr("PNG 压缩策略:"))
+        self.png_strategy_combo = QComboBox()
+        self.png_strategy_combo.addItems(["default", "filtered", "huffman", "rle", "fixed"])
+        self.tiff_compression_label = QLabel(self.tr("TIFF 压缩:"))
+        self.tiff_compression_combo = QComboBox()
+        self.tiff_compression_combo.addItems(["LZW", "Deflate", self.tr("无")])
+        lossless_layout.addWidget(self.png_level_label)
+        lossless_layout.addWidget(self.png_level_spin)
+        lossless_layout.addWidget(self.png_strategy_label)
+        lossless_layout.addWidget(self.png_strategy_combo)
+        lossless_layout.addWidget(self.tiff_compression_label)
+        lossless_layout.addWidget(self.tiff_compression_combo)
+        encoding_layout.addLayout(lossless_layout)
+
+        # 同时输出的其他格式（并发编码）
+        extra_layout = QHBoxLayout()
+        self.extra_formats_label = QLabel(self.tr("同时输出:"))
+        extra_layout.addWidget(self.extra_formats_label)
+        self.extra_format_checks = {}
+        for name, ext in [("JPG", "jpg"), ("PNG", "png"), ("WebP", "webp"), ("TIFF", "tif")]:
+            check = QCheckBox(name)
+            self.extra_format_checks[ext] = check
+            extra_layout.addWidget(check)
+        extra_layout.addStretch()
+        encoding_layout.addLayout(extra_layout)
+
+        self.encoding_group.setLayout(encoding_layout)
+        main_layout.addWidget(self.encoding_group)
+
         # 进度信息
         self.progress_group = QGroupBox(self.tr("进度信息"))
         progress_layout = QVBoxLayout()
@@ -614,6 +849,12 @@ class TimesliceGUI(QMainWindow):
         self.slice_type_check.stateChanged.connect(self.update_filename_preview)
         self.type_combo.currentIndexChanged.connect(self.update_filename_preview)
 
+        # 输入目录或排序规则变化时刷新缩略图（输入时延迟刷新）
+        self.input_dir_edit.textChanged.connect(lambda _: self.thumbnail_timer.start())
+        self.sort_combo.currentIndexChanged.connect(self.refresh_thumbnails)
+        self.reverse_check.stateChanged.connect(self.refresh_thumbnails)
+        self.refresh_thumbnails()
+
         # 初始化菜单选中状态 - 启动时自动选中中文和浅色模式
         self.update_menu_check_state()
 
@@ -659,6 +900,8 @@ class TimesliceGUI(QMainWindow):
             extension = "jpg"
         elif extension == "webp":
             extension = "webp"
+        elif extension == "tiff":
+            extension = "tif"
         else:
             extension = "png"
 
@@ -776,6 +1019,31 @@ class TimesliceGUI(QMainWindow):
         else:
             self.position_combo.setEnabled(False)
 
+    def current_sort_by(self):
+        """当前选择的排序规则"""
+        sort_map = {
+            self.tr("按文件名"): "name",
+            self.tr("按创建时间"): "created_time",
+            self.tr("按修改时间"): "modified_time"
+        }
+        return sort_map.get(self.sort_combo.currentText(), "name")
+
+    def refresh_thumbnails(self):
+        """按当前输入目录和排序规则刷新缩略图条（图片在缩略图线程中列出）"""
+        self.thumbnail_loader.request_listing(self.input_dir_edit.text().strip(), self.current_sort_by(),
+                                              self.reverse_check.isChecked())
+
+    def on_thumbnails_listed(self, listing_id, paths, error):
+        """缩略图线程列出图片后更新缩略图条（忽略已被新请求替换的结果）"""
+        if listing_id != self.thumbnail_loader.listing_id:
+            return
+        if error:
+            self.thumbnail_label.setText(error)
+            self.thumbnail_model.set_paths([])
+            return
+        self.thumbnail_model.set_paths(paths)
+        self.thumbnail_label.setText(f"{len(paths)} {self.tr('张图片')}" if paths else "")
+
     def select_input_dir(self):
         """选择输入目录"""
         dir_path = QFileDialog.getExistingDirectory(self, self.tr("选择输入目录"))
@@ -827,21 +1095,34 @@ class TimesliceGUI(QMainWindow):
         position = position_map.get(self.position_combo.currentText(), "center")
 
         # 映射排序规则
-        sort_map = {
-            self.tr("按文件名"): "name",
-            self.tr("按创建时间"): "created_time",
-            self.tr("按修改时间"): "modified_time"
-        }
-        sort_by = sort_map.get(self.sort_combo.currentText(), "name")
+        sort_by = self.current_sort_by()
 
         # 获取文件扩展名
         extension_map = {
             "JPG": "jpg",
             "PNG": "png",
-            "WebP": "webp"
+            "WebP": "webp",
+            "TIFF": "tif"
         }
         extension = extension_map.get(self.extension_combo.currentText(), "jpg")
 
+        # 编码参数
+        quality = self.quality_spin.value() or None
+        tiff_compression_map = {
+            "LZW": "lzw",
+            "Deflate": "deflate",
+            self.tr("无"): "none"
+        }
+        encoder_options = {
+            'quality': quality,
+            'subsampling': self.subsampling_combo.currentText().replace(":", ""),
+            'progressive': self.progressive_check.isChecked(),
+            'png_compress_level': self.png_level_spin.value(),
+            'png_strategy': self.png_strategy_combo.currentText(),
+            'tiff_compression': tiff_compression_map.get(self.tiff_compression_combo.currentText(), "lzw")
+        }
+        extra_extensions = [ext for ext, check in self.extra_format_checks.items() if check.isChecked()]
+
         # 准备参数
         params = {
             'input_dir': input_dir,
@@ -854,18 +1135,22 @@ class TimesliceGUI(QMainWindow):
             'output_basename': self.basename_edit.text().strip() or "timeslice",
             'include_timestamp': self.timestamp_check.isChecked(),
             'include_slice_type': self.slice_type_check.isChecked(),
-            'extension': extension
+            'extension': extension,
+            'encoder_options': encoder_options,
+            'extra_extensions': extra_extensions,
+            'align': self.align_check.isChecked(),
+            'deflicker': self.deflicker_check.isChecked()
         }
 
         # 重置状态
         self.error_log.clear()
         self.process_btn.setEnabled(False)
 
-        # 加载图片
-        from utils import load_images
+        # 统计图片数量（不解码）
+        from utils import list_image_paths
         try:
-            images = load_images(input_dir, sort_by, self.reverse_check.isChecked())
-            self.total_images = len(images)
+            image_paths = list_image_paths(input_dir, sort_by, self.reverse_check.isChecked())
+            self.total_images = len(image_paths)
             self.progress_bar.setRange(0, self.total_images)
             self.progress_bar.setValue(0)
 
@@ -923,6 +1208,7 @@ class TimesliceGUI(QMainWindow):
     def closeEvent(self, event):
         """关闭窗口"""
         self.theme_check_timer.stop()
+        self.thumbnail_loader.stop()
         event.accept()
 
 
@@ -1,8 +1,14 @@
-import json
+import marshal
 import os
 import sys
 from pathlib import Path
 
+# 已加载的翻译表（按语言文件路径缓存，进程内只读取一次）
+_catalogs = {}
+
+# 已创建的翻译器（按语言缓存）
+_translators = {}
+
 
 def get_base_path():
     """获取正确的基础路径（兼容开发环境和打包环境）"""
@@ -15,6 +21,57 @@ def get_base_path():
     return base_path
 
 
+def _compiled_path(lang_file):
+    """预编译翻译表的路径（languages/__pycache__ 下，按解释器版本区分）"""
+    lang_file = Path(lang_file)
+    return lang_file.parent / "__pycache__" / f"{lang_file.stem}.{sys.implementation.cache_tag}.catalog"
+
+
+def compile_catalog(lang_file):
+    """将 .locpak 预编译为 marshal 格式，读取时无需解析 JSON，返回翻译表"""
+    import json
+    stat = os.stat(lang_file)
+    with open(lang_file, 'r', encoding='utf-8') as f:
+        translations = json.load(f)
+    compiled = _compiled_path(lang_file)
+    try:
+        compiled.parent.mkdir(exist_ok=True)
+        with open(compiled, 'wb') as f:
+            marshal.dump((stat.st_mtime_ns, stat.st_size, translations), f)
+    except OSError:
+        # 目录不可写（如打包后的只读目录）时直接使用解析结果
+        pass
+    return translations
+
+
+def load_catalog(lang_file):
+    """读取翻译表：优先使用进程内缓存，其次是与源文件一致的预编译文件"""
+    if lang_file in _catalogs:
+        return _catalogs[lang_file]
+
+    translations = None
+    try:
+        stat = os.stat(lang_file)
+        with open(_compiled_path(lang_file), 'rb') as f:
+            mtime_ns, size, data = marshal.load(f)
+        if (mtime_ns, size) == (stat.st_mtime_ns, stat.st_size) and isinstance(data, dict):
+            translations = data
+    except (OSError, ValueError, EOFError, TypeError):
+        pass
+
+    if translations is None:
+        translations = compile_catalog(lang_file)
+    _catalogs[lang_file] = translations
+    return translations
+
+
+def get_translator(lang='en'):
+    """获取指定语言的翻译器（每种语言只创建一次）"""
+    if lang not in _translators:
+        _translators[lang] = Translator(lang)
+    return _translators[lang]
+
+
 class Translator:
     def __init__(self, lang='en'):
         self.translations = {}
@@ -33,14 +90,12 @@ class Translator:
                 lang_file = os.path.join(current_dir, "languages", f"{lang}.locpak")
 
             if os.path.exists(lang_file):
-                with open(lang_file, 'r', encoding='utf-8') as f:
-                    self.translations = json.load(f)
+                self.translations = load_catalog(lang_file)
             else:
                 # 尝试加载英文作为后备
                 en_file = os.path.join(base_path, "languages", "en.locpak")
                 if os.path.exists(en_file):
-                    with open(en_file, 'r', encoding='utf-8') as f:
-                        self.translations = json.load(f)
+                    self.translations = load_catalog(en_file)
                 else:
                     print(f"警告：找不到语言文件 {lang_file} 和 {en_file}")
                     self.translations = {}
@@ -50,4 +105,11 @@ class Translator:
 
     def tr(self, text):
         """翻译文本"""
-        return self.translations.get(text, text)
\ No newline at end of file
+        return self.translations.get(text, text)
+
+
+if __name__ == "__main__":
+    # 打包前预编译所有语言文件：python i18n.py
+    for lang_file in sorted(Path(get_base_path(), "languages").glob("*.locpak")):
+        compile_catalog(str(lang_file))
+        print(f"已编译: {lang_file.name}")
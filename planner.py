@@ -0,0 +1,254 @@
+import numpy as np
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+from geometry import get_geometry
+from utils import RAW_EXTENSIONS, open_image, read_image_size, read_capture_time, get_available_memory
+
+# 执行策略（按峰值内存从高到低）：
+#   in-memory  分块合成：可见帧解码后保留，直到最后一个用到它的分块完成
+#   streaming  逐帧解码，合成后立即释放，画布在内存中
+#   memmap     逐帧解码，画布和帧索引图位于磁盘映射的临时文件中
+#   tiled      同 memmap，但画布逐块写入分块 TIFF，不再整体读回内存
+STRATEGIES = ("in-memory", "streaming", "memmap", "tiled")
+
+# 未指定内存上限时使用的可用内存比例
+DEFAULT_MEMORY_FRACTION = 0.75
+
+
+def select_slots(count, slots):
+    """从 count 帧中均匀选取 slots 帧，返回帧序号（包含首尾两帧）"""
+    if not slots or slots >= count:
+        return list(range(count))
+    if slots == 1:
+        return [count // 2]
+    return sorted({round(k * (count - 1) / (slots - 1)) for k in range(slots)})
+
+
+def capture_times(paths, catalog=None, max_workers=None):
+    """读取所有帧的拍摄时间：并行读取文件头，结果缓存在帧目录中"""
+    times = [None] * len(paths)
+    missing = []
+    for i, path in enumerate(paths):
+        cached = catalog.get(path, "capture_time") if catalog else None
+        if cached:
+            times[i] = cached["time"]
+        else:
+            missing.append(i)
+
+    if missing:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for i, value in zip(missing, executor.map(lambda i: read_capture_time(paths[i]), missing)):
+                times[i] = value
+                if catalog:
+                    catalog.put(paths[i], "capture_time", {"time": value})
+        if catalog:
+            catalog.save()
+    return times
+
+
+def select_time_uniform(times, slots):
+    """按拍摄时间均匀选帧：在最早和最晚时间之间取 slots 个等间隔时刻，每个时刻选取时间最近的帧
+
+    返回按时间排序的帧序号，稀疏的时间段中同一帧可能被多个时刻选中（占据相应的输出区域）。
+    所有帧时间相同时按序号均匀选取。
+    """
+    order = sorted(range(len(times)), key=lambda i: times[i])
+    sorted_times = np.array([times[i] for i in order], dtype=np.float64)
+    if len(order) < 2 or sorted_times[-1] == sorted_times[0]:
+        return select_slots(len(times), slots)
+
+    instants = np.linspace(sorted_times[0], sorted_times[-1], slots) if slots > 1 else sorted_times[[0]]
+    right = np.clip(np.searchsorted(sorted_times, instants), 1, len(order) - 1)
+    left = right - 1
+    nearest = np.where(instants - sorted_times[left] <= sorted_times[right] - instants, left, right)
+    return [order[i] for i in nearest]
+
+
+def dedupe_slots(paths, indices):
+    """合并路径相同的位置（按拍摄时间选帧时同一帧可能占据多个位置）
+
+    返回 (unique_paths, unique_indices, slots)：slots[i] 为位置 i 在 unique_paths 中的序号，
+    unique_indices 为 indices 中的位置对应的序号（去重后排序）。
+    """
+    unique_paths, slots, seen = [], [], {}
+    for path in paths:
+        key = str(path)
+        if key not in seen:
+            seen[key] = len(unique_paths)
+            unique_paths.append(path)
+        slots.append(seen[key])
+    return unique_paths, sorted({slots[i] for i in indices}), slots
+
+
+class FramePlan:
+    """合成计划：参与合成的图片路径、切片几何和实际出现在输出中的帧"""
+
+    def __init__(self, paths, geometry, visible, total):
+        self.paths = paths
+        self.geometry = geometry
+        self.visible = visible
+        self.total = total
+
+    @property
+    def skipped(self):
+        """不需要解码的图片数（未选中的时隙 + 不拥有任何输出像素的帧）"""
+        return self.total - len(self.visible)
+
+
+def resolve_size(paths, resize):
+    """解析统一的帧尺寸：first（第一张）、smallest（面积最小的一张）、"宽x高" 或 (宽, 高)"""
+    if resize == 'first':
+        return read_image_size(paths[0])
+    if resize == 'smallest':
+        return min((read_image_size(path) for path in paths), key=lambda size: size[0] * size[1])
+    try:
+        if isinstance(resize, str):
+            width, height = resize.lower().split('x')
+            resize = (width, height)
+        width, height = int(resize[0]), int(resize[1])
+    except (ValueError, TypeError):
+        raise ValueError(f"无效的尺寸: {resize}")
+    if width <= 0 or height <= 0:
+        raise ValueError(f"无效的尺寸: {resize}")
+    return width, height
+
+
+def plan_frames(paths, slice_type, position="center", linear=False, slots=None, tile_size=None, resize=None,
+                slice_map=None, angle=0.0):
+    """根据切片几何规划需要解码的帧
+
+    只读取第一张图片的文件头获得尺寸；slots 指定时先均匀选取该数量的帧。
+    帧数多于可显示的列/行/角度时，被挤出画布或被后续帧完全覆盖的帧不会被解码。
+    tile_size 指定时按分块计算帧索引图，不生成整幅帧索引图（用于分块输出）。
+    resize 指定时输出尺寸由 resolve_size 决定（smallest 需要读取所有图片的文件头）。
+    slice_map 为 custom_map 切片的映射图，angle 为 linear_angle 切片的角度。
+    """
+    total = len(paths)
+    paths = [paths[i] for i in select_slots(total, slots)]
+    size = resolve_size(paths, resize) if resize else read_image_size(paths[0])
+    geometry = get_geometry(slice_type, size, len(paths), position, linear, slice_map, angle)
+    return FramePlan(paths, geometry, geometry.visible_frames(tile_size), total)
+
+
+def default_memory_limit():
+    """默认内存上限（可用内存的一部分，无法获取可用内存时返回 None）"""
+    available = get_available_memory()
+    return int(available * DEFAULT_MEMORY_FRACTION) if available else None
+
+
+def frame_memory(path):
+    """只读取文件头，估算一帧解码后占用的字节数和解码过程中的峰值字节数"""
+    img_w, img_h = read_image_size(path)
+    pixels = img_w * img_h
+    if Path(str(path)).suffix.lower() in RAW_EXTENSIONS:
+        # 16 位传感器数据 + 16 位 RGB 中间结果 + 8 位 RGB 输出
+        return pixels * 3, pixels * (2 + 6 + 3)
+    with open_image(path) as img:
+        bands = len(img.getbands())
+        depth = 2 if img.mode.startswith('I;16') else 4 if img.mode in ('I', 'F') else 1
+    decoded = pixels * bands * depth
+    # 非 8 位 RGB 的帧在裁剪后还要转换为 RGB
+    return decoded, decoded if bands == 3 and depth == 1 else decoded + pixels * 3
+
+
+class MemoryPlan:
+    """内存规划：选定的执行策略、各策略的峰值内存估算（字节）和内存上限"""
+
+    def __init__(self, strategy, estimates, limit):
+        self.strategy = strategy
+        self.estimates = estimates
+        self.limit = limit
+
+    @property
+    def estimate(self):
+        return self.estimates[self.strategy]
+
+    @property
+    def fits(self):
+        return self.limit is None or self.estimate <= self.limit
+
+
+def plan_frame_memory(plan):
+    """plan 中一帧保留在内存中的字节数和解码峰值；帧尺寸与输出尺寸不同（统一尺寸）时
+    按输出尺寸的 RGB 帧计算保留的字节数"""
+    if not plan.visible:
+        return 0, 0
+    path = plan.paths[plan.visible[0]]
+    frame, decode = frame_memory(path)
+    img_w, img_h = plan.geometry.size
+    if read_image_size(path) != (img_w, img_h):
+        frame = img_w * img_h * 3
+    return frame, decode
+
+
+def estimate_memory(plan, tile_size=512):
+    """估算 plan 在各执行策略下的峰值内存（字节）
+
+    取决于可见帧数（由切片类型决定）、分辨率和位深；帧索引图已在规划时
+    缓存的按实际大小计算，否则合成时需要一份整幅 int32 帧索引图。
+    """
+    frame, decode = plan_frame_memory(plan)
+    img_w, img_h = plan.geometry.size
+    pixels = img_w * img_h
+    canvas = pixels * 3
+    cached = plan.geometry.nbytes()
+    labels = cached or pixels * 4
+    # 每帧合成时裁剪出的图片、转换后的数组和掩码（按最大的帧区域计算）
+    boxes = [plan.geometry.frame_bbox(i) for i in plan.visible]
+    region = max([(b[2] - b[0]) * (b[3] - b[1]) for b in boxes if b is not None], default=0) * 7
+    # 分块写入器缓存的一行分块（含金字塔）
+    tiles = tile_size * img_w * 3 * 2
+    frames = len(plan.visible) * frame
+
+    return {
+        # 最坏情况下所有帧同时保留在内存中，不需要整幅帧索引图和画布
+        "in-memory": frames + decode + cached + tiles,
+        # 合成结果数组 + 转换为图片时的一份拷贝
+        "streaming": decode + labels + region + canvas * 2,
+        # 合成时只有正在处理的帧，编码时整幅画布读回内存
+        "memmap": cached + max(decode + region, canvas),
+        "tiled": cached + decode + region + tiles
+    }
+
+
+def choose_strategy(plan, memory_limit=None, tiff_output=False, tiled_tiff=False, tile_size=512):
+    """选择估算峰值不超过 memory_limit 的最快执行策略
+
+    指定分块 TIFF 时只在 in-memory 和 tiled 之间选择，否则在 streaming、memmap
+    和（输出 TIFF 时）tiled 之间选择。所有策略都超过上限时使用占用最小的策略。
+    """
+    estimates = estimate_memory(plan, tile_size)
+    if tiled_tiff:
+        candidates = ("in-memory", "tiled")
+    elif tiff_output:
+        candidates = STRATEGIES[1:]
+    else:
+        candidates = STRATEGIES[1:3]
+
+    if memory_limit is not None:
+        for strategy in candidates:
+            if estimates[strategy] <= memory_limit:
+                return MemoryPlan(strategy, estimates, memory_limit)
+        return MemoryPlan(min(candidates, key=estimates.get), estimates, memory_limit)
+    return MemoryPlan(candidates[0], estimates, memory_limit)
+
+
+def estimate_shared_memory(plan):
+    """可见帧全部解码后保留（由多个切片共用）时的峰值内存：帧 + streaming 策略的合成部分
+
+    占据多个位置的同一帧只计算一次。
+    """
+    frame, _ = plan_frame_memory(plan)
+    frames = len({str(plan.paths[i]) for i in plan.visible})
+    return frames * frame + estimate_memory(plan)["streaming"]
+
+
+def choose_shared_strategy(plan, memory_limit=None, tiff_output=False, tiled_tiff=False, tile_size=512):
+    """批量任务和常驻服务的执行策略：所有可见帧解码后保留能放入 memory_limit 时为 shared
+    （解码一次供各切片共用），否则按 choose_strategy 选择帧按需解码的策略"""
+    memory = choose_strategy(plan, memory_limit, tiff_output, tiled_tiff, tile_size)
+    memory.estimates["shared"] = estimate_shared_memory(plan)
+    if memory_limit is None or memory.estimates["shared"] <= memory_limit:
+        memory.strategy = "shared"
+    return memory
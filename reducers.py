@@ -0,0 +1,180 @@
+import numpy as np
+from PIL import Image
+
+from compositor import array_region
+
+# 支持的归约方式
+REDUCERS = ("mean", "median", "lighten")
+
+# 中值直方图的档数
+MEDIAN_BINS = 16
+
+# 组内帧数不超过该值时中值按缓存的帧精确计算
+MEDIAN_BUFFER = 16
+
+
+def group_frames(count, regions):
+    """把 count 帧按顺序分成 regions 个连续的组（各组帧数相差不超过 1）"""
+    regions = max(1, min(regions, count))
+    bounds = np.linspace(0, count, regions + 1).round().astype(np.int64)
+    return [list(range(start, end)) for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+class MeanAccumulator:
+    """平均值：float32 累加和"""
+
+    def __init__(self, shape):
+        self.total = np.zeros(shape, dtype=np.float32)
+        self.count = 0
+
+    def add(self, pixels):
+        self.total += pixels
+        self.count += 1
+
+    def result(self):
+        return np.clip(self.total / max(self.count, 1) + 0.5, 0, 255).astype(np.uint8)
+
+
+class LightenAccumulator:
+    """变亮（逐像素最大值，如星轨）"""
+
+    def __init__(self, shape):
+        self.maximum = np.zeros(shape, dtype=np.uint8)
+
+    def add(self, pixels):
+        np.maximum(self.maximum, pixels, out=self.maximum)
+
+    def result(self):
+        return self.maximum
+
+
+class MedianAccumulator:
+    """中值：帧数不超过 MEDIAN_BUFFER 时缓存各帧精确计算，超过后转为每个像素每个通道
+    MEDIAN_BINS 档的 uint16 直方图，在中值所在的档内按计数线性插值（内存与帧数无关）
+
+    直方图的初始范围按缓存帧中每个像素的最小值和最大值确定；之后的值超出范围时（如亮度
+    逐渐变化的序列）该像素的范围向值所在一侧加倍，相邻两档合并为一档，计数不丢失。
+    """
+
+    def __init__(self, shape):
+        self.shape = shape
+        self.buffer = []
+        self.counts = None
+        self.count = 0
+
+    def add(self, pixels):
+        self.count += 1
+        if self.counts is None:
+            self.buffer.append(np.array(pixels, dtype=np.uint8))
+            if len(self.buffer) <= MEDIAN_BUFFER:
+                return
+            # 缓存已满，按缓存帧的取值范围转为直方图
+            buffered, self.buffer = np.stack(self.buffer), []
+            self.low = buffered.min(axis=0).astype(np.float32)
+            self.step = (buffered.max(axis=0) - self.low + 1) / MEDIAN_BINS
+            self.counts = np.zeros(self.shape + (MEDIAN_BINS,), dtype=np.uint16)
+            self._offsets = np.arange(int(np.prod(self.shape)), dtype=np.intp) * MEDIAN_BINS
+            for frame in buffered:
+                self._count(frame)
+            return
+        self._count(pixels)
+
+    def _expand(self, pixels):
+        """扩大范围直到包含 pixels（每次加倍，范围最多扩大到覆盖 0-255 所需的次数）"""
+        half = MEDIAN_BINS // 2
+        while True:
+            below = pixels < self.low
+            outside = below | (pixels >= self.low + self.step * MEDIAN_BINS)
+            if not outside.any():
+                return
+            # 相邻两档合并：向上扩大时放在前半部分，向下扩大时放在后半部分
+            merged = self.counts[outside].reshape(-1, half, 2).sum(axis=-1, dtype=np.uint16)
+            down = below[outside]
+            counts = np.zeros((len(merged), MEDIAN_BINS), dtype=np.uint16)
+            counts[~down, :half] = merged[~down]
+            counts[down, half:] = merged[down]
+            self.counts[outside] = counts
+            self.low[below] -= self.step[below] * MEDIAN_BINS
+            self.step[outside] *= 2
+
+    def _count(self, pixels):
+        self._expand(pixels)
+        bins = np.clip((pixels - self.low) / self.step, 0, MEDIAN_BINS - 1).astype(np.intp).reshape(-1)
+        # 每个像素通道只增加自己的一档，索引不重复
+        self.counts.reshape(-1)[self._offsets + bins] += 1
+
+    def result(self):
+        if self.counts is None:
+            if not self.buffer:
+                return np.zeros(self.shape, dtype=np.uint8)
+            return np.median(np.stack(self.buffer), axis=0).round().astype(np.uint8)
+        cumulative = np.cumsum(self.counts, axis=-1, dtype=np.uint32)
+        half = self.count / 2
+        index = np.argmax(cumulative >= half, axis=-1)[..., np.newaxis]
+        in_bin = np.take_along_axis(self.counts, index, axis=-1)[..., 0].astype(np.float32)
+        below = np.take_along_axis(cumulative, index, axis=-1)[..., 0] - in_bin
+        fraction = (half - below) / np.maximum(in_bin, 1)
+        return np.clip(self.low + (index[..., 0] + fraction) * self.step, 0, 255).round().astype(np.uint8)
+
+
+ACCUMULATORS = {"mean": MeanAccumulator, "median": MedianAccumulator, "lighten": LightenAccumulator}
+
+
+class ReducedImage:
+    """一组连续帧归约得到的帧：只在区域 footprint（源图坐标）内逐帧累加，每帧加入后立即释放
+
+    首次裁剪时计算，结果保留到 release；footprint 之外的像素为黑色。
+    """
+
+    def __init__(self, frames, reducer, footprint):
+        if reducer not in ACCUMULATORS:
+            raise ValueError(f"未知的归约方式: {reducer}")
+        if reducer == "median" and len(frames) > np.iinfo(np.uint16).max:
+            raise ValueError("中值归约的每组帧数不能超过 65535")
+        self.frames = frames
+        self.reducer = reducer
+        self.footprint = footprint
+        self._result = None
+
+    @property
+    def size(self):
+        return self.frames[0].size
+
+    @property
+    def mode(self):
+        return 'RGB'
+
+    def _reduce(self):
+        left, top, right, bottom = self.footprint
+        accumulator = ACCUMULATORS[self.reducer]((bottom - top, right - left, 3))
+        for frame in self.frames:
+            region = frame.crop(self.footprint)
+            if region.mode != 'RGB':
+                region = region.convert('RGB')
+            accumulator.add(np.asarray(region))
+            if hasattr(frame, 'release'):
+                frame.release()
+        return accumulator.result()
+
+    def crop(self, box):
+        if self._result is None:
+            self._result = self._reduce()
+        left, top = self.footprint[:2]
+        region = array_region(self._result, (box[0] - left, box[1] - top, box[2] - left, box[3] - top))
+        return Image.fromarray(np.ascontiguousarray(region))
+
+    def release(self):
+        self._result = None
+
+
+def reduce_groups(images, groups, regions, geometry, reducer):
+    """为 regions 中的每个区域创建 ReducedImage（区域 k 由 groups[k] 中的帧归约），其余位置为 None"""
+    reduced = [None] * len(groups)
+    for k in regions:
+        box = geometry.frame_bbox(k)
+        if box is None:
+            continue
+        dx, dy = geometry.frame_offset(k)
+        footprint = (box[0] + dx, box[1] + dy, box[2] + dx, box[3] + dy)
+        reduced[k] = ReducedImage([images[i] for i in groups[k]], reducer, footprint)
+    return reduced
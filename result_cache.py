@@ -0,0 +1,222 @@
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import argparse
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+from thumbnails import get_cache_dir
+
+# 缓存格式版本（合成或编码结果变化时递增，使旧的缓存失效）
+CACHE_VERSION = 1
+
+# 缓存条目的描述文件
+META_NAME = "meta.json"
+
+
+def get_result_cache_dir():
+    """结果缓存目录（与缩略图缓存位于同一目录下）"""
+    return get_cache_dir().parent / "results"
+
+
+def file_digest(path, chunk_size=1024 * 1024):
+    """文件内容的 SHA-1"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def input_identities(paths, content_hash=False, max_workers=None):
+    """输入帧的标识：路径、大小、修改时间；content_hash 为 True 时改用文件内容的哈希
+
+    压缩包成员、多页 TIFF 的页和视频帧按所在文件计算内容哈希（每个文件只计算一次）。
+    """
+    if not content_hash:
+        identities = []
+        for path in paths:
+            stat = path.stat() if hasattr(path, 'stat') else os.stat(path)
+            identities.append([str(path), stat.st_size, stat.st_mtime_ns])
+        return identities
+
+    def container(path):
+        source = getattr(path, 'source', None)
+        return str(source.path if source is not None else path)
+
+    files = [container(path) for path in paths]
+    unique = sorted(set(files))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        digests = dict(zip(unique, executor.map(file_digest, unique)))
+    return [[str(path), digests[file]] for path, file in zip(paths, files)]
+
+
+def job_fingerprint(paths, params, content_hash=False):
+    """任务指纹：按排序后的输入帧标识和影响输出的参数计算"""
+    data = json.dumps({
+        "version": CACHE_VERSION,
+        "inputs": input_identities(paths, content_hash),
+        "params": params
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+def _place(source, target, link=True):
+    """将文件放到目标路径：优先硬链接（不复制数据），跨文件系统时复制"""
+    target = Path(target)
+    temp_path = target.with_name(f".{target.name}.tmp")
+    if temp_path.exists():
+        temp_path.unlink()
+    try:
+        if not link:
+            raise OSError
+        os.link(source, temp_path)
+    except OSError:
+        shutil.copyfile(source, temp_path)
+    os.replace(temp_path, target)
+
+
+def _stamp(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+class ResultCache:
+    """按内容寻址的结果缓存：以任务指纹为键保存输出文件（主输出、其他格式和缩小的输出）
+
+    条目保存在 <缓存目录>/<指纹前两位>/<指纹>/ 中，文件以相对主输出文件名的后缀命名
+    （如 .jpg、_512.png），命中时按本次请求的输出文件名放到输出目录。
+    """
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = Path(cache_dir) if cache_dir else get_result_cache_dir()
+
+    def _entry_dir(self, fingerprint):
+        return self.cache_dir / fingerprint[:2] / fingerprint
+
+    def fetch(self, fingerprint, output_path):
+        """缓存命中时把缓存的输出放到 output_path（同名的其他文件放在同一目录），返回放置的文件列表"""
+        entry = self._entry_dir(fingerprint)
+        try:
+            with open(entry / META_NAME, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        output_path = Path(output_path)
+        files = []
+        for suffix, stamp in meta.get("files", {}).items():
+            source = entry / f"output{suffix}"
+            try:
+                if _stamp(source) != stamp:
+                    raise OSError("cached file changed")
+            except OSError:
+                # 缓存文件缺失或被修改（例如原地覆盖了硬链接的输出）时作废该条目
+                shutil.rmtree(entry, ignore_errors=True)
+                return None
+            files.append((source, output_path.with_name(output_path.stem + suffix)))
+
+        for source, target in files:
+            _place(source, target)
+        # 最近使用时间用于清理
+        os.utime(entry / META_NAME)
+        return [str(target) for _, target in files]
+
+    def store(self, fingerprint, output_path, outputs, description=None):
+        """保存本次的输出文件（outputs 为输出路径列表，都以主输出文件名开头）"""
+        output_path = Path(output_path)
+        entry = self._entry_dir(fingerprint)
+        temp_dir = entry.with_name(f".{fingerprint}.{os.getpid()}.tmp")
+        try:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            temp_dir.mkdir(parents=True)
+            files = {}
+            for path in outputs:
+                path = Path(path)
+                if not path.exists():
+                    continue
+                suffix = path.name[len(output_path.stem):]
+                # 保存时复制，之后覆盖本次的输出不会影响缓存
+                _place(path, temp_dir / f"output{suffix}", link=False)
+                files[suffix] = _stamp(temp_dir / f"output{suffix}")
+            meta = dict(description or {}, files=files, created=time.time())
+            with open(temp_dir / META_NAME, 'w', encoding='utf-8') as f:
+                json.dump(meta, f, ensure_ascii=False, indent=2)
+            shutil.rmtree(entry, ignore_errors=True)
+            os.replace(temp_dir, entry)
+        except OSError:
+            # 缓存目录不可写时不影响输出
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def entries(self):
+        """所有缓存条目：(指纹, 描述, 占用字节, 最近使用时间)，按最近使用时间排序"""
+        entries = []
+        if not self.cache_dir.exists():
+            return entries
+        for meta_path in self.cache_dir.glob(f"*/*/{META_NAME}"):
+            try:
+                with open(meta_path, 'r', encoding='utf-8') as f:
+                    meta = json.load(f)
+                used = meta_path.stat().st_mtime
+            except (OSError, ValueError):
+                continue
+            size = sum(p.stat().st_size for p in meta_path.parent.iterdir() if p.is_file())
+            entries.append((meta_path.parent.name, meta, size, used))
+        entries.sort(key=lambda entry: entry[3])
+        return entries
+
+    def prune(self, max_bytes=None, max_age=None):
+        """删除超过 max_age 秒未使用的条目，再按最近最少使用删除到总大小不超过 max_bytes，返回删除的条目数"""
+        entries = self.entries()
+        now = time.time()
+        removed = 0
+        total = sum(entry[2] for entry in entries)
+        for fingerprint, _, size, used in entries:
+            expired = max_age is not None and now - used > max_age
+            oversize = max_bytes is not None and total > max_bytes
+            if expired or oversize:
+                shutil.rmtree(self._entry_dir(fingerprint), ignore_errors=True)
+                total -= size
+                removed += 1
+        return removed
+
+
+def main(argv=None):
+    """结果缓存管理入口：python cli.py cache list / prune"""
+    parser = argparse.ArgumentParser(prog="cli.py cache", description="查看和清理结果缓存")
+    parser.add_argument("--cache-dir", default=None, help="缓存目录（默认用户缓存目录）")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="列出缓存条目")
+    prune = commands.add_parser("prune", help="清理缓存条目")
+    prune.add_argument("--max-size", type=int, default=None, help="保留的缓存总大小上限（MB，按最近最少使用删除）")
+    prune.add_argument("--older-than", type=float, default=None, help="删除超过该天数未使用的条目")
+    prune.add_argument("--all", action="store_true", help="删除所有条目")
+    args = parser.parse_args(argv)
+
+    cache = ResultCache(args.cache_dir)
+    if args.command == "list":
+        entries = cache.entries()
+        for fingerprint, meta, size, used in entries:
+            print(f"{fingerprint[:16]}  {time.strftime('%Y-%m-%d %H:%M', time.localtime(used))}  "
+                  f"{size / 2 ** 20:8.1f} MB  {meta.get('slice_type', '-')}  {meta.get('input_dir', '-')}")
+        total = sum(entry[2] for entry in entries)
+        print(f"{len(entries)} 个条目，共 {total / 2 ** 20:.1f} MB: {cache.cache_dir}")
+        return 0
+
+    if args.all:
+        removed = cache.prune(max_bytes=0)
+    elif args.max_size is None and args.older_than is None:
+        parser.error("prune 需要 --max-size、--older-than 或 --all")
+    else:
+        max_bytes = args.max_size * 1024 * 1024 if args.max_size is not None else None
+        max_age = args.older_than * 86400 if args.older_than is not None else None
+        removed = cache.prune(max_bytes, max_age)
+    print(f"已删除 {removed} 个条目")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+import os
+import math
+import time
+import numpy as np
+from pathlib import Path
+from PIL import Image
+
+# 支持的动画格式
+REVEAL_FORMATS = ("webp", "png")
+
+
+def reveal_path(output_path, fmt):
+    """动画输出路径：animated WebP 为 <主文件名>_reveal.webp，PNG 序列为 <主文件名>_reveal/ 目录"""
+    output_path = Path(output_path)
+    name = f"{output_path.stem}_reveal"
+    return output_path.with_name(name + ".webp") if fmt == "webp" else output_path.with_name(name)
+
+
+def reduced_labels(geometry, size):
+    """在缩小画布的像素中心采样帧索引图（逐行只计算被采样的一行全分辨率像素）"""
+    img_w, img_h = geometry.size
+    width, height = size
+    xs = np.minimum(((np.arange(width) + 0.5) * img_w / width).astype(np.int64), img_w - 1)
+    ys = np.minimum(((np.arange(height) + 0.5) * img_h / height).astype(np.int64), img_h - 1)
+    if geometry.nbytes():
+        return geometry.label_map()[np.ix_(ys, xs)]
+    labels = np.empty((height, width), dtype=np.int32)
+    for row, y in enumerate(ys):
+        labels[row] = geometry.label_tile((0, int(y), img_w, int(y) + 1))[0, xs]
+    return labels
+
+
+def reduced_box(box, full_size, size):
+    """全分辨率的帧区域对应的缩小画布区域（向外取整）"""
+    sx, sy = size[0] / full_size[0], size[1] / full_size[1]
+    left, top, right, bottom = box
+    return (max(0, math.floor(left * sx)), max(0, math.floor(top * sy)),
+            min(size[0], math.ceil(right * sx)), min(size[1], math.ceil(bottom * sy)))
+
+
+def reveal_frames(final, geometry, steps):
+    """逐个生成动画帧：工作画布从空白开始，每个动画帧只把新加入的源帧拥有的区域从缩小的结果复制过来
+
+    final 为缩小的合成结果，源帧按序号均分到 steps 个动画帧中；每个源帧只更新其区域（缩小后）
+    内帧索引等于该帧的像素，总开销与更新的区域成正比。
+    """
+    source = np.asarray(final.convert('RGB'))
+    size = final.size
+    labels = reduced_labels(geometry, size)
+    canvas = np.zeros_like(source)
+    order = [i for i in range(geometry.num_images) if geometry.frame_bbox(i) is not None]
+    bounds = np.linspace(0, len(order), steps + 1).round().astype(np.int64)
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        for i in order[start:end]:
+            left, top, right, bottom = reduced_box(geometry.frame_bbox(i), geometry.size, size)
+            if right <= left or bottom <= top:
+                continue
+            mask = labels[top:bottom, left:right] == i
+            canvas[top:bottom, left:right][mask] = source[top:bottom, left:right][mask]
+        yield Image.fromarray(canvas)
+
+
+def render_reveal(final, geometry, output_path, fmt="webp", fps=12, seconds=5.0, hold=1.0, quality=80):
+    """生成揭示动画（animated WebP 或 PNG 序列），返回与 encoding.save_image 相同格式的统计信息
+
+    动画帧数为 fps × seconds（不超过参与合成的帧数），最后一帧额外停留 hold 秒（仅 WebP）。
+    """
+    if fmt not in REVEAL_FORMATS:
+        raise ValueError(f"不支持的动画格式: {fmt}")
+    start = time.perf_counter()
+    visible = sum(1 for i in range(geometry.num_images) if geometry.frame_bbox(i) is not None)
+    steps = max(1, min(visible, round(fps * seconds)))
+    path = reveal_path(output_path, fmt)
+
+    if fmt == "png":
+        # PNG 序列逐帧写入，不在内存中保留动画帧
+        path.mkdir(parents=True, exist_ok=True)
+        total = 0
+        digits = len(str(steps))
+        for index, frame in enumerate(reveal_frames(final, geometry, steps)):
+            frame_path = path / f"frame_{index + 1:0{digits}d}.png"
+            frame.save(frame_path, "PNG", compress_level=1)
+            total += os.path.getsize(frame_path)
+        return {"path": str(path), "format": f"PNG x{steps}", "seconds": time.perf_counter() - start,
+                "bytes": total}
+
+    frames = list(reveal_frames(final, geometry, steps))
+    durations = [round(1000 / fps)] * len(frames)
+    durations[-1] += round(hold * 1000)
+    frames[0].save(path, "WEBP", save_all=True, append_images=frames[1:], duration=durations, loop=0,
+                   quality=quality)
+    return {"path": str(path), "format": f"WebP x{steps}", "seconds": time.perf_counter() - start,
+            "bytes": os.path.getsize(path)}
@@ -0,0 +1,206 @@
+import math
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, ImageOps
+
+from geometry import SliceGeometry, StripGeometry, SCurveGeometry
+from utils import open_proxy
+
+# 可以优化接缝的切片类型（每行/每列中帧序号单调递增）
+SEAM_SLICE_TYPES = ("vertical", "horizontal", "vertical_s", "horizontal_s")
+
+# 代理图上超出源图的像素的差异代价
+OUTSIDE_COST = 255.0
+
+
+def _load_proxy(path, proxy_size, size=None):
+    """读取灰度代理图（统一帧尺寸时同样缩放并居中裁剪）"""
+    proxy = open_proxy(path, proxy_size)
+    if size:
+        scale = min(1.0, proxy_size / max(size))
+        fit = (max(1, round(size[0] * scale)), max(1, round(size[1] * scale)))
+        if proxy.size != fit:
+            proxy = ImageOps.fit(proxy, fit, Image.BILINEAR)
+    return np.asarray(proxy, dtype=np.float32)
+
+
+def _base_boundaries(base, rows, vertical):
+    """在采样的行（水平切片为列）上统计原始几何的帧边界：边界 k 为帧序号不大于 k 的像素数"""
+    img_w, img_h = base.size
+    length = img_w if vertical else img_h
+    n = base.num_images
+    bounds = np.zeros((len(rows), n), dtype=np.float64)
+    band = 32
+    for start in range(0, len(rows), band):
+        chunk = rows[start:start + band]
+        low, high = int(chunk[0]), int(chunk[-1]) + 1
+        box = (0, low, img_w, high) if vertical else (low, 0, high, img_h)
+        labels = base.label_tile(box)
+        labels = labels[chunk - low] if vertical else labels[:, chunk - low].T
+        # 背景（-1）计入最后一个边界之后
+        labels = np.where(labels < 0, n, labels)
+        counts = np.zeros((len(chunk), n + 1), dtype=np.int64)
+        np.add.at(counts, (np.repeat(np.arange(len(chunk)), length), labels.ravel()), 1)
+        bounds[start:start + len(chunk)] = np.cumsum(counts, axis=1)[:, :n]
+    return bounds
+
+
+def _min_cost_paths(cost):
+    """对每条边界求代价最小的路径（相邻行偏移最多变化 1），逐行向量化计算所有边界
+
+    cost 为 (边界数, 行数, 偏移数) 数组，返回 (边界数, 行数) 的偏移序号。
+    """
+    count, rows, width = cost.shape
+    total = cost[:, 0].copy()
+    moves = np.zeros((count, rows, width), dtype=np.int8)
+    pad = np.full((count, 1), np.inf)
+    for y in range(1, rows):
+        # 上一行的 j - 1、j、j + 1 三个偏移
+        choices = np.stack([np.concatenate([pad, total[:, :-1]], axis=1),
+                            total,
+                            np.concatenate([total[:, 1:], pad], axis=1)])
+        step = np.argmin(choices, axis=0)
+        total = np.take_along_axis(choices, step[np.newaxis], axis=0)[0] + cost[:, y]
+        moves[:, y] = step - 1
+
+    path = np.zeros((count, rows), dtype=np.int64)
+    path[:, -1] = np.argmin(total, axis=1)
+    index = np.arange(count)
+    for y in range(rows - 1, 0, -1):
+        path[:, y - 1] = path[:, y] + moves[index, y, path[:, y]]
+    return path
+
+
+class SeamGeometry(SliceGeometry):
+    """内容感知接缝：沿原始几何的帧边界，在代理图上寻找相邻两帧差异最小的分界路径
+
+    帧的源图偏移与原始几何相同，只移动帧之间的分界线。seams 为 (帧数, 采样行数) 的
+    全分辨率边界位置，采样行之间线性插值。
+    """
+
+    def __init__(self, base, seams, rows, vertical):
+        super().__init__(base.size, base.num_images)
+        self.base = base
+        self.seams = seams
+        self.rows = rows
+        self.vertical = vertical
+
+    def frame_offset(self, i):
+        return self.base.frame_offset(i)
+
+    def frame_bbox(self, i):
+        img_w, img_h = self.size
+        low = self.seams[i - 1].min() if i > 0 else 0
+        high = self.seams[i].max()
+        if high <= low:
+            return None
+        low, high = max(0, int(math.floor(low))), int(math.ceil(high))
+        if self.vertical:
+            return low, 0, min(img_w, high), img_h
+        return 0, low, img_w, min(img_h, high)
+
+    def label_tile(self, box):
+        left, top, right, bottom = box
+        if not self.vertical:
+            # 水平切片按转置后的垂直切片计算
+            left, top, right, bottom = top, left, bottom, right
+        lines = np.arange(top, bottom)
+        # 采样行之间线性插值边界位置
+        upper = np.clip(np.searchsorted(self.rows, lines), 1, len(self.rows) - 1) if len(self.rows) > 1 else None
+        if upper is None:
+            seams = np.repeat(self.seams[:, :1], len(lines), axis=1)
+        else:
+            lower = upper - 1
+            weight = np.clip((lines - self.rows[lower]) / np.maximum(self.rows[upper] - self.rows[lower], 1), 0, 1)
+            seams = self.seams[:, lower] * (1 - weight) + self.seams[:, upper] * weight
+
+        coords = np.arange(left, right) + 0.5
+        labels = np.empty((len(lines), right - left), dtype=np.int32)
+        for r in range(len(lines)):
+            labels[r] = np.searchsorted(seams[:, r], coords, side='right')
+        labels[labels >= self.num_images] = -1
+        return labels if self.vertical else labels.T
+
+
+def optimize_seams(geometry, paths, indices, proxy_size=512, size=None, max_workers=None, log_callback=None):
+    """在代理图上为垂直/水平条带和 S 型曲线寻找差异最小的接缝，返回 SeamGeometry
+
+    对每条帧边界，在不越过相邻边界中点的范围内用动态规划求最小代价路径（代价为两帧在
+    该位置的灰度差），再放大到全分辨率。indices 为参与合成的帧，只读取这些帧的代理图。
+    """
+    vertical = geometry.vertical if isinstance(geometry, (StripGeometry, SCurveGeometry)) else None
+    if vertical is None:
+        raise ValueError("该切片类型不支持接缝优化")
+
+    img_w, img_h = geometry.size
+    length, lines = (img_w, img_h) if vertical else (img_h, img_w)
+    scale = min(1.0, proxy_size / max(img_w, img_h))
+    proxy_length = max(1, round(length * scale))
+    proxy_lines = max(1, round(lines * scale))
+    step = length / proxy_length
+    rows = np.minimum(((np.arange(proxy_lines) + 0.5) * lines / proxy_lines).astype(np.int64), lines - 1)
+
+    n = geometry.num_images
+    bounds = _base_boundaries(geometry, rows, vertical).T
+    # 每条边界可以移动的范围：不超过到相邻边界最小距离的一半（代理图像素）
+    widths = np.diff(np.vstack([np.zeros((1, len(rows))), bounds]), axis=0).min(axis=1) / step
+    reach = np.floor(np.minimum(widths[:-1], widths[1:]) / 2).astype(np.int64)
+    # 最后一条边界（与背景的分界）不移动
+    reach = np.append(np.maximum(reach, 0), 0)
+    visible = set(indices)
+    for k in range(n - 1):
+        if k not in visible or k + 1 not in visible:
+            reach[k] = 0
+    width = int(reach.max()) if n > 1 else 0
+    if width == 0:
+        if log_callback:
+            log_callback("帧条带过窄，无法优化接缝")
+        return SeamGeometry(geometry, bounds, rows, vertical)
+
+    offsets = np.arange(-width, width + 1)
+    centers = np.round(bounds / step).astype(np.int64)
+    active = [k for k in range(n - 1) if reach[k] > 0]
+    needed = sorted({i for k in active for i in (k, k + 1)})
+
+    def frame_bands(i):
+        # 帧 i 在其两侧边界附近的代理图像素（超出源图为 NaN）
+        proxy = _load_proxy(paths[i], proxy_size, size)
+        if not vertical:
+            proxy = proxy.T
+        dx, dy = geometry.frame_offset(i)
+        shift, line_shift = (dx, dy) if vertical else (dy, dx)
+        shift, line_shift = int(round(shift / step)), int(round(line_shift / step))
+        src_lines = np.arange(proxy_lines) + line_shift
+        bands = {}
+        for k in (i - 1, i):
+            if 0 <= k < n - 1 and reach[k] > 0:
+                cols = centers[k][:, np.newaxis] + offsets[np.newaxis, :] + shift
+                rows_index = np.broadcast_to(src_lines[:, np.newaxis], cols.shape)
+                inside = ((cols >= 0) & (cols < proxy.shape[1]) &
+                          (rows_index >= 0) & (rows_index < proxy.shape[0]))
+                values = proxy[np.clip(rows_index, 0, proxy.shape[0] - 1), np.clip(cols, 0, proxy.shape[1] - 1)]
+                bands[k] = np.where(inside, values, np.nan)
+        return i, bands
+
+    if log_callback:
+        log_callback(f"在 {len(needed)} 张代理图上优化 {len(active)} 条接缝...")
+    left_bands, right_bands = {}, {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for i, bands in executor.map(frame_bands, needed):
+            for k, values in bands.items():
+                (left_bands if k == i else right_bands)[k] = values
+
+    cost = np.full((len(active), proxy_lines, len(offsets)), np.inf)
+    for index, k in enumerate(active):
+        diff = np.abs(left_bands.pop(k) - right_bands.pop(k))
+        diff = np.where(np.isnan(diff), OUTSIDE_COST, diff)
+        # 范围之外的偏移不可用；差异相同时偏向原始边界
+        allowed = np.abs(offsets) <= reach[k]
+        cost[index][:, allowed] = diff[:, allowed] + np.abs(offsets[allowed]) * 1e-3
+
+    paths_found = _min_cost_paths(cost)
+    seams = bounds.copy()
+    seams[active] = bounds[active] + (offsets[paths_found]) * step
+    # 保证边界不交叉
+    seams = np.maximum.accumulate(seams, axis=0)
+    return SeamGeometry(geometry, seams, rows, vertical)
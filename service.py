@@ -0,0 +1,425 @@
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import itertools
+import threading
+import traceback
+import socketserver
+from queue import PriorityQueue
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from utils import list_image_paths, decode_image, read_image_size, load_frames, share_frames, DEFAULT_MAX_OPEN
+from geometry import get_geometry
+from planner import (select_slots, resolve_size, capture_times, select_time_uniform, dedupe_slots,
+                     FramePlan, choose_shared_strategy, default_memory_limit)
+from encoding import normalize_extension
+from align import align_frames
+from deflicker import deflicker_frames
+from dedup import find_duplicates
+from seams import optimize_seams
+from catalog import open_catalog
+from cli import run_timeslice
+
+# 任务可以设置的 run_timeslice 参数
+JOB_PARAMS = {
+    'input_dir', 'output_dir', 'slice_type', 'position', 'linear', 'reverse', 'sort_by',
+    'output_basename', 'include_timestamp', 'include_slice_type', 'extension',
+    'encoder_options', 'extra_extensions', 'encode_workers',
+    'tiled_tiff', 'tile_size', 'pyramid_levels', 'bigtiff', 'slots', 'align', 'align_rotation',
+    'deflicker', 'deflicker_window', 'resize', 'output_sizes', 'slice_map', 'angle',
+    'dedup', 'dedup_threshold', 'time_uniform', 'seams', 'reveal', 'reveal_size', 'reveal_fps', 'reveal_seconds',
+    'memory_limit', 'reducer', 'resume', 'checkpoint_interval', 'cache', 'cache_hash'
+}
+
+# 设置后整个任务交由 run_timeslice 自行加载（不使用帧缓存和几何缓存）的参数
+DIRECT_PARAMS = ('reducer', 'resume', 'cache')
+
+
+class LRUCache:
+    """按内存占用淘汰的线程安全 LRU 缓存"""
+
+    def __init__(self, max_bytes, sizeof):
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self._items = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return self._items[key][0]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        size = self.sizeof(value)
+        with self._lock:
+            if key in self._items:
+                self._bytes -= self._items.pop(key)[1]
+            self._items[key] = (value, size)
+            self._bytes += size
+            # 淘汰最久未使用的条目，至少保留刚放入的条目
+            while self._bytes > self.max_bytes and len(self._items) > 1:
+                _, (_, old_size) = self._items.popitem(last=False)
+                self._bytes -= old_size
+
+    def get_or_create(self, key, factory):
+        value = self.get(key)
+        if value is None:
+            value = factory()
+            self.put(key, value)
+        return value
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._items),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+
+def _image_bytes(image):
+    return image.size[0] * image.size[1] * len(image.getbands())
+
+
+class Job:
+    """渲染任务"""
+
+    def __init__(self, job_id, params, priority):
+        self.id = job_id
+        self.params = params
+        self.priority = priority
+        self.state = "queued"
+        self.stage = ""
+        self.done = 0
+        self.total = 0
+        self.messages = []
+        self.result = None
+        self.error = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "state": self.state,
+            "priority": self.priority,
+            "stage": self.stage,
+            "progress": {"done": self.done, "total": self.total},
+            "messages": self.messages,
+            "result": self.result,
+            "error": self.error,
+            "submitted": self.submitted,
+            "started": self.started,
+            "finished": self.finished,
+            "params": self.params
+        }
+
+
+class RenderService:
+    """常驻渲染服务：优先级队列 + 跨任务复用的解码帧与切片几何缓存"""
+
+    def __init__(self, workers=1, cache_bytes=2 * 1024 ** 3):
+        self.frame_cache = LRUCache(cache_bytes, _image_bytes)
+        # 几何对象缓存其帧索引图，按帧索引图大小计入缓存
+        self.geometry_cache = LRUCache(cache_bytes // 4, lambda geometry: geometry.nbytes())
+        self._listings = {}
+        self._queue = PriorityQueue()
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._workers = [threading.Thread(target=self._worker, daemon=True) for _ in range(workers)]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, params, priority=0):
+        """提交任务，priority 越大越先执行"""
+        unknown = set(params) - JOB_PARAMS
+        if unknown:
+            raise ValueError(f"未知参数: {', '.join(sorted(unknown))}")
+        for key in ('input_dir', 'output_dir', 'slice_type'):
+            if key not in params:
+                raise ValueError(f"缺少参数: {key}")
+
+        job_id = next(self._ids)
+        job = Job(job_id, params, priority)
+        with self._lock:
+            self._jobs[job_id] = job
+        self._queue.put((-priority, job_id))
+        return job
+
+    def cancel(self, job_id):
+        """取消尚未开始的任务"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.state != "queued":
+                return False
+            job.state = "cancelled"
+            return True
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+    def status(self):
+        counts = {}
+        for job in self.jobs():
+            counts[job.state] = counts.get(job.state, 0) + 1
+        return {
+            "jobs": counts,
+            "queued": self._queue.qsize(),
+            "frame_cache": self.frame_cache.stats(),
+            "geometry_cache": self.geometry_cache.stats()
+        }
+
+    def _list_paths(self, input_dir, sort_by, reverse):
+        """列出图片路径，目录未变化（修改时间相同）时复用上次的结果"""
+        key = (os.path.abspath(input_dir), sort_by, reverse)
+        mtime = os.stat(input_dir).st_mtime_ns
+        cached = self._listings.get(key)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        paths = list_image_paths(input_dir, sort_by, reverse)
+        self._listings[key] = (mtime, paths)
+        return paths
+
+    def _load_frame(self, path, size=None):
+        """从缓存读取已解码的帧，文件变化（大小或修改时间）后重新解码"""
+        stat = path.stat()
+        key = (str(path), stat.st_mtime_ns, stat.st_size, size)
+
+        return self.frame_cache.get_or_create(key, lambda: decode_image(path, size))
+
+    def _worker(self):
+        while True:
+            _, job_id = self._queue.get()
+            job = self.get(job_id)
+            if job is None or job.state != "queued":
+                continue
+            job.state = "running"
+            job.started = time.time()
+            try:
+                job.result = self._run(job)
+                job.state = "done"
+            except Exception as e:
+                job.error = f"{e}\n{traceback.format_exc()}"
+                job.state = "failed"
+            job.finished = time.time()
+
+    def _run(self, job):
+        params = dict(job.params)
+        if any(params.get(key) for key in DIRECT_PARAMS):
+            # 区域归约、检查点和结果缓存由 run_timeslice 按 CLI 的流程处理
+            job.stage = "compositing"
+
+            def direct_progress(current):
+                job.done = current
+
+            return run_timeslice(progress_callback=direct_progress, log_callback=job.messages.append, **params)
+        paths = self._list_paths(params['input_dir'], params.get('sort_by', 'name'), params.get('reverse', False))
+        catalog = open_catalog(params['input_dir'])
+        dedup_threshold = params.pop('dedup_threshold', 3)
+        if params.pop('dedup', False):
+            job.stage = "deduplicating"
+            paths, duplicates = find_duplicates(paths, dedup_threshold, catalog, log_callback=job.messages.append)
+            if duplicates:
+                job.messages.append(f"跳过近似重复的图片 {len(duplicates)}/{len(paths) + len(duplicates)}: "
+                                    f"{', '.join(path.name for path, _, _ in duplicates)}")
+        time_uniform = params.pop('time_uniform', None)
+        if time_uniform:
+            selected = select_time_uniform(capture_times(paths, catalog), time_uniform)
+            if params.get('reverse'):
+                selected.reverse()
+            paths = [paths[i] for i in selected]
+        paths = [paths[i] for i in select_slots(len(paths), params.pop('slots', None))]
+
+        resize = params.pop('resize', None)
+        target_size = resolve_size(paths, resize) if resize else None
+        slice_map = params.get('slice_map')
+        args = (params['slice_type'], target_size or read_image_size(paths[0]), len(paths),
+                params.get('position', 'center'), params.get('linear', False), slice_map,
+                params.get('angle', 0.0))
+        # 映射图按路径和修改时间区分，原地修改后重新生成几何
+        key = args + (os.stat(slice_map).st_mtime_ns if slice_map else None,)
+        if params.pop('seams', False):
+            # 接缝取决于帧的内容，不使用几何缓存
+            job.stage = "seams"
+            geometry = get_geometry(*args)
+            visible = geometry.visible_frames()
+            geometry = optimize_seams(geometry, paths, visible, size=target_size, log_callback=job.messages.append)
+        elif params.get('tiled_tiff'):
+            # 分块模式不需要整幅帧索引图，不使用几何缓存
+            geometry = get_geometry(*args)
+            visible = geometry.visible_frames(params.get('tile_size', 512))
+        else:
+            geometry = self.geometry_cache.get_or_create(key, lambda: _build_geometry(*args))
+            visible = geometry.visible_frames()
+
+        # 与 CLI 相同按内存上限选择执行策略：放得下时只解码在输出中拥有像素的帧（经帧缓存），
+        # 否则帧按需解码，不进入帧缓存
+        memory = choose_shared_strategy(FramePlan(paths, geometry, visible, len(paths)),
+                                        params.pop('memory_limit', None) or default_memory_limit(),
+                                        normalize_extension(params.get('extension', 'jpg')) in ('tif', 'tiff'),
+                                        params.get('tiled_tiff', False), params.get('tile_size', 512))
+        job.messages.append(f"执行策略: {memory.strategy} (估算峰值内存 {memory.estimate / 2 ** 20:.0f} MB)")
+        # 同一帧占据多个位置时（按拍摄时间选帧）只加载、对齐和去闪烁一次
+        unique_paths, unique_visible, slots = dedupe_slots(paths, visible)
+        job.stage = "loading"
+        job.total = len(unique_visible)
+        shared = memory.strategy == "shared"
+        if shared:
+            images = [None] * len(unique_paths)
+            for count, i in enumerate(unique_visible, 1):
+                images[i] = self._load_frame(unique_paths[i], target_size)
+                job.done = count
+        else:
+            images = load_frames(unique_paths, unique_visible, DEFAULT_MAX_OPEN, target_size)
+
+        align_rotation = params.pop('align_rotation', False)
+        if params.pop('align', False) or align_rotation:
+            job.stage = "aligning"
+            images = align_frames(unique_paths, images, unique_visible, align_rotation,
+                                  catalog=catalog, log_callback=job.messages.append, size=target_size)
+        deflicker_window = params.pop('deflicker_window', 15)
+        if params.pop('deflicker', False):
+            job.stage = "deflickering"
+            images = deflicker_frames(unique_paths, images, unique_visible, deflicker_window,
+                                      catalog=catalog, log_callback=job.messages.append)
+        images = share_frames(images, slots, visible)
+
+        job.stage = "compositing"
+        job.done = 0
+
+        def progress_callback(current):
+            job.done = current
+
+        return run_timeslice(images=images, geometry=geometry, progress_callback=progress_callback,
+                             log_callback=job.messages.append, strategy=None if shared else memory.strategy, **params)
+
+
+def _build_geometry(slice_type, size, num_images, position, linear, slice_map=None, angle=0.0):
+    geometry = get_geometry(slice_type, size, num_images, position, linear, slice_map, angle)
+    geometry.label_map()
+    return geometry
+
+
+class ServiceRequestHandler(BaseHTTPRequestHandler):
+    """JSON HTTP 接口
+
+    POST   /jobs       提交任务（run_timeslice 参数，可选 priority）
+    GET    /jobs       所有任务
+    GET    /jobs/<id>  任务状态与进度
+    DELETE /jobs/<id>  取消排队中的任务
+    GET    /status     队列与缓存状态
+    """
+
+    service = None
+
+    def address_string(self):
+        # Unix 套接字没有客户端地址
+        return self.client_address[0] if self.client_address else "unix"
+
+    def _send(self, code, payload):
+        body = json.dumps(payload, ensure_ascii=False, default=str).encode('utf-8')
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _job_id(self):
+        parts = self.path.strip('/').split('/')
+        if len(parts) == 2 and parts[0] == 'jobs' and parts[1].isdigit():
+            return int(parts[1])
+        return None
+
+    def do_GET(self):
+        if self.path.rstrip('/') == '/status':
+            self._send(200, self.service.status())
+        elif self.path.rstrip('/') == '/jobs':
+            self._send(200, [job.to_dict() for job in self.service.jobs()])
+        else:
+            job = self.service.get(self._job_id())
+            if job is None:
+                self._send(404, {"error": "任务不存在"})
+            else:
+                self._send(200, job.to_dict())
+
+    def do_POST(self):
+        if self.path.rstrip('/') != '/jobs':
+            self._send(404, {"error": "未知接口"})
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            params = json.loads(self.rfile.read(length) or b'{}')
+            if not isinstance(params, dict):
+                raise ValueError("任务参数必须是 JSON 对象")
+            priority = int(params.pop('priority', 0))
+            job = self.service.submit(params, priority)
+        except (ValueError, TypeError) as e:
+            self._send(400, {"error": str(e)})
+            return
+        self._send(201, {"id": job.id})
+
+    def do_DELETE(self):
+        if self.service.cancel(self._job_id()):
+            self._send(200, {"cancelled": True})
+        else:
+            self._send(409, {"error": "任务不存在或已开始"})
+
+
+if hasattr(socket, 'AF_UNIX'):
+    class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+
+def main(argv=None):
+    """常驻服务入口：python cli.py serve"""
+    parser = argparse.ArgumentParser(prog="cli.py serve", description="时间切片常驻渲染服务")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址（默认仅本机）")
+    parser.add_argument("--port", type=int, default=8765, help="监听端口")
+    parser.add_argument("--socket", default=None, help="改为监听 Unix 套接字路径")
+    parser.add_argument("--workers", type=int, default=1, help="并发渲染任务数")
+    parser.add_argument("--cache-mb", type=int, default=2048, help="解码帧缓存大小（MB）")
+    args = parser.parse_args(argv)
+
+    ServiceRequestHandler.service = RenderService(args.workers, args.cache_mb * 1024 * 1024)
+
+    if args.socket:
+        if not hasattr(socket, 'AF_UNIX'):
+            parser.error("当前系统不支持 Unix 套接字")
+        if os.path.exists(args.socket):
+            os.remove(args.socket)
+        server = UnixHTTPServer(args.socket, ServiceRequestHandler)
+        print(f"渲染服务已启动: unix:{args.socket}")
+    else:
+        server = ThreadingHTTPServer((args.host, args.port), ServiceRequestHandler)
+        print(f"渲染服务已启动: http://{args.host}:{args.port}")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
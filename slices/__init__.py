@@ -1,12 +1,30 @@
-from .vertical_slice import create_vertical_slice
-from .horizontal_slice import create_horizontal_slice
-from .circular_sector_slice import create_circular_sector_slice
-from .elliptical_sector_slice import create_elliptical_sector_slice
-from .elliptical_band_slice import create_elliptical_band_slice
-from .rectangular_band_slice import create_rectangular_band_slice
-from .circular_band_slice import create_circular_band_slice
-from .vertical_s_slice import create_vertical_s_slice
-from .horizontal_s_slice import create_horizontal_s_slice
+# 切片函数在首次访问时才导入，避免导入本包时加载所有切片模块及其依赖
+
+
+def __getattr__(name):
+    if name in __all__:
+        # 使用静态导入语句，便于打包工具识别依赖
+        from . import (
+            vertical_slice,
+            horizontal_slice,
+            circular_sector_slice,
+            elliptical_sector_slice,
+            elliptical_band_slice,
+            rectangular_band_slice,
+            circular_band_slice,
+            vertical_s_slice,
+            horizontal_s_slice
+        )
+        module = globals()[name[len('create_'):]]
+        value = getattr(module, name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
+
 
 __all__ = [
     'create_vertical_slice',
@@ -40,7 +40,7 @@ def create_circular_sector_slice(images, linear=False):
              center_x + r, center_y + r],
             start_angle, end_angle, fill=255
         )
-        masked_img = Image.composite(src_img, result, mask)
+        masked_img = Image.composite(src_img.crop((0, 0, img_w, img_h)), result, mask)
         result.paste(masked_img, (0, 0))
 
     return result
\ No newline at end of file
@@ -52,7 +52,7 @@ def create_elliptical_band_slice(images):
             prev_bottom = center_y + prev_height // 2
             mask_draw.ellipse([prev_left, prev_top, prev_right, prev_bottom], fill=0)
 
-        masked_img = Image.composite(images[i], result, mask)
+        masked_img = Image.composite(images[i].crop((0, 0, img_w, img_h)), result, mask)
         result.paste(masked_img, (0, 0))
 
     return result
\ No newline at end of file
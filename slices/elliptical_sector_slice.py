@@ -45,7 +45,7 @@ def create_elliptical_sector_slice(images, linear=False):
         mask = Image.new('L', (img_w, img_h))
         mask_draw = ImageDraw.Draw(mask)
         mask_draw.pieslice(ellipse_bbox, start_angle, end_angle, fill=255)
-        masked_img = Image.composite(src_img, result, mask)
+        masked_img = Image.composite(src_img.crop((0, 0, img_w, img_h)), result, mask)
         result.paste(masked_img, (0, 0))
 
     return result
\ No newline at end of file
@@ -79,7 +79,7 @@ def create_horizontal_s_slice(images):
             draw.polygon([(0, y1), (img_w, y1), (img_w, img_h), (0, img_h)], fill=255)
 
         # 应用蒙版 - 只显示当前条带的S形部分
-        masked_img = Image.composite(img, Image.new('RGB', (img_w, img_h), (0, 0, 0)), mask)
+        masked_img = Image.composite(img.crop((0, 0, img_w, img_h)), Image.new('RGB', (img_w, img_h), (0, 0, 0)), mask)
 
         # 将处理好的S形部分粘贴到结果图
         result.paste(masked_img, (0, 0), mask)
@@ -0,0 +1,210 @@
+import io
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+from types import SimpleNamespace
+from PIL import Image
+
+from utils import IMAGE_EXTENSIONS
+
+# 可以作为帧读取的扩展名（与目录中支持的图片格式一致）
+IMAGE_SUFFIXES = {ext[1:] for ext in IMAGE_EXTENSIONS}
+
+TAR_SUFFIXES = ('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+TIFF_SUFFIXES = ('.tif', '.tiff')
+VIDEO_SUFFIXES = ('.mp4', '.mov', '.avi', '.mkv', '.m4v', '.mts')
+
+
+class FrameRef:
+    """帧来源中不对应单独文件的一帧（压缩包成员、多页 TIFF 的一页）
+
+    提供与 pathlib.Path 相同的 name、suffix 和 stat()，utils 中的读取函数通过
+    open_file() 读取图片数据（page 为多页 TIFF 中的页序号），可以像文件路径一样使用。
+    """
+
+    def __init__(self, source, key, file_size, mtime_ns, name=None, page=0):
+        self.source = source
+        self.key = key
+        self.name = name or Path(str(key)).name
+        self.file_size = file_size
+        self.mtime_ns = mtime_ns
+        self.page = page
+
+    @property
+    def suffix(self):
+        return Path(self.name).suffix
+
+    def stat(self):
+        return SimpleNamespace(st_size=self.file_size, st_mtime_ns=self.mtime_ns, st_mtime=self.mtime_ns / 1e9)
+
+    def open_file(self):
+        """打开图片数据（文件路径或二进制文件对象）"""
+        return self.source.open_member(self.key)
+
+    def __str__(self):
+        # 压缩包成员显示完整的成员路径，其他来源显示帧名称
+        member = self.key if isinstance(self.key, str) else self.name
+        return os.path.join(str(self.source.path), member)
+
+    def __repr__(self):
+        return f"<FrameRef {self}>"
+
+
+class VideoFrameRef(FrameRef):
+    """视频中的一帧：由来源直接解码为 RGB 图片"""
+
+    def decode(self):
+        return self.source.read_frame(self.key)
+
+    def read_size(self):
+        return self.source.frame_size
+
+
+class FrameSource:
+    """帧来源：列出其中的所有帧（Path 或 FrameRef），不读取图片内容"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+
+    def frames(self):
+        raise NotImplementedError
+
+
+class DirectorySource(FrameSource):
+    """目录中的图片文件"""
+
+    def frames(self):
+        paths = []
+        for ext in IMAGE_EXTENSIONS:
+            paths.extend(self.path.glob(ext))
+        return paths
+
+
+class ZipSource(FrameSource):
+    """zip 压缩包：逐个成员按需解压读取，不解压到磁盘"""
+
+    def __init__(self, path):
+        super().__init__(path)
+        self._lock = threading.Lock()
+        self._zip = None
+
+    def _archive(self):
+        import zipfile
+        with self._lock:
+            if self._zip is None:
+                self._zip = zipfile.ZipFile(self.path)
+            return self._zip
+
+    def frames(self):
+        refs = []
+        for info in self._archive().infolist():
+            if info.is_dir() or Path(info.filename).suffix.lower() not in IMAGE_SUFFIXES:
+                continue
+            mtime_ns = int(datetime(*info.date_time).timestamp() * 1e9)
+            refs.append(FrameRef(self, info.filename, info.file_size, mtime_ns))
+        return refs
+
+    def open_member(self, key):
+        # 成员文件对象共享压缩包的文件句柄，可以在多个线程中同时读取
+        return self._archive().open(key)
+
+
+class TarSource(FrameSource):
+    """tar 压缩包（可以是 gzip/bz2/xz 压缩的）：逐个成员读入内存，不解压到磁盘
+
+    压缩的 tar 只能顺序解压，按成员顺序读取时不会重复解压。
+    """
+
+    def __init__(self, path):
+        super().__init__(path)
+        self._lock = threading.Lock()
+        self._tar = None
+        self._members = {}
+
+    def frames(self):
+        import tarfile
+        refs = []
+        with self._lock:
+            if self._tar is None:
+                self._tar = tarfile.open(self.path)
+            for member in self._tar.getmembers():
+                if member.isfile() and Path(member.name).suffix.lower() in IMAGE_SUFFIXES:
+                    self._members[member.name] = member
+                    refs.append(FrameRef(self, member.name, member.size, int(member.mtime * 1e9)))
+        return refs
+
+    def open_member(self, key):
+        with self._lock:
+            return io.BytesIO(self._tar.extractfile(self._members[key]).read())
+
+
+class MultiPageTiffSource(FrameSource):
+    """多页 TIFF：每一页为一帧，按页序排列"""
+
+    def frames(self):
+        with Image.open(self.path) as img:
+            count = getattr(img, 'n_frames', 1)
+        stat = self.path.stat()
+        digits = max(4, len(str(count)))
+        return [FrameRef(self, page, stat.st_size, stat.st_mtime_ns,
+                         f"{self.path.stem}#{page + 1:0{digits}d}{self.path.suffix}", page)
+                for page in range(count)]
+
+    def open_member(self, key):
+        return str(self.path)
+
+
+class VideoSource(FrameSource):
+    """视频文件（需要安装 OpenCV）：每一帧为一帧，按顺序读取时不需要定位"""
+
+    def __init__(self, path):
+        super().__init__(path)
+        try:
+            import cv2
+        except ImportError:
+            raise ImportError("请安装opencv-python库以读取视频: pip install opencv-python")
+        self._cv2 = cv2
+        self._lock = threading.Lock()
+        self._capture = cv2.VideoCapture(str(self.path))
+        if not self._capture.isOpened():
+            raise ValueError(f"无法打开视频: {self.path}")
+        self._next = 0
+        self.frame_size = (int(self._capture.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                           int(self._capture.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+
+    def frames(self):
+        count = int(self._capture.get(self._cv2.CAP_PROP_FRAME_COUNT))
+        stat = self.path.stat()
+        digits = max(6, len(str(count)))
+        return [VideoFrameRef(self, index, stat.st_size, stat.st_mtime_ns, f"{self.path.stem}#{index:0{digits}d}")
+                for index in range(count)]
+
+    def read_frame(self, index):
+        """解码第 index 帧，返回 RGB 图片"""
+        cv2 = self._cv2
+        with self._lock:
+            if index != self._next:
+                self._capture.set(cv2.CAP_PROP_POS_FRAMES, index)
+            ok, frame = self._capture.read()
+            self._next = index + 1
+        if not ok:
+            raise ValueError(f"无法读取视频帧 {index}: {self.path}")
+        return Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+
+
+def open_source(location):
+    """按输入路径选择帧来源：目录、zip/tar 压缩包、多页 TIFF 或视频文件"""
+    path = Path(location)
+    if path.is_dir():
+        return DirectorySource(path)
+    name = path.name.lower()
+    if name.endswith('.zip'):
+        return ZipSource(path)
+    if name.endswith(TAR_SUFFIXES):
+        return TarSource(path)
+    if name.endswith(TIFF_SUFFIXES):
+        return MultiPageTiffSource(path)
+    if name.endswith(VIDEO_SUFFIXES):
+        return VideoSource(path)
+    raise ValueError(f"不支持的输入: {location}")
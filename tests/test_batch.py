@@ -0,0 +1,46 @@
+import numpy as np
+from PIL import Image
+
+from batch import expand_jobs, plan_job_memory, run_batch
+from geometry import get_geometry
+from planner import FramePlan
+from utils import list_image_paths
+
+
+def _write_frames(directory, count=6, size=(640, 480)):
+    directory.mkdir()
+    for i in range(count):
+        pixels = np.full((size[1], size[0], 3), 40 * i % 256, dtype=np.uint8)
+        Image.fromarray(pixels).save(directory / f"f{i:03d}.png")
+    return directory
+
+
+def test_expand_jobs_accepts_render_options(tmp_path):
+    manifest = {"jobs": [{"input_dir": "in", "slice_type": "vertical", "tiled_tiff": True, "tile_size": 256,
+                          "pyramid_levels": 2, "bigtiff": False, "slots": 4, "reducer": "mean", "cache": True,
+                          "resume": True, "encode_workers": 2}]}
+    job, = expand_jobs(manifest, tmp_path)
+    assert job['tiled_tiff'] and job['tile_size'] == 256 and job['reducer'] == "mean"
+
+
+def test_tiled_tiff_job_chooses_tiled_strategy(tmp_path):
+    paths = list_image_paths(str(_write_frames(tmp_path / "in")))
+    geometry = get_geometry("vertical", (640, 480), len(paths), "center", False)
+    plan = FramePlan(paths, geometry, geometry.visible_frames(), len(paths))
+    job = {"input_dir": str(tmp_path / "in"), "tiled_tiff": True, "tile_size": 128}
+    # 上限不足以保留所有帧和整幅画布时选择分块写入
+    memory = plan_job_memory(plan, job, 2 * 1024 ** 2)
+    assert memory.strategy == "tiled"
+
+
+def test_batch_renders_tiled_tiff(tmp_path):
+    _write_frames(tmp_path / "in")
+    manifest = {"jobs": [{"input_dir": "in", "output_dir": "out", "slice_type": "vertical",
+                          "tiled_tiff": True, "tile_size": 128}]}
+    logs = []
+    report = run_batch(expand_jobs(manifest, tmp_path), workers=1, memory_limit=2 * 1024 ** 2, log=logs.append)
+    assert report['succeeded'] == 1
+    assert any("执行策略 tiled" in line for line in logs)
+    output = Image.open(report['results'][0]['output'])
+    # TileWidth / TileLength 标签
+    assert output.size == (640, 480) and output.tag_v2[322] == 128 and output.tag_v2[323] == 128
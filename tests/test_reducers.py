@@ -0,0 +1,33 @@
+import numpy as np
+
+from reducers import MedianAccumulator, MEDIAN_BUFFER
+
+
+def _median_of(values, shape=(4, 5, 3)):
+    accumulator = MedianAccumulator(shape)
+    for value in values:
+        accumulator.add(np.full(shape, value, dtype=np.uint8))
+    return accumulator.result()
+
+
+def test_median_exact_within_buffer():
+    values = [10, 200, 30, 40, 250]
+    assert (_median_of(values) == 40).all()
+
+
+def test_median_follows_drifting_brightness():
+    # 亮度逐渐变暗的序列（长于缓存帧数），后续的值都在初始直方图范围之外
+    values = np.linspace(200, 2, 100).round().astype(np.uint8)
+    assert len(values) > MEDIAN_BUFFER
+    result = _median_of(values)
+    assert np.abs(result.astype(int) - np.median(values)).max() <= 2
+
+
+def test_median_follows_brightening_noisy_sequence():
+    rng = np.random.default_rng(0)
+    frames = [np.clip(20 + 2 * k + rng.normal(0, 10, (30, 40, 3)), 0, 255).astype(np.uint8) for k in range(100)]
+    accumulator = MedianAccumulator((30, 40, 3))
+    for frame in frames:
+        accumulator.add(frame)
+    error = np.abs(accumulator.result().astype(int) - np.median(np.stack(frames), axis=0))
+    assert error.mean() < 3
@@ -0,0 +1,39 @@
+import json
+import threading
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from service import RenderService, ServiceRequestHandler
+
+
+@pytest.fixture
+def server():
+    ServiceRequestHandler.service = RenderService(workers=1, cache_bytes=1024 ** 2)
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), ServiceRequestHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _post(url, body):
+    request = urllib.request.Request(url + "/jobs", data=body, method="POST")
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status, json.load(response)
+    except urllib.error.HTTPError as e:
+        return e.code, json.load(e)
+
+
+@pytest.mark.parametrize("body", [b"[]", b'"x"', b"3", b"null"])
+def test_post_rejects_non_object_body(server, body):
+    status, payload = _post(server, body)
+    assert status == 400 and "error" in payload
+
+
+def test_post_rejects_unknown_params(server):
+    status, payload = _post(server, json.dumps({"bogus": 1}).encode())
+    assert status == 400 and "bogus" in payload["error"]
@@ -0,0 +1,62 @@
+import os
+import sys
+import hashlib
+from pathlib import Path
+from PIL import Image
+
+from utils import open_embedded_thumbnail, open_proxy
+
+
+def get_cache_dir():
+    """持久化缩略图缓存目录（Windows 使用 LOCALAPPDATA，其他系统使用 XDG 缓存目录）"""
+    if sys.platform == 'win32':
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return Path(base) / "TimeslicePhotoGenerator" / "thumbnails"
+
+
+def extract_thumbnail(path, max_size=160):
+    """生成缩略图：优先使用内嵌缩略图，其次按比例解码的代理图（PNG/TIFF 需要完整解码）"""
+    image = open_embedded_thumbnail(path)
+    if image is None:
+        return open_proxy(path, max_size, 'RGB')
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    image.thumbnail((max_size, max_size), Image.BILINEAR)
+    return image
+
+
+class ThumbnailCache:
+    """缩略图磁盘缓存：以路径 + 修改时间 + 缩略图尺寸为键，保存为小 JPEG 文件"""
+
+    def __init__(self, cache_dir=None, max_size=160):
+        self.cache_dir = Path(cache_dir) if cache_dir else get_cache_dir()
+        self.max_size = max_size
+
+    def _cache_path(self, path):
+        stat = path.stat() if hasattr(path, 'stat') else os.stat(path)
+        key = f"{os.path.abspath(str(path))}|{stat.st_mtime_ns}|{stat.st_size}|{self.max_size}"
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return self.cache_dir / digest[:2] / f"{digest}.jpg"
+
+    def get(self, path):
+        """读取缩略图，缓存不存在或源文件已变化时重新生成并写入缓存"""
+        cache_path = self._cache_path(path)
+        try:
+            with Image.open(cache_path) as cached:
+                cached.load()
+                return cached.convert('RGB')
+        except (OSError, SyntaxError):
+            pass
+
+        image = extract_thumbnail(path, self.max_size)
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = cache_path.with_suffix('.tmp')
+            image.save(temp_path, 'JPEG', quality=85)
+            os.replace(temp_path, cache_path)
+        except OSError:
+            # 缓存目录不可写时只返回结果
+            pass
+        return image
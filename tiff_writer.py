@@ -0,0 +1,257 @@
+import struct
+import zlib
+import numpy as np
+
+# TIFF 标签
+NEW_SUBFILE_TYPE = 254
+IMAGE_WIDTH = 256
+IMAGE_LENGTH = 257
+BITS_PER_SAMPLE = 258
+COMPRESSION = 259
+PHOTOMETRIC = 262
+SAMPLES_PER_PIXEL = 277
+PLANAR_CONFIG = 284
+PREDICTOR = 317
+TILE_WIDTH = 322
+TILE_LENGTH = 323
+TILE_OFFSETS = 324
+TILE_BYTE_COUNTS = 325
+
+# TIFF 数据类型
+SHORT = 3
+LONG = 4
+LONG8 = 16
+
+COMPRESSION_CODES = {
+    "none": 1,
+    "deflate": 8
+}
+
+# 经典 TIFF 偏移量为 32 位，超过约 4GB 时必须使用 BigTIFF
+CLASSIC_TIFF_LIMIT = 2 ** 32 - 2 ** 24
+
+
+class _Level:
+    """金字塔中的一层：记录已写入的分块和尚未填满的分块"""
+
+    def __init__(self, size, tile_size):
+        self.size = size
+        self.tiles_x = (size[0] + tile_size - 1) // tile_size
+        self.tiles_y = (size[1] + tile_size - 1) // tile_size
+        self.offsets = [0] * (self.tiles_x * self.tiles_y)
+        self.byte_counts = [0] * (self.tiles_x * self.tiles_y)
+        # 分块序号 -> [缓冲数组, 已填充像素数]
+        self.pending = {}
+
+
+class TiledTiffWriter:
+    """流式分块 (Big)TIFF 写入器
+
+    分块或条带可按任意顺序写入，填满的分块立即压缩并写入文件，
+    不需要在内存中保存整幅图像。可选地在写入过程中同时生成
+    逐级缩小一半的金字塔层（作为后续的缩略子文件写入）。
+    """
+
+    def __init__(self, path, size, tile_size=512, compression="deflate", compress_level=6,
+                 predictor=True, bigtiff=None, pyramid_levels=0):
+        if tile_size % 16:
+            raise ValueError("TIFF 分块尺寸必须是 16 的倍数")
+        if compression not in COMPRESSION_CODES:
+            raise ValueError(f"不支持的分块压缩方式: {compression}")
+
+        self.path = str(path)
+        self.size = tuple(size)
+        self.tile_size = tile_size
+        self.compression = compression
+        self.compress_level = compress_level
+        self.predictor = predictor and compression == "deflate"
+
+        # 构建金字塔各层尺寸
+        self.levels = [_Level(self.size, tile_size)]
+        width, height = self.size
+        for _ in range(pyramid_levels):
+            width, height = (width + 1) // 2, (height + 1) // 2
+            if width < 1 or height < 1:
+                break
+            self.levels.append(_Level((width, height), tile_size))
+
+        if bigtiff is None:
+            # 未压缩大小（含金字塔）超过经典 TIFF 上限时自动使用 BigTIFF
+            raw_bytes = sum(level.size[0] * level.size[1] * 3 for level in self.levels)
+            bigtiff = raw_bytes * 1.1 > CLASSIC_TIFF_LIMIT
+        self.bigtiff = bigtiff
+
+        self._file = open(self.path, 'wb')
+        if self.bigtiff:
+            self._file.write(struct.pack('<2sHHHQ', b'II', 43, 8, 0, 0))
+        else:
+            self._file.write(struct.pack('<2sHI', b'II', 42, 0))
+        self._closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._file.close()
+            self._closed = True
+
+    def write_region(self, left, top, array, level=0):
+        """写入一块区域（分块、条带或任意矩形），区域之间不能重叠"""
+        lvl = self.levels[level]
+        array = np.asarray(array, dtype=np.uint8)
+        height, width = array.shape[:2]
+        ts = self.tile_size
+
+        for ty in range(top // ts, (top + height - 1) // ts + 1):
+            for tx in range(left // ts, (left + width - 1) // ts + 1):
+                # 区域与该分块的交集
+                x0 = max(left, tx * ts)
+                y0 = max(top, ty * ts)
+                x1 = min(left + width, (tx + 1) * ts, lvl.size[0])
+                y1 = min(top + height, (ty + 1) * ts, lvl.size[1])
+                if x0 >= x1 or y0 >= y1:
+                    continue
+
+                index = ty * lvl.tiles_x + tx
+                if index not in lvl.pending:
+                    lvl.pending[index] = [np.zeros((ts, ts, 3), dtype=np.uint8), 0]
+                entry = lvl.pending[index]
+                entry[0][y0 - ty * ts:y1 - ty * ts, x0 - tx * ts:x1 - tx * ts] = \
+                    array[y0 - top:y1 - top, x0 - left:x1 - left]
+                entry[1] += (x1 - x0) * (y1 - y0)
+
+                # 分块内的有效像素数（边缘分块不足一整块）
+                valid = (min(ts, lvl.size[0] - tx * ts)) * (min(ts, lvl.size[1] - ty * ts))
+                if entry[1] >= valid:
+                    del lvl.pending[index]
+                    self._flush_tile(level, tx, ty, entry[0])
+
+    def write_tile(self, left, top, array):
+        """写入全分辨率的一个分块"""
+        self.write_region(left, top, array, level=0)
+
+    def _flush_tile(self, level, tx, ty, tile):
+        """压缩并写入一个完整分块，同时把缩小后的数据送入下一层"""
+        lvl = self.levels[level]
+        if lvl.offsets[ty * lvl.tiles_x + tx]:
+            raise ValueError(f"分块 ({tx}, {ty}) 已写入")
+
+        data = tile
+        if self.predictor:
+            # 水平差分预测：对相邻像素逐通道求差，提升 Deflate 压缩率
+            data = tile.copy()
+            data[:, 1:] -= tile[:, :-1]
+        data = data.tobytes()
+        if self.compression == "deflate":
+            data = zlib.compress(data, self.compress_level)
+
+        self._file.seek(0, 2)
+        offset = self._file.tell()
+        self._file.write(data)
+        lvl.offsets[ty * lvl.tiles_x + tx] = offset
+        lvl.byte_counts[ty * lvl.tiles_x + tx] = len(data)
+
+        if level + 1 < len(self.levels):
+            ts = self.tile_size
+            valid_w = min(ts, lvl.size[0] - tx * ts)
+            valid_h = min(ts, lvl.size[1] - ty * ts)
+            reduced = _reduce_half(tile[:valid_h, :valid_w])
+            self.write_region(tx * ts // 2, ty * ts // 2, reduced, level=level + 1)
+
+    def close(self):
+        """写入剩余分块和所有 IFD"""
+        if self._closed:
+            return
+
+        # 未写满的分块按已有内容写入（缺失部分为黑色），缺失的分块写入黑色分块
+        for level, lvl in enumerate(self.levels):
+            for index in sorted(lvl.pending):
+                tile, _ = lvl.pending.pop(index)
+                self._flush_tile(level, index % lvl.tiles_x, index // lvl.tiles_x, tile)
+            for index, offset in enumerate(lvl.offsets):
+                if not offset:
+                    self._flush_tile(level, index % lvl.tiles_x, index // lvl.tiles_x,
+                                     np.zeros((self.tile_size, self.tile_size, 3), dtype=np.uint8))
+
+        self._file.seek(0, 2)
+        ifd_offsets = []
+        for level, lvl in enumerate(self.levels):
+            ifd_offsets.append(self._write_ifd(level, lvl))
+
+        # 链接各层 IFD：文件头指向第一层，每层指向下一层
+        pointer = '<Q' if self.bigtiff else '<I'
+        self._file.seek(8 if self.bigtiff else 4)
+        self._file.write(struct.pack(pointer, ifd_offsets[0][0]))
+        for current, following in zip(ifd_offsets, ifd_offsets[1:]):
+            self._file.seek(current[1])
+            self._file.write(struct.pack(pointer, following[0]))
+
+        self._file.close()
+        self._closed = True
+
+    def _write_ifd(self, level, lvl):
+        """写入一层的 IFD，返回 (IFD 偏移, 下一 IFD 指针的位置)"""
+        offset_type = LONG8 if self.bigtiff else LONG
+        entries = [
+            (NEW_SUBFILE_TYPE, LONG, [1 if level else 0]),
+            (IMAGE_WIDTH, LONG, [lvl.size[0]]),
+            (IMAGE_LENGTH, LONG, [lvl.size[1]]),
+            (BITS_PER_SAMPLE, SHORT, [8, 8, 8]),
+            (COMPRESSION, SHORT, [COMPRESSION_CODES[self.compression]]),
+            (PHOTOMETRIC, SHORT, [2]),
+            (SAMPLES_PER_PIXEL, SHORT, [3]),
+            (PLANAR_CONFIG, SHORT, [1]),
+        ]
+        if self.predictor:
+            entries.append((PREDICTOR, SHORT, [2]))
+        entries += [
+            (TILE_WIDTH, LONG, [self.tile_size]),
+            (TILE_LENGTH, LONG, [self.tile_size]),
+            (TILE_OFFSETS, offset_type, lvl.offsets),
+            (TILE_BYTE_COUNTS, offset_type, lvl.byte_counts),
+        ]
+
+        value_size = 8 if self.bigtiff else 4
+        formats = {SHORT: 'H', LONG: 'I', LONG8: 'Q'}
+
+        # 先写入放不进 IFD 条目的数据
+        packed_entries = []
+        for tag, dtype, values in entries:
+            data = struct.pack(f'<{len(values)}{formats[dtype]}', *values)
+            if len(data) <= value_size:
+                packed_entries.append((tag, dtype, len(values), data.ljust(value_size, b'\0')))
+            else:
+                if self._file.tell() % 2:
+                    self._file.write(b'\0')
+                data_offset = self._file.tell()
+                self._file.write(data)
+                packed_entries.append((tag, dtype, len(values),
+                                       struct.pack('<Q' if self.bigtiff else '<I', data_offset)))
+
+        if self._file.tell() % 2:
+            self._file.write(b'\0')
+        ifd_offset = self._file.tell()
+        if self.bigtiff:
+            self._file.write(struct.pack('<Q', len(packed_entries)))
+            for tag, dtype, count, value in packed_entries:
+                self._file.write(struct.pack('<HHQ', tag, dtype, count) + value)
+        else:
+            self._file.write(struct.pack('<H', len(packed_entries)))
+            for tag, dtype, count, value in packed_entries:
+                self._file.write(struct.pack('<HHI', tag, dtype, count) + value)
+        next_pointer = self._file.tell()
+        self._file.write(b'\0' * value_size)
+        return ifd_offset, next_pointer
+
+
+def _reduce_half(array):
+    """2x2 盒式滤波缩小一半（奇数边长时复制边缘像素）"""
+    height, width = array.shape[:2]
+    if height % 2 or width % 2:
+        array = np.pad(array, ((0, height % 2), (0, width % 2), (0, 0)), mode='edge')
+    array = array.astype(np.uint16)
+    reduced = (array[0::2, 0::2] + array[1::2, 0::2] + array[0::2, 1::2] + array[1::2, 1::2] + 2) // 4
+    return reduced.astype(np.uint8)
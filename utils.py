@@ -1,14 +1,19 @@
 import re
 import sys
+import math
 import os
+import threading
+from collections import OrderedDict, Counter
 from pathlib import Path
-from PIL import Image
-from tqdm import tqdm
+from PIL import Image, ImageOps
 from datetime import datetime
 
 # 判断是否为打包环境
 is_frozen = getattr(sys, 'frozen', False)
 
+# 默认最多同时打开的图片数（远低于常见的 1024 个文件句柄上限）
+DEFAULT_MAX_OPEN = 64
+
 
 def get_base_path():
     """获取正确的基础路径（兼容开发环境和打包环境）"""
@@ -35,31 +40,48 @@ def get_file_creation_time(path):
 
 
 def get_file_modification_time(path):
-    """获取文件修改时间"""
+    """获取文件修改时间（帧来源中的帧使用其 stat()）"""
+    if hasattr(path, 'stat'):
+        return path.stat().st_mtime
     return os.path.getmtime(path)
 
 
-def load_images(input_dir, sort_by='name', reverse=False):
-    """加载Windows目录中的图片，支持多种排序方式"""
-    # 确保输入目录存在
-    if not os.path.exists(input_dir):
-        raise FileNotFoundError(f"输入目录不存在: {input_dir}")
+def read_capture_time(path):
+    """读取拍摄时间（EXIF DateTimeOriginal 加亚秒，时间戳），只读取文件头不解码像素
 
-    # 支持的图片格式
-    image_extensions = [
-        "*.jpg", "*.jpeg", "*.png", "*.tif", "*.tiff",
-        "*.nef", "*.dng", "*.cr2", "*.cr3", "*.arw", "*.raf", "*.orf", "*.rw2"
-    ]
+    没有 EXIF 拍摄时间（或无法读取文件头，如部分 RAW 格式和视频帧）时使用文件修改时间。
+    """
+    from PIL import ExifTags
+    path = _as_path(path)
+    if not hasattr(path, 'decode'):
+        try:
+            with _open_pil(path) as img:
+                exif = img.getexif()
+                ifd = exif.get_ifd(ExifTags.IFD.Exif)
+                value = ifd.get(ExifTags.Base.DateTimeOriginal) or exif.get(ExifTags.Base.DateTime)
+                if value:
+                    timestamp = datetime.strptime(str(value).strip('\x00 '), "%Y:%m:%d %H:%M:%S").timestamp()
+                    subsec = str(ifd.get(ExifTags.Base.SubsecTimeOriginal, '')).strip('\x00 ')
+                    if subsec.isdigit():
+                        timestamp += int(subsec) / 10 ** len(subsec)
+                    return timestamp
+        except (OSError, ValueError, SyntaxError):
+            pass
+    return get_file_modification_time(path)
 
-    # 遍历目录
-    image_paths = []
-    for ext in image_extensions:
-        image_paths.extend(Path(input_dir).glob(ext))
 
-    if not image_paths:
-        raise FileNotFoundError(f"在目录 {input_dir} 中未找到支持的图片文件")
+# 支持的图片格式
+IMAGE_EXTENSIONS = [
+    "*.jpg", "*.jpeg", "*.png", "*.tif", "*.tiff",
+    "*.nef", "*.dng", "*.cr2", "*.cr3", "*.arw", "*.raf", "*.orf", "*.rw2"
+]
+
+RAW_EXTENSIONS = ['.nef', '.dng', '.cr2', '.cr3', '.arw', '.raf', '.orf', '.rw2']
 
-    # 根据排序规则排序
+
+def sort_image_paths(image_paths, sort_by='name', reverse=False):
+    """按排序规则排序图片路径"""
+    image_paths = list(image_paths)
     if sort_by == 'name':
         image_paths.sort(key=natural_sort_key)
     elif sort_by == 'created_time':
@@ -71,26 +93,401 @@ def load_images(input_dir, sort_by='name', reverse=False):
 
     if reverse:
         image_paths = list(reversed(image_paths))
+    return image_paths
+
+
+def list_image_paths(input_dir, sort_by='name', reverse=False):
+    """列出输入中支持的图片并排序（不读取图片内容）
+
+    input_dir 可以是目录，也可以是 zip/tar 压缩包、多页 TIFF 或视频文件，
+    此时返回的是可以像文件路径一样使用的帧引用（见 sources.py）。
+    """
+    from sources import open_source
+
+    # 确保输入目录存在
+    if not os.path.exists(input_dir):
+        raise FileNotFoundError(f"输入目录不存在: {input_dir}")
+
+    # 遍历目录
+    image_paths = open_source(input_dir).frames()
+
+    if not image_paths:
+        raise FileNotFoundError(f"在目录 {input_dir} 中未找到支持的图片文件")
+
+    return sort_image_paths(image_paths, sort_by, reverse)
+
+
+def _as_path(path):
+    """字符串转换为 Path，帧来源中的帧引用保持不变"""
+    return Path(path) if isinstance(path, str) else path
+
+
+def _image_file(path):
+    """图片数据：文件路径，或帧引用（压缩包成员等）打开的文件对象"""
+    open_file = getattr(path, 'open_file', None)
+    return open_file() if open_file else str(path)
+
+
+def _open_pil(path):
+    """打开非 RAW 图片（不解码），多页 TIFF 中的帧定位到对应的页"""
+    image = Image.open(_image_file(path))
+    page = getattr(path, 'page', 0)
+    if page:
+        image.seek(page)
+    return image
+
+
+def open_image(path):
+    """打开一张图片，RAW 格式和视频帧会立即解码"""
+    path = _as_path(path)
+    if hasattr(path, 'decode'):
+        return path.decode()
+    if path.suffix.lower() in RAW_EXTENSIONS:
+        try:
+            import rawpy
+        except ImportError:
+            raise ImportError("请安装rawpy库以处理RAW格式: pip install rawpy")
+        with rawpy.imread(_image_file(path)) as raw:
+            rgb = raw.postprocess()
+        return Image.fromarray(rgb)
+    return _open_pil(path)
+
+
+def open_resized(path, size):
+    """打开图片并缩放到 size（等比例缩放至覆盖目标尺寸后居中裁剪）
+
+    尺寸不同时尽量按比例解码：JPEG 使用 draft 模式按 1/2-1/8 解码，RAW 缩小
+    一半以上时使用半尺寸解码，之后只需对接近目标尺寸的图片做一次缩放。
+    """
+    path = _as_path(path)
+    size = tuple(size)
+    full_w, full_h = read_image_size(path)
+    if (full_w, full_h) == size:
+        return open_image(path)
+
+    scale = max(size[0] / full_w, size[1] / full_h)
+    if not hasattr(path, 'decode') and path.suffix.lower() in RAW_EXTENSIONS and scale <= 0.5:
+        import rawpy
+        with rawpy.imread(_image_file(path)) as raw:
+            image = Image.fromarray(raw.postprocess(half_size=True))
+    else:
+        image = open_image(path)
+        image.draft(None, (math.ceil(full_w * scale), math.ceil(full_h * scale)))
+    return ImageOps.fit(image, size, Image.LANCZOS)
+
+
+def decode_image(path, size=None):
+    """打开并完整解码一张图片，返回 RGB 图片；size 指定时缩放到该尺寸"""
+    image = open_resized(path, size) if size else open_image(path)
+    if image.mode != 'RGB':
+        return image.convert('RGB')
+    image.load()
+    return image
+
+
+def read_image_size(path):
+    """只读取文件头获取图片尺寸（不解码像素）"""
+    path = _as_path(path)
+    if hasattr(path, 'read_size'):
+        return path.read_size()
+    if path.suffix.lower() in RAW_EXTENSIONS:
+        try:
+            import rawpy
+        except ImportError:
+            raise ImportError("请安装rawpy库以处理RAW格式: pip install rawpy")
+        with rawpy.imread(_image_file(path)) as raw:
+            sizes = raw.sizes
+            # flip 为 5/6 时图片旋转 90 度
+            if sizes.flip in (5, 6):
+                return sizes.height, sizes.width
+            return sizes.width, sizes.height
+    with _open_pil(path) as img:
+        return img.size
+
+
+def open_embedded_thumbnail(path):
+    """读取文件内嵌的缩略图（RAW 预览图或 JPEG 的 EXIF 缩略图），不解码原图；没有时返回 None"""
+    import io
+    path = _as_path(path)
+    if hasattr(path, 'decode'):
+        return None
+    if path.suffix.lower() in RAW_EXTENSIONS:
+        try:
+            import rawpy
+        except ImportError:
+            raise ImportError("请安装rawpy库以处理RAW格式: pip install rawpy")
+        with rawpy.imread(_image_file(path)) as raw:
+            try:
+                thumb = raw.extract_thumb()
+            except (rawpy.LibRawNoThumbnailError, rawpy.LibRawUnsupportedThumbnailError):
+                return None
+            if thumb.format == rawpy.ThumbFormat.JPEG:
+                image = Image.open(io.BytesIO(thumb.data))
+            else:
+                image = Image.fromarray(thumb.data)
+            # 内嵌缩略图未按拍摄方向旋转
+            transpose = {3: Image.ROTATE_180, 5: Image.ROTATE_90, 6: Image.ROTATE_270}.get(raw.sizes.flip)
+        return image.transpose(transpose) if transpose is not None else image
+
+    from PIL import ExifTags
+    try:
+        with _open_pil(path) as img:
+            if img.format != 'JPEG':
+                return None
+            exif_data = img.info.get('exif')
+            ifd1 = img.getexif().get_ifd(ExifTags.IFD.IFD1)
+    except (OSError, SyntaxError, ValueError, KeyError):
+        return None
+    offset, length = ifd1.get(0x0201), ifd1.get(0x0202)
+    if not exif_data or not offset or not length:
+        return None
+    # 缩略图偏移量相对于 EXIF 中的 TIFF 头
+    if exif_data.startswith(b'Exif\x00\x00'):
+        offset += 6
+    try:
+        image = Image.open(io.BytesIO(exif_data[offset:offset + length]))
+        image.load()
+    except (OSError, SyntaxError, ValueError):
+        return None
+    return image
+
+
+def open_proxy(path, max_size=512, mode='L'):
+    """读取缩小的代理图（用于分析），尺寸与原图等比例且最长边为 max_size
+
+    JPEG 使用 draft 模式按 1/2-1/8 比例直接解码，RAW 优先使用内嵌缩略图。
+    """
+    path = _as_path(path)
+    full_w, full_h = read_image_size(path)
+    scale = min(1.0, max_size / max(full_w, full_h))
+    proxy_size = (max(1, round(full_w * scale)), max(1, round(full_h * scale)))
+
+    if hasattr(path, 'decode'):
+        image = path.decode()
+    elif path.suffix.lower() in RAW_EXTENSIONS:
+        image = open_embedded_thumbnail(path)
+        if image is None:
+            import rawpy
+            with rawpy.imread(_image_file(path)) as raw:
+                image = Image.fromarray(raw.postprocess(half_size=True))
+    else:
+        image = _open_pil(path)
+        image.draft('RGB' if mode == 'RGB' else mode, proxy_size)
+
+    if image.mode != mode:
+        image = image.convert(mode)
+    return image.resize(proxy_size, Image.BILINEAR)
+
+
+def get_available_memory():
+    """获取系统当前可用内存（字节），无法获取时返回 None"""
+    try:
+        import psutil
+        return psutil.virtual_memory().available
+    except ImportError:
+        pass
+
+    if sys.platform == 'win32':
+        import ctypes
+
+        class MEMORYSTATUSEX(ctypes.Structure):
+            _fields_ = [
+                ("dwLength", ctypes.c_ulong),
+                ("dwMemoryLoad", ctypes.c_ulong),
+                ("ullTotalPhys", ctypes.c_ulonglong),
+                ("ullAvailPhys", ctypes.c_ulonglong),
+                ("ullTotalPageFile", ctypes.c_ulonglong),
+                ("ullAvailPageFile", ctypes.c_ulonglong),
+                ("ullTotalVirtual", ctypes.c_ulonglong),
+                ("ullAvailVirtual", ctypes.c_ulonglong),
+                ("ullAvailExtendedVirtual", ctypes.c_ulonglong),
+            ]
+
+        status = MEMORYSTATUSEX()
+        status.dwLength = ctypes.sizeof(MEMORYSTATUSEX)
+        if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+            return status.ullAvailPhys
+        return None
+
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def load_images(input_dir, sort_by='name', reverse=False):
+    """加载Windows目录中的图片，支持多种排序方式
+
+    返回按需解码的帧对象（只读取文件头），同时打开的文件数受解码器池限制。
+    """
+    image_paths = list_image_paths(input_dir, sort_by, reverse)
 
     # 加载图片
     images = []
     if not is_frozen:
         print(f"加载 {len(image_paths)} 张图片...")
 
+    pool = DecoderPool()
+    from tqdm import tqdm
     for path in tqdm(image_paths, desc="加载图片", disable=is_frozen):
-        if path.suffix.lower() in ['.nef', '.dng', '.cr2', '.cr3', '.arw', '.raf', '.orf', '.rw2']:
-            try:
-                import rawpy
-                with rawpy.imread(str(path)) as raw:
-                    rgb = raw.postprocess()
-                img = Image.fromarray(rgb)
-                images.append(img)
-            except ImportError:
-                raise ImportError("请安装rawpy库以处理RAW格式: pip install rawpy")
+        frame = Frame(path, pool)
+        if path.suffix.lower() in RAW_EXTENSIONS:
+            images.append(frame)
         else:
             try:
-                images.append(Image.open(path))
+                frame.size
+                images.append(frame)
             except Exception as e:
                 print(f"无法打开图片 {path}: {e}")
 
-    return images
\ No newline at end of file
+    return images
+
+
+class DecoderPool:
+    """打开的解码器（图片对象）的有界 LRU 池
+
+    同时打开的图片超过 max_open 时关闭最久未使用的一张，释放文件句柄和
+    已解码的像素，之后再访问该帧时重新打开。max_open 为 None 时不限制数量。
+    """
+
+    def __init__(self, max_open=DEFAULT_MAX_OPEN):
+        self.max_open = max_open
+        self._open = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, frame):
+        """返回帧对应的打开的图片（最近使用的排在最后）"""
+        with self._lock:
+            image = self._open.pop(frame, None)
+            if image is not None:
+                self._open[frame] = image
+                return image
+        image = frame.open()
+        with self._lock:
+            self._open[frame] = image
+            while self.max_open is not None and len(self._open) > self.max_open:
+                _, evicted = self._open.popitem(last=False)
+                evicted.close()
+        return image
+
+    def release(self, frame):
+        """关闭帧对应的图片（如果已打开）"""
+        with self._lock:
+            image = self._open.pop(frame, None)
+        if image is not None:
+            image.close()
+
+    def close(self):
+        with self._lock:
+            images = list(self._open.values())
+            self._open.clear()
+        for image in images:
+            image.close()
+
+
+class Frame:
+    """一帧图片：只保存路径和元数据，像素通过解码器池按需打开和解码
+
+    尺寸只读取文件头；其余属性和方法（crop、mode 等）转发给池中打开的图片。
+    帧区域使用完后调用 release 立即释放解码的像素。target_size 指定时
+    解码时缩放到该尺寸（见 open_resized）。
+    """
+
+    def __init__(self, path, pool, target_size=None):
+        self.path = path
+        self.pool = pool
+        self.target_size = tuple(target_size) if target_size else None
+        self._size = None
+
+    @property
+    def size(self):
+        if self.target_size:
+            return self.target_size
+        if self._size is None:
+            self._size = read_image_size(self.path)
+        return self._size
+
+    def open(self):
+        """打开图片（由解码器池调用）"""
+        if self.target_size:
+            return open_resized(self.path, self.target_size)
+        return open_image(self.path)
+
+    def release(self):
+        self.pool.release(self)
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return getattr(self.pool.get(self), name)
+
+
+def load_frames(image_paths, indices, max_open=DEFAULT_MAX_OPEN, target_size=None):
+    """为 indices 中的图片创建帧对象，其余位置为 None（保持帧序号不变）
+
+    不会打开或解码任何文件；所有帧共用一个最多同时打开 max_open 张图片的解码器池。
+    target_size 指定时尺寸不同的帧在解码时缩放到该尺寸。
+    """
+    pool = DecoderPool(max_open)
+    images = [None] * len(image_paths)
+    for i in indices:
+        images[i] = Frame(image_paths[i], pool, target_size)
+    return images
+
+
+class SharedFrame:
+    """被多个位置共用的一帧：每个位置合成后各释放一次，全部释放后才释放底层的帧
+
+    底层帧只解码（以及对齐、去闪烁）一次；释放后计数复位，可再次用于下一次合成。
+    """
+
+    def __init__(self, image, count):
+        self.image = image
+        self.count = count
+        self._pending = count
+
+    @property
+    def size(self):
+        return self.image.size
+
+    @property
+    def mode(self):
+        return self.image.mode
+
+    def crop(self, box):
+        return self.image.crop(box)
+
+    def release(self):
+        self._pending -= 1
+        if self._pending <= 0:
+            self._pending = self.count
+            if hasattr(self.image, 'release'):
+                self.image.release()
+
+    def __getattr__(self, name):
+        if name.startswith('__') or name == 'image':
+            raise AttributeError(name)
+        return getattr(self.image, name)
+
+
+def share_frames(frames, slots, indices):
+    """把按路径去重后加载的帧放回各位置（slots 见 planner.dedupe_slots），indices 之外为 None
+
+    同一帧出现在多个位置时各位置共用一个 SharedFrame。
+    """
+    counts = Counter(slots[i] for i in indices)
+    shared = {}
+    images = [None] * len(slots)
+    for i in indices:
+        j = slots[i]
+        if counts[j] == 1:
+            images[i] = frames[j]
+        else:
+            if j not in shared:
+                shared[j] = SharedFrame(frames[j], counts[j])
+            images[i] = shared[j]
+    return images
@@ -0,0 +1,260 @@
+import os
+import sys
+import time
+import select
+import struct
+import ctypes
+import ctypes.util
+import numpy as np
+from pathlib import Path
+from collections import Counter
+from PIL import Image
+
+from utils import IMAGE_EXTENSIONS, sort_image_paths, open_image, open_resized, read_image_size
+from planner import resolve_size
+from geometry import get_geometry
+from compositor import frame_region
+from encoding import save_image
+
+# inotify 事件：写入完成、移入目录
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+
+
+class _InotifyWatcher:
+    """基于 Linux inotify 的目录监听（通过 ctypes 调用 libc，无额外依赖）"""
+
+    def __init__(self, directory):
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+        wd = self._libc.inotify_add_watch(self._fd, str(directory).encode(), IN_CLOSE_WRITE | IN_MOVED_TO)
+        if wd < 0:
+            os.close(self._fd)
+            raise OSError(ctypes.get_errno(), "inotify_add_watch 失败")
+
+    def wait(self, timeout):
+        """等待事件，返回写入完成的文件名集合"""
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        names = set()
+        if not ready:
+            return names
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return names
+        offset = 0
+        while offset + 16 <= len(data):
+            _, _, _, length = struct.unpack_from('iIII', data, offset)
+            name = data[offset + 16:offset + 16 + length].rstrip(b'\0')
+            names.add(os.fsdecode(name))
+            offset += 16 + length
+        return names
+
+    def close(self):
+        os.close(self._fd)
+
+
+class _PollingWatcher:
+    """轮询目录（inotify 不可用时的后备方案）"""
+
+    def wait(self, timeout):
+        time.sleep(timeout)
+        return set()
+
+    def close(self):
+        pass
+
+
+def create_watcher(directory):
+    """优先使用 inotify，不可用时退回轮询"""
+    if sys.platform.startswith('linux'):
+        try:
+            return _InotifyWatcher(directory)
+        except (OSError, AttributeError):
+            pass
+    return _PollingWatcher()
+
+
+class IncrementalCanvas:
+    """增量合成画布：每到达一帧只写入该帧拥有的区域"""
+
+    def __init__(self, geometry):
+        self.geometry = geometry
+        img_w, img_h = geometry.size
+        self.canvas = np.zeros((img_h, img_w, 3), dtype=np.uint8)
+        self.filled = set()
+
+    def add_frame(self, i, image):
+        """将第 i 帧写入它拥有的区域，返回写入的区域"""
+        box = self.geometry.frame_bbox(i)
+        if box is None:
+            return None
+        mask = self.geometry.label_tile(box) == i
+        if mask.any():
+            region = self.canvas[box[1]:box[3], box[0]:box[2]]
+            region[mask] = frame_region(image, self.geometry, i, box)[mask]
+        self.filled.add(i)
+        return box
+
+    def image(self):
+        return Image.fromarray(self.canvas)
+
+
+def _scan(input_dir):
+    """列出目录中当前所有支持的图片（目录为空时不报错）"""
+    paths = []
+    for ext in IMAGE_EXTENSIONS:
+        paths.extend(Path(input_dir).glob(ext))
+    return paths
+
+
+def write_preview(canvas, preview_path, max_size):
+    """写入缩小的预览图"""
+    preview = canvas.image()
+    if max_size and max(preview.size) > max_size:
+        preview.thumbnail((max_size, max_size), Image.BILINEAR)
+    preview.save(preview_path, "JPEG", quality=85)
+
+
+def canvas_size(sizes, arrival, resize=None):
+    """监听模式的画布尺寸：未指定 resize 时取已到达图片中最多的尺寸，否则按 resize 决定
+
+    sizes 为 路径 -> 尺寸，arrival 为到达顺序（resize 为 first 时使用第一张）。
+    """
+    if resize == 'first':
+        return sizes[arrival[0]]
+    if resize == 'smallest':
+        return min(sizes.values(), key=lambda size: size[0] * size[1])
+    if resize:
+        return resolve_size(None, resize)
+    return Counter(sizes[path] for path in arrival).most_common(1)[0][0]
+
+
+def watch_timeslice(input_dir, output_path, slice_type, frame_count, position="center", linear=False,
+                    reverse=False, sort_by='name', extension='jpg', encoder_options=None,
+                    poll_interval=1.0, preview_max_size=2048, log_callback=None, progress_callback=None,
+                    slice_map=None, angle=0.0, resize=None):
+    """监听输入目录，逐帧增量合成时间切片
+
+    frame_count 为预计的最终帧数，决定切片几何。每到达一张新图片只解码这一张，
+    并写入它拥有的区域；每次更新后写入预览图，帧数到齐后写入最终结果。
+    新图片排序位置不在末尾时，位置发生变化的已有帧会重新写入。
+    画布尺寸取已到达图片中最多的尺寸（尺寸变化时重建画布），其他尺寸的图片跳过；
+    resize 指定时（first/smallest/宽x高）所有图片缩放到统一尺寸。无法使用的文件在
+    修改之前不会被再次解码。
+    """
+    log = log_callback or print
+    output_path = Path(output_path)
+    preview_path = output_path.with_name(f"{output_path.stem}-preview.jpg")
+
+    watcher = create_watcher(input_dir)
+    log(f"监听目录 {input_dir}（{'inotify' if isinstance(watcher, _InotifyWatcher) else '轮询'}），"
+        f"等待 {frame_count} 张图片...")
+
+    canvas = None
+    ordered = []        # 当前按排序规则排列的已处理路径
+    pending_sizes = {}  # 轮询时用于判断文件是否写入完成
+    closed_names = set()
+    first_scan = True
+    rejected = {}       # 无法使用的文件：(路径, 修改时间) -> 原因（"size" 为尺寸不一致）
+    sizes = {}          # 已读取文件头的图片尺寸
+    arrival = []        # 读取到尺寸的图片（到达顺序）
+
+    def mtime(path):
+        try:
+            return path.stat().st_mtime_ns
+        except OSError:
+            return None
+
+    def open_frame(path, size):
+        return open_resized(path, size) if resize else open_image(path)
+
+    def frame_index(k):
+        return frame_count - 1 - k if reverse else k
+
+    try:
+        while len(ordered) < frame_count:
+            known = set(ordered)
+            candidates = [p for p in _scan(input_dir) if p not in known and (p, mtime(p)) not in rejected]
+
+            # 只处理写入完成的文件：启动时已存在、inotify 报告写入完成或两次轮询大小不变
+            ready = []
+            for path in candidates:
+                try:
+                    size = path.stat().st_size
+                except OSError:
+                    continue
+                if first_scan or path.name in closed_names or pending_sizes.get(path) == size:
+                    ready.append(path)
+                    pending_sizes.pop(path, None)
+                else:
+                    pending_sizes[path] = size
+            first_scan = False
+
+            for path in sort_image_paths(ready, sort_by):
+                if len(ordered) >= frame_count:
+                    log(f"已达到预计帧数 {frame_count}，忽略 {path.name}")
+                    continue
+                key = (path, mtime(path))
+                try:
+                    sizes[path] = read_image_size(path)
+                except Exception as e:
+                    # 文件修改（如写入完成）后再试
+                    log(f"无法打开图片 {path}: {e}")
+                    rejected[key] = "error"
+                    continue
+                if path not in arrival:
+                    arrival.append(path)
+
+                size = canvas_size(sizes, arrival, resize)
+                if canvas is None or canvas.geometry.size != size:
+                    if canvas is not None:
+                        log(f"画布尺寸变为 {size[0]}x{size[1]}，重新合成")
+                    canvas = IncrementalCanvas(get_geometry(slice_type, size, frame_count, position, linear,
+                                                              slice_map, angle))
+                    # 与新尺寸不一致的已合成帧移出；因尺寸被跳过、与新尺寸一致的文件重新参与
+                    for old in [p for p in ordered if not resize and sizes[p] != size]:
+                        rejected[(old, mtime(old))] = "size"
+                    for old_key in [k for k, reason in rejected.items()
+                                    if reason == "size" and sizes.get(k[0]) == size]:
+                        del rejected[old_key]
+                    ordered = [p for p in ordered if resize or sizes[p] == size]
+                    for k, old in enumerate(ordered):
+                        with open_frame(old, size) as frame:
+                            canvas.add_frame(frame_index(k), frame)
+
+                if not resize and sizes[path] != size:
+                    log(f"图片尺寸不一致，已跳过: {path.name}")
+                    rejected[key] = "size"
+                    continue
+                try:
+                    image = open_frame(path, size)
+                    image.load()
+                except Exception as e:
+                    log(f"无法打开图片 {path}: {e}")
+                    rejected[key] = "error"
+                    continue
+
+                ordered = sort_image_paths(ordered + [path], sort_by)
+                position_in_order = ordered.index(path)
+                # 排在新图片之后的帧索引发生变化，需要重新写入（已有帧合成后立即关闭）
+                with image:
+                    canvas.add_frame(frame_index(position_in_order), image)
+                for k in range(position_in_order + 1, len(ordered)):
+                    with open_frame(ordered[k], size) as frame:
+                        canvas.add_frame(frame_index(k), frame)
+
+                write_preview(canvas, preview_path, preview_max_size)
+                log(f"已合成 {len(ordered)}/{frame_count}: {path.name}")
+                if progress_callback:
+                    progress_callback(len(ordered))
+
+            if len(ordered) < frame_count:
+                closed_names = watcher.wait(poll_interval)
+    finally:
+        watcher.close()
+
+    stats = save_image(canvas.image(), output_path, extension, encoder_options)
+    return stats